@@ -0,0 +1,62 @@
+"""Compares two JSON results of run_benchmarks.py, typically of two commits.
+
+Example:
+    python benchmarks/compare_benchmarks.py results/base.json results/new.json --tolerance 0.1
+
+The exit code is 1 if a run time or a peak memory of a common case grows by more
+than the tolerance.
+"""
+import sys
+import json
+import argparse
+
+
+def load(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def _ratio(base, new):
+    if base is None or new is None or base == 0:
+        return None
+    return new / base
+
+
+def compare(base: dict, new: dict, tolerance: float) -> bool:
+    """Prints the comparison of the common cases and returns True if there is a regression."""
+    regression = False
+    print(f"base: {base['metadata'].get('commit')}  new: {new['metadata'].get('commit')}")
+    for name, new_case in new['cases'].items():
+        base_case = base['cases'].get(name)
+        if base_case is None or 'error' in base_case or 'error' in new_case:
+            continue
+        print(name)
+        rows = [('run_time', base_case['run_time'], new_case['run_time']),
+                ('peak_rss_mb', base_case.get('peak_rss_mb'), new_case.get('peak_rss_mb'))]
+        rows += [(f'build.{k}', v, new_case['build'].get(k)) for k, v in base_case['build'].items()]
+        rows += [(f'phase.{k}', v['time'], new_case['phases'].get(k, {}).get('time'))
+                 for k, v in base_case['phases'].items()]
+        for key, base_value, new_value in rows:
+            ratio = _ratio(base_value, new_value)
+            if ratio is None:
+                continue
+            flag = ''
+            if key in ('run_time', 'peak_rss_mb') and ratio > 1 + tolerance:
+                flag = '  REGRESSION'
+                regression = True
+            print(f'  {key:<40} {base_value:>12.3f} {new_value:>12.3f} {ratio:>7.2f}x{flag}')
+    return regression
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compares two MnMS benchmark results')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Relative increase of run time or peak memory reported as a regression')
+    args = parser.parse_args(argv)
+    sys.exit(1 if compare(load(args.base), load(args.new), args.tolerance) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Runs the MnMS benchmark suite and writes the results in a JSON file.
+
+Examples:
+    python benchmarks/run_benchmarks.py --preset small
+    python benchmarks/run_benchmarks.py --preset large -o results/large.json
+    python benchmarks/run_benchmarks.py --n 20 --users 2000 --services car,pt --services ondemand_fifo
+
+Each case is run in a fresh process so that its peak memory is measured alone.
+Results of two commits can be compared with compare_benchmarks.py.
+"""
+import os
+import sys
+import json
+import socket
+import argparse
+import platform
+import itertools
+import subprocess
+import multiprocessing
+from time import time
+from pathlib import Path
+from functools import wraps
+from datetime import datetime
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mnms.log import set_all_mnms_logger_level, LOGLEVEL
+from mnms.tools.execution import available_cpu_count
+
+from scenarios import DEFAULT_PARAMS, SERVICES, complete_params, build_supervisor, simulation_times
+
+# Methods of the Supervisor timed separately, they cover all the phases of a run
+SUPERVISOR_PHASES = ['initialize',
+                     'get_new_users',
+                     'call_planning',
+                     'get_users_step',
+                     'call_update_mobility_services',
+                     'call_user_flow_step',
+                     'step_dynamic_space_sharing',
+                     'call_matching_mobility_services',
+                     'call_flow_motor_step',
+                     'call_update_graph',
+                     'finalize']
+
+# Each preset gives the network sizes, demand sizes and fleet sizes crossed with the service mixes
+PRESETS = {
+    'small': {'n': [10], 'nb_users': [200], 'fleet_size': [20], 'demand_duration': [15]},
+    'medium': {'n': [30], 'nb_users': [5000], 'fleet_size': [300], 'demand_duration': [60]},
+    'large': {'n': [100], 'nb_users': [100000], 'fleet_size': [5000], 'demand_duration': [120]},
+}
+DEFAULT_SERVICE_MIXES = [['car'], ['pt'], ['ondemand_fifo'], ['ondemand_batched'], ['ridesharing'],
+                         ['vehicle_sharing'], ['car', 'pt', 'ondemand_fifo']]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of the current process in MB, None if unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return maxrss / 2**20 if sys.platform == 'darwin' else maxrss / 2**10
+
+
+def time_supervisor_phases(supervisor, phases: Dict):
+    """Wraps the phase methods of a supervisor to accumulate their number of calls
+    and duration in phases."""
+    for name in SUPERVISOR_PHASES:
+        method = getattr(supervisor, name)
+        phases[name] = {'calls': 0, 'time': 0.}
+
+        def timed(*args, __method=method, __stats=phases[name], **kwargs):
+            start = time()
+            try:
+                return __method(*args, **kwargs)
+            finally:
+                __stats['calls'] += 1
+                __stats['time'] += time() - start
+
+        setattr(supervisor, name, wraps(method)(timed))
+
+
+def run_case(params: Dict, trace_memory: bool = False, loglevel: int = LOGLEVEL.ERROR) -> Dict:
+    """Builds and runs one case of the benchmark.
+
+    Args:
+        -params: parameters of the case, completed with the default ones
+        -trace_memory: if True, the peak of memory allocated by Python objects is
+         also measured with tracemalloc, this slows the run down
+        -loglevel: level of the mnms loggers during the run
+
+    Returns:
+        -the result of the case
+    """
+    params = complete_params(params)
+    set_all_mnms_logger_level(loglevel)
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    result = {'params': params, 'build': {}, 'phases': {}}
+    start = time()
+    supervisor = build_supervisor(params, result['build'])
+    result['build']['total'] = time() - start
+    result['rss_after_build_mb'] = peak_rss_mb()
+
+    time_supervisor_phases(supervisor, result['phases'])
+    tstart, tend, flow_dt, affectation_factor = simulation_times(params)
+    start = time()
+    supervisor.run(tstart, tend, flow_dt, affectation_factor, seed=params['seed'])
+    result['run_time'] = time() - start
+
+    result['nb_users'] = params['nb_users']
+    result['nb_users_not_arrived'] = len(supervisor._user_flow.users)
+    result['nb_vehicles'] = len(supervisor._veh_manager.vehicles)
+    result['peak_rss_mb'] = peak_rss_mb()
+    if result['peak_rss_mb'] is not None and result['rss_after_build_mb'] is not None:
+        # Memory held per simulated user, should stay flat when the number of users grows
+        result['rss_growth_per_user_kb'] = (result['peak_rss_mb'] - result['rss_after_build_mb']) * 1024 / params['nb_users']
+    if trace_memory:
+        result['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+
+def case_name(params: Dict) -> str:
+    network = f"n{params['n']}" if params['network'] == 'manhattan' else 'nested' + '-'.join(map(str, params['n_list']))
+    name = f"{network}_u{params['nb_users']}_f{params['fleet_size']}_{'+'.join(params['services'])}"
+    if params['threads'] != DEFAULT_PARAMS['threads']:
+        name += f"_t{params['threads']}"
+    if params['inline_threshold'] != DEFAULT_PARAMS['inline_threshold']:
+        name += f"_i{params['inline_threshold']}"
+    return name
+
+
+def _run_case_in_child(params: Dict, trace_memory: bool, loglevel: int, conn):
+    conn.send(run_case(params, trace_memory, loglevel))
+    conn.close()
+
+
+def run_isolated_case(params: Dict, trace_memory: bool = False, loglevel: int = LOGLEVEL.ERROR) -> Dict:
+    """Runs a case in a new process, the failures are reported in the result."""
+    ctx = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_run_case_in_child, args=(params, trace_memory, loglevel, child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = {'params': complete_params(params), 'error': 'process died'}
+    process.join()
+    if process.exitcode != 0:
+        result['error'] = f'exit code {process.exitcode}'
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def expand_cases(args) -> List[Dict]:
+    grid = dict(PRESETS[args.preset])
+    for key, values in (('n', args.n), ('nb_users', args.users), ('fleet_size', args.fleet),
+                        ('threads', args.threads), ('inline_threshold', args.inline_threshold)):
+        if values:
+            grid[key] = values
+    mixes = [mix.split(',') for mix in args.services] if args.services else DEFAULT_SERVICE_MIXES
+    cases = []
+    keys = list(grid.keys())
+    for values in itertools.product(*(grid[k] for k in keys)):
+        for services in mixes:
+            params = dict(zip(keys, values))
+            params['services'] = services
+            params['seed'] = args.seed
+            if args.network == 'nested':
+                params['network'] = 'nested'
+                if 'pt' in services:
+                    continue
+            cases.append(complete_params(params))
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs the MnMS benchmark suite on generated Manhattan scenarios')
+    parser.add_argument('--preset', choices=list(PRESETS.keys()), default='small', help='Sizes of the cases')
+    parser.add_argument('--n', type=int, nargs='+', help='Number of nodes per direction of the networks')
+    parser.add_argument('--users', type=int, nargs='+', help='Numbers of users')
+    parser.add_argument('--fleet', type=int, nargs='+', help='Numbers of vehicles per fleet based service')
+    parser.add_argument('--services', action='append',
+                        help=f'Comma separated service mix, can be repeated, among {SERVICES}')
+    parser.add_argument('--threads', type=int, nargs='+', help='Maximal numbers of threads per parallel call')
+    parser.add_argument('--inline-threshold', type=int, nargs='+',
+                        help='Numbers of tasks under which a parallel call runs in one thread')
+    parser.add_argument('--network', choices=['manhattan', 'nested'], default='manhattan')
+    parser.add_argument('--seed', type=int, default=DEFAULT_PARAMS['seed'])
+    parser.add_argument('--trace-memory', action='store_true', help='Measure the Python heap peak with tracemalloc')
+    parser.add_argument('--in-process', action='store_true',
+                        help='Run the cases in this process, peak memory is then cumulative')
+    parser.add_argument('--verbose', action='store_true', help='Keep the mnms warnings')
+    parser.add_argument('-o', '--output', default=None, help='JSON result file')
+    args = parser.parse_args(argv)
+
+    output = Path(args.output) if args.output is not None else \
+        Path(__file__).parent / 'results' / f"{args.preset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    results = {'metadata': {'commit': git_commit(),
+                            'date': datetime.now().isoformat(timespec='seconds'),
+                            'host': socket.gethostname(),
+                            'platform': platform.platform(),
+                            'python': platform.python_version(),
+                            'cpu_count': os.cpu_count(),
+                            'available_cpu_count': available_cpu_count(),
+                            'preset': args.preset},
+               'cases': {}}
+
+    for params in expand_cases(args):
+        name = case_name(params)
+        print(f'Running {name} ...', flush=True)
+        loglevel = LOGLEVEL.WARNING if args.verbose else LOGLEVEL.ERROR
+        run = run_case if args.in_process else run_isolated_case
+        result = run(params, args.trace_memory, loglevel)
+        results['cases'][name] = result
+        if 'error' in result:
+            print(f'  failed: {result["error"]}')
+        else:
+            print(f"  run {result['run_time']:.2f} s, build {result['build']['total']:.2f} s, "
+                  f"peak RSS {result['peak_rss_mb']} MB")
+        # Written after each case so that partial results survive a long run
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    print(f'Results written in {output}')
+
+
+if __name__ == '__main__':
+    main()
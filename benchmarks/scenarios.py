@@ -0,0 +1,205 @@
+"""Synthetic scenarios of the benchmark suite.
+
+A scenario is described by a plain dict of parameters (see DEFAULT_PARAMS) so that
+it can be stored in the JSON results and rebuilt identically in another process
+or on another commit.
+"""
+import os
+import random
+import tempfile
+from time import time
+from typing import Dict, List
+
+import numpy as np
+
+from mnms.demand.manager import CSVDemandManager
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.generation.demand import generate_random_demand_file
+from mnms.generation.layers import generate_layer_from_roads, generate_matching_origin_destination_layer
+from mnms.generation.roads import generate_manhattan_road, generate_nested_manhattan_road
+from mnms.graph.layers import MultiLayerGraph, BusLayer, SharedVehicleLayer
+from mnms.graph.road import RoadDescriptor
+from mnms.mobility_service.on_demand import OnDemandMobilityService
+from mnms.mobility_service.on_demand_shared import OnDemandSharedMobilityService
+from mnms.mobility_service.personal_vehicle import PersonalMobilityService
+from mnms.mobility_service.public_transport import PublicTransportMobilityService
+from mnms.mobility_service.vehicle_sharing import VehicleSharingMobilityService
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt, TimeTable
+from mnms.tools.execution import ExecutionResources
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.vehicles.veh_type import Bike
+
+SERVICES = ['car', 'pt', 'ondemand_fifo', 'ondemand_batched', 'ridesharing', 'vehicle_sharing']
+
+DEFAULT_PARAMS = {
+    'network': 'manhattan',         # 'manhattan' or 'nested'
+    'n': 10,                        # number of nodes per direction (manhattan)
+    'n_list': [4, 4],               # number of links per mesh size (nested)
+    'link_length': 200,             # m, mesh size (manhattan)
+    'link_length_list': [800, 200], # m, mesh sizes (nested)
+    'services': ['car'],
+    'nb_users': 200,
+    'fleet_size': 20,               # vehicles per on-demand, ridesharing and station based vehicle sharing service
+    'pt_line_spacing': 3,           # one bus line every pt_line_spacing rows and columns
+    'pt_frequency': 5,              # min
+    'max_detour_ratio': 1.5,        # users tolerance to ridesharing detours
+    'tstart': '07:00:00',
+    'demand_duration': 15,          # min, departures are drawn uniformly in this window
+    'simulation_margin': 30,        # min simulated after the last departure
+    'flow_dt': 30,                  # s
+    'affectation_factor': 10,
+    'seed': 0,
+    'threads': None,                # max threads per parallel call, all available CPUs if None
+    'inline_threshold': 16,         # parallel calls with at most this number of tasks run in one thread
+}
+
+_VFREE = {'CAR': 11.5, 'BUS': 6.5, 'BIKE': 4.}
+
+
+def complete_params(params: Dict) -> Dict:
+    """Returns the parameters of a scenario completed with the default values."""
+    full_params = dict(DEFAULT_PARAMS)
+    full_params.update(params)
+    unknown = set(full_params['services']) - set(SERVICES)
+    assert not unknown, f'Unknown services {unknown}, choose among {SERVICES}'
+    return full_params
+
+
+def generate_roads(params: Dict) -> RoadDescriptor:
+    if params['network'] == 'manhattan':
+        return generate_manhattan_road(params['n'], params['link_length'], extended=False)
+    elif params['network'] == 'nested':
+        return generate_nested_manhattan_road(params['n_list'], params['link_length_list'])
+    raise ValueError(f"Unknown network {params['network']}")
+
+
+def generate_bus_layer(roads: RoadDescriptor, params: Dict) -> BusLayer:
+    """Creates bus lines in both directions along every pt_line_spacing rows and
+    columns of a Manhattan network, with a stop at each intersection."""
+    assert params['network'] == 'manhattan', 'Public transport is only generated on manhattan networks'
+    n = params['n']
+    bus_layer = BusLayer(roads, services=[PublicTransportMobilityService('BUS')])
+    tstart = Time(params['tstart'])
+    tend = tstart.add_time(Dt(minutes=params['demand_duration'] + params['simulation_margin']))
+    timetable = TimeTable.create_table_freq(str(tstart), str(tend), Dt(minutes=params['pt_frequency']))
+
+    lines = []
+    for k in range(0, n, params['pt_line_spacing']):
+        lines.append((f'V{k}', [k * n + j for j in range(n)]))
+        lines.append((f'H{k}', [i * n + k for i in range(n)]))
+    for line_id, nodes in lines:
+        for direction, line_nodes in (('F', nodes), ('B', nodes[::-1])):
+            lid = line_id + direction
+            sections = [f'{up}_{down}' for up, down in zip(line_nodes[:-1], line_nodes[1:])]
+            stops = []
+            for i, section in enumerate(sections):
+                stops.append(f'{lid}_S{i}')
+                roads.register_stop(stops[-1], section, 0)
+            stops.append(f'{lid}_S{len(sections)}')
+            roads.register_stop(stops[-1], sections[-1], 1)
+            bus_layer.create_line(lid, stops, [[s] for s in sections], timetable)
+    return bus_layer
+
+
+def build_supervisor(params: Dict, timings: Dict) -> Supervisor:
+    """Builds the supervisor of a scenario.
+
+    Args:
+        -params: complete parameters of the scenario
+        -timings: dict filled with the duration in seconds of each building step
+
+    Returns:
+        -the supervisor ready to run
+    """
+    random.seed(params['seed'])
+    np.random.seed(params['seed'])
+    # The demand generation also uses the default resources
+    ExecutionResources.set_default(ExecutionResources(params['threads'], params['inline_threshold']))
+    services = params['services']
+
+    start = time()
+    roads = generate_roads(params)
+    road_nodes = list(roads.nodes.keys())
+    timings['roads'] = time() - start
+
+    start = time()
+    layers = []
+    fleets = []
+    if 'car' in services:
+        layers.append(generate_layer_from_roads(roads, 'CAR', mobility_services=[PersonalMobilityService()]))
+    if 'pt' in services:
+        layers.append(generate_bus_layer(roads, params))
+    for strategy in ('fifo', 'batched'):
+        if f'ondemand_{strategy}' in services:
+            service = OnDemandMobilityService(f'UBER_{strategy.upper()}', 1,
+                                              matching_strategy=f'nearest_idle_vehicle_in_radius_{strategy}')
+            layers.append(generate_layer_from_roads(roads, f'RIDEHAILING_{strategy.upper()}', mobility_services=[service]))
+            fleets.append(service)
+    if 'ridesharing' in services:
+        service = OnDemandSharedMobilityService('UBERPOOL', 3, 1, 0)
+        layers.append(generate_layer_from_roads(roads, 'RIDESHARING', mobility_services=[service]))
+        fleets.append(service)
+    vehicle_sharing = None
+    if 'vehicle_sharing' in services:
+        vehicle_sharing = VehicleSharingMobilityService('VELOV', False, 1)
+        layers.append(generate_layer_from_roads(roads, 'VELOV', SharedVehicleLayer, Bike, _VFREE['BIKE'],
+                                                [vehicle_sharing]))
+
+    odlayer = generate_matching_origin_destination_layer(roads, with_stops=False)
+    access_dist = min(_link_lengths(params)) / 2
+    # The shared vehicles layer is connected to the odlayer through its stations, it
+    # is connected once these stations are created
+    mlgraph = MultiLayerGraph(layers, odlayer, None if 'vehicle_sharing' in services else access_dist)
+
+    for service in fleets:
+        for _ in range(params['fleet_size']):
+            service.create_waiting_vehicle(f'{service.layer.id}_{random.choice(road_nodes)}')
+    if vehicle_sharing is not None:
+        # Station based service, the vehicles are spread over a station at every other road node
+        stations_nodes = road_nodes[::2]
+        for i, node in enumerate(stations_nodes):
+            nb_vehs = params['fleet_size'] // len(stations_nodes) + (i < params['fleet_size'] % len(stations_nodes))
+            vehicle_sharing.create_station(f'VELOV_STATION_{node}', node, capacity=max(10, 2 * nb_vehs),
+                                           nb_initial_veh=nb_vehs)
+        mlgraph.connect_origindestination_layers(access_dist)
+    timings['mlgraph'] = time() - start
+
+    start = time()
+    tstart = Time(params['tstart'])
+    tend_demand = tstart.add_time(Dt(minutes=params['demand_duration']))
+    # The demand is streamed through a CSV file so that large demands are not held in memory
+    demand_file = os.path.join(tempfile.mkdtemp(prefix='mnms_benchmark_'), 'demand.csv')
+    generate_random_demand_file(mlgraph, demand_file, params['nb_users'], str(tstart), str(tend_demand),
+                                min_cost=min(_link_lengths(params)), seed=params['seed'])
+    demand = CSVDemandManager(demand_file, user_parameters=lambda u: {'max_detour_ratio': params['max_detour_ratio']})
+    timings['demand'] = time() - start
+
+    modes = list(_VFREE.keys())
+    n_jam = 50 * len(road_nodes)
+
+    def mfdspeed(dacc):
+        ratio = max(0.1, 1 - sum(dacc.values()) / n_jam)
+        return {m: _VFREE[m] * ratio for m in modes}
+
+    flow_motor = MFDFlowMotor()
+    for zone in roads.zones.values():
+        flow_motor.add_reservoir(Reservoir(zone, modes, mfdspeed))
+
+    decision_model = DummyDecisionModel(mlgraph)
+
+    return Supervisor(mlgraph, demand, flow_motor, decision_model)
+
+
+def _link_lengths(params: Dict) -> List[float]:
+    return [params['link_length']] if params['network'] == 'manhattan' else params['link_length_list']
+
+
+def simulation_times(params: Dict):
+    """Returns the start, end, flow time step and affectation factor of the run, it
+    starts one affectation step before the first departure to let the graph be
+    updated before the first travel choice."""
+    tdemand = Time(params['tstart'])
+    tstart = tdemand.remove_time(Dt(seconds=params['flow_dt'] * params['affectation_factor']))
+    tend = tdemand.add_time(Dt(minutes=params['demand_duration'] + params['simulation_margin']))
+    return tstart, tend, Dt(seconds=params['flow_dt']), params['affectation_factor']
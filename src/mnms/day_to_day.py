@@ -0,0 +1,240 @@
+import csv
+from time import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from mnms.graph.layers import MultiLayerGraph
+from mnms.mobility_service.abstract import AbstractMobilityService
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.io.link_costs import LinkCostsReader
+from mnms.log import create_logger
+
+log = create_logger(__name__)
+
+
+def link_costs_gap(previous: Union[str, Path, LinkCostsReader],
+                   current: Union[str, Path, LinkCostsReader],
+                   cost_name: str = 'travel_time') -> float:
+    """Relative gap between the link costs of two runs of the same period, recorded
+    with a LinkCostsRecorder: sum over the affectation steps and the links of the
+    absolute differences of the costs, divided by the sum of the previous costs.
+
+    Args:
+        -previous: the link costs file (or its reader) of the previous run
+        -current: the link costs file (or its reader) of the current run
+        -cost_name: the compared cost, it should only depend on the link
+
+    Returns:
+        -the relative gap, 0 if both runs have the same costs
+    """
+    if not isinstance(previous, LinkCostsReader):
+        previous = LinkCostsReader(previous)
+    if not isinstance(current, LinkCostsReader):
+        current = LinkCostsReader(current)
+
+    diff = 0.
+    total = 0.
+    for (_, prev_costs), (_, cur_costs) in zip(previous.iter_links_costs(cost_name),
+                                               current.iter_links_costs(cost_name)):
+        # Both runs share the graph index, the links interned by only one of them are last
+        nb_links = min(len(prev_costs), len(cur_costs))
+        prev_costs = prev_costs[:nb_links]
+        cur_costs = cur_costs[:nb_links]
+        defined = ~np.isnan(prev_costs) & ~np.isnan(cur_costs)
+        diff += np.abs(cur_costs[defined] - prev_costs[defined]).sum()
+        total += prev_costs[defined].sum()
+    return float(diff / total) if total > 0 else 0.
+
+
+class DayToDayAssignment(object):
+    SUMMARY_FILE = 'convergence.csv'
+    LINK_COSTS_FILE = 'link_costs.bin'
+
+    def __init__(self,
+                 mlgraph: MultiLayerGraph,
+                 build_supervisor: Callable[[MultiLayerGraph, int, Path], Supervisor],
+                 outdir: Union[str, Path],
+                 tstart: Time,
+                 tend: Time,
+                 flow_dt: Dt,
+                 affectation_factor: int,
+                 update_graph_threshold: float = 0.,
+                 nb_iterations: int = 10,
+                 tolerance: Optional[float] = None,
+                 warm_start_file: Optional[Union[str, Path]] = None,
+                 warm_start_step: int = 0,
+                 seed: Optional[int] = None,
+                 compute_kpis: Optional[Callable[[Supervisor, int, Path], dict]] = None):
+        """Iterative day to day assignment: the same period is simulated several times
+        in this process on the loaded multi layer graph. Each iteration (day) starts
+        from the link speeds of the previous one instead of the free flow ones, and
+        the relative gap between the link travel times of two successive days is
+        reported to stop the iterations once they converged.
+
+        Args:
+            -mlgraph: the multi layer graph shared by all iterations, with its odlayer
+             and transit links already built
+            -build_supervisor: function that takes the graph, the iteration number and
+             the output directory of the iteration, and returns the supervisor to run.
+             It is called for each iteration and should return new users, the demand
+             index (e.g. the list of the users parameters or a CSVDemandManager copy)
+             and the decision model can be reused, the decision model then keeps its
+             snapping caches but it should not write an outfile. It should also add
+             new mobility services (with their initial vehicles) to the layers with
+             add_mobility_service before creating the supervisor, so that each day
+             starts from new fleets and requests instead of the ones of the previous day
+            -outdir: directory where the outputs of each iteration (in a sub directory
+             iteration_<i>, with the link costs file of the iteration) and the convergence
+             summary are written
+            -tstart: simulation start time
+            -tend: simulation end time
+            -flow_dt: the simulation flow time step
+            -affectation_factor: the number of simulation flow time step representing one affectation time step
+            -update_graph_threshold: threshold on the speed variation below which costs on the graph links are not updated
+            -nb_iterations: maximum number of iterations
+            -tolerance: the iterations stop as soon as the relative gap is lower than
+             this tolerance, all iterations are run if None
+            -warm_start_file: link costs file of a previous run the first iteration
+             starts from, it starts from the free flow speeds if None
+            -warm_start_step: affectation step of the previous run whose link speeds
+             seed the next iteration
+            -seed: seed of all iterations
+            -compute_kpis: function that returns a dict of KPIs at the end of an iteration
+        """
+        assert nb_iterations >= 1, 'The number of iterations should be at least 1'
+        self.mlgraph = mlgraph
+        self.build_supervisor = build_supervisor
+        self.outdir = Path(outdir)
+        self.tstart = tstart
+        self.tend = tend
+        self.flow_dt = flow_dt
+        self.affectation_factor = affectation_factor
+        self.update_graph_threshold = update_graph_threshold
+        self.nb_iterations = nb_iterations
+        self.tolerance = tolerance
+        self.warm_start_file = warm_start_file
+        self.warm_start_step = warm_start_step
+        self.seed = seed
+        self.compute_kpis = compute_kpis
+
+        self.converged = False
+        self._previous_services: List[AbstractMobilityService] = list()
+
+    def iteration_outdir(self, iteration: int) -> Path:
+        return self.outdir / f'iteration_{iteration}'
+
+    def warm_start_speeds(self, link_costs_file: Union[str, Path]) -> Dict[str, float]:
+        """Method that reads the link speeds an iteration starts from.
+
+        Args:
+            -link_costs_file: the link costs file of the previous run
+
+        Returns:
+            -dict of the speed of each link by link id
+        """
+        reader = LinkCostsReader(link_costs_file)
+        if reader.nb_chunks == 0:
+            return dict()
+        return reader.link_speeds_at(int(reader.steps[min(self.warm_start_step, reader.nb_chunks - 1)]))
+
+    def check_new_mobility_services(self, iteration: int):
+        """Method that checks that the mobility services of the layers were all added
+        for this iteration, a service of the previous iteration still holds the
+        vehicles and the requests at the end of that day.
+
+        Args:
+            -iteration: the iteration number
+        """
+        services = [s for layer in self.mlgraph.layers.values() for s in layer.mobility_services.values()]
+        reused = [s.id for s in services if any(s is p for p in self._previous_services)]
+        if reused:
+            raise ValueError(f'Day to day iteration {iteration} reuses the mobility services {reused} of the '
+                             f'previous iteration, build_supervisor should add new ones to the layers')
+        self._previous_services = services
+
+    def run_iteration(self, iteration: int, previous_link_costs_file: Optional[Path]) -> dict:
+        """Method that builds the supervisor of an iteration, warm starts it and runs it.
+
+        Args:
+            -iteration: the iteration number
+            -previous_link_costs_file: the link costs file the iteration starts from,
+             free flow if None
+
+        Returns:
+            -summary of the iteration
+        """
+        outdir = self.iteration_outdir(iteration)
+        outdir.mkdir(parents=True, exist_ok=True)
+        summary = {'ITERATION': iteration}
+
+        start = time()
+        supervisor = self.build_supervisor(self.mlgraph, iteration, outdir)
+        self.check_new_mobility_services(iteration)
+        supervisor.set_link_costs_file(outdir / self.LINK_COSTS_FILE)
+        supervisor.clear_users_state()
+        if previous_link_costs_file is not None:
+            supervisor.set_warm_start(link_speeds=self.warm_start_speeds(previous_link_costs_file))
+        summary['BUILD_TIME'] = time() - start
+
+        start = time()
+        supervisor.run(self.tstart, self.tend, self.flow_dt, self.affectation_factor,
+                       update_graph_threshold=self.update_graph_threshold, seed=self.seed)
+        summary['RUN_TIME'] = time() - start
+
+        if self.compute_kpis is not None:
+            summary.update(self.compute_kpis(supervisor, iteration, outdir))
+        return summary
+
+    def run(self) -> List[dict]:
+        """Method that runs the iterations until convergence or the maximum number of
+        iterations, and writes their summaries in the convergence summary file of the
+        output directory.
+
+        Returns:
+            -list of the summaries of the iterations, the GAP of the first one is None
+        """
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        self.converged = False
+        self._previous_services = list()
+        summaries = []
+        previous_link_costs_file = Path(self.warm_start_file) if self.warm_start_file is not None else None
+
+        for iteration in range(self.nb_iterations):
+            log.info('Day to day iteration %s', iteration)
+            summary = self.run_iteration(iteration, previous_link_costs_file)
+
+            link_costs_file = self.iteration_outdir(iteration) / self.LINK_COSTS_FILE
+            if iteration > 0:
+                summary['GAP'] = link_costs_gap(previous_link_costs_file, link_costs_file)
+                log.info('Iteration %s relative gap: %.5g', iteration, summary['GAP'])
+            else:
+                summary['GAP'] = None
+            summaries.append(summary)
+            self.write_summary(summaries)
+            previous_link_costs_file = link_costs_file
+
+            if self.tolerance is not None and summary['GAP'] is not None and summary['GAP'] < self.tolerance:
+                self.converged = True
+                log.info('Day to day assignment converged after %s iterations', iteration + 1)
+                break
+
+        return summaries
+
+    def write_summary(self, summaries: List[dict]):
+        """Method that writes the summaries of the iterations in the convergence summary
+        file of the output directory.
+
+        Args:
+            -summaries: list of the summaries of the iterations
+        """
+        columns = []
+        for summary in summaries:
+            columns.extend([k for k in summary.keys() if k not in columns])
+        with open(self.outdir / self.SUMMARY_FILE, 'w') as f:
+            csvhandler = csv.writer(f, delimiter=';', quotechar='|')
+            csvhandler.writerow(columns)
+            for summary in summaries:
+                csvhandler.writerow(['' if summary.get(c) is None else summary[c] for c in columns])
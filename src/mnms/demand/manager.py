@@ -1,4 +1,5 @@
 import csv
+from collections import deque
 import re
 import sys
 from abc import ABC, abstractmethod
@@ -46,7 +47,10 @@ class AbstractDemandManager(ABC):
 
     def construct_user_parameters(self, users: List[User]) -> None:
         for u in users:
-            u.parameters = self._user_parameter(u)
+            parameters = self._user_parameter(u)
+            # Users without parameters keep sharing the same empty mapping
+            if parameters or u.parameters:
+                u.parameters = parameters
 
     @abstractmethod
     def copy(self):
@@ -64,19 +68,34 @@ class BaseDemandManager(AbstractDemandManager):
     ----------
     users: List[User]
         list of User to manage
+    release_users: bool
+        if True, the manager takes the ownership of the list and drops its references
+        to the users once they departed, so that the users who finished their trip
+        can be freed, the copy, show_users and to_csv methods then only concern
+        the users who did not depart yet
     """
 
-    def __init__(self, users, user_parameters: Callable[[User], Dict] = lambda x: {}):
+    def __init__(self, users, user_parameters: Callable[[User], Dict] = lambda x: {}, release_users: bool = False):
         super(BaseDemandManager, self).__init__(user_parameters)
         self._users = users
-        self._iter_demand = iter(self._users)
-        self._current_user = next(self._iter_demand)
-
+        self._release_users = release_users
         self.nb_users = len(self._users)
+        if release_users:
+            # Departed users are popped from the left
+            self._users = deque(users)
+            users.clear()
+            self._iter_demand = self._pop_users()
+        else:
+            self._iter_demand = iter(self._users)
+        self._current_user = next(self._iter_demand, None)
+
+    def _pop_users(self):
+        while self._users:
+            yield self._users.popleft()
 
     def get_next_departures(self, tstart: Time, tend: Time) -> List[User]:
         departure = list()
-        while tstart <= self._current_user.departure_time < tend:
+        while self._current_user is not None and tstart <= self._current_user.departure_time < tend:
             # Attaching observers to Users
             for iobs, obs in enumerate(self._observers):
                 if self._user_to_attach[iobs] == 'all' or self._current_user.id in self._user_to_attach[iobs]:
@@ -91,7 +110,7 @@ class BaseDemandManager(AbstractDemandManager):
 
     def copy(self):
         cls = self.__class__
-        copy = cls(self._users)
+        copy = cls(list(self._users))
         return copy
 
     def show_users(self):
@@ -1,7 +1,8 @@
 from collections import defaultdict
 from copy import copy, deepcopy
 from enum import Enum
-from typing import Union, List, Tuple, Optional, Dict
+from types import MappingProxyType
+from typing import Union, List, Tuple, Optional, Dict, Sequence, NamedTuple
 
 from mnms.time import Time, Dt
 from mnms.tools.observer import TimeDependentSubject
@@ -24,10 +25,38 @@ class UserState(Enum):
     DEADEND = 6
 
 
+# Shared empty mappings of the users and paths, replaced at first write
+_NO_PARKED_VEHICLES = MappingProxyType({})
+_NO_PARAMETERS = MappingProxyType({})
+_NO_SERVICE_COSTS = MappingProxyType({})
+
+
+class UserSummary(NamedTuple):
+    """Small record of a user who finished her trip, it can be kept or written
+    instead of the User object."""
+    id: str
+    departure_time: Time
+    arrival_time: Optional[Time]
+    distance: float
+    achieved_path: Tuple[str, ...]
+    achieved_path_ms: Tuple[str, ...]
+
+
+def _default_pickup_dt():
+    return User.default_pickup_dt.copy()
+
+
 class User(TimeDependentSubject):
     default_response_dt = Dt(minutes=2)
     default_pickup_dt = Dt(minutes=5)
 
+    __slots__ = ('id', 'origin', 'destination', 'departure_time', 'arrival_time', 'available_mobility_services',
+                 'mobility_services_graph', 'response_dt', 'pickup_dt', 'parameters',
+                 'forced_path_chosen_mobility_services', '_current_node', '_current_link',
+                 '_remaining_link_length', '_position', '_achieved_path', '_achieved_path_ms', '_vehicle',
+                 '_waited_vehicle', '_requested_service', '_parked_personal_vehicles', '_distance',
+                 '_interrupted_path', '_state', '_deadend_at_next_node', '_path', '_user_flow')
+
     def __init__(self,
                  id: str,
                  origin: Union[str, Union[np.ndarray, List]],
@@ -66,9 +95,9 @@ class User(TimeDependentSubject):
         self.available_mobility_services = available_mobility_services if available_mobility_services is None else set(available_mobility_services)
         self.mobility_services_graph = mobility_services_graph
         self.response_dt = User.default_response_dt.copy() if response_dt is None else response_dt
-        self.pickup_dt = defaultdict(lambda: User.default_pickup_dt.copy()) if pickup_dt is None else defaultdict(lambda: pickup_dt)
+        self.pickup_dt = defaultdict(_default_pickup_dt) if pickup_dt is None else defaultdict(lambda: pickup_dt)
 
-        self.parameters: Dict = dict()
+        self.parameters: Dict = _NO_PARAMETERS
 
         self._current_node = None
         self._current_link = None
@@ -79,11 +108,13 @@ class User(TimeDependentSubject):
         self._vehicle = None
         self._waited_vehicle = None
         self._requested_service = None
-        self._parked_personal_vehicles = dict()
+        self._parked_personal_vehicles = _NO_PARKED_VEHICLES
         self._distance = 0
         self._interrupted_path = None
         self._state = UserState.STOP
         self._deadend_at_next_node = False
+        self._path = None
+        self._user_flow = None
 
         if path is None:
             self.path: Optional[Path] = None
@@ -95,6 +126,22 @@ class User(TimeDependentSubject):
     def __repr__(self):
         return f"User('{self.id}', {self.origin}->{self.destination}, {self.departure_time})"
 
+    @property
+    def path(self):
+        return self._path
+
+    @path.setter
+    def path(self, p: Optional["Path"]):
+        self._path = p
+        self.notify_path_change()
+
+    def notify_path_change(self):
+        """Method that notifies the user flow in which this user travels that the
+        nodes of user's path have changed.
+        """
+        if self._user_flow is not None:
+            self._user_flow.index_user_path(self)
+
     @property
     def current_node(self):
         return self._current_node
@@ -292,19 +339,26 @@ class User(TimeDependentSubject):
         """
         self.arrival_time = arrival_time
         self.set_state_arrived()
-        log.info(f"User {self.id} arrived at destination at {arrival_time}")
+        log.info("User %s arrived at destination at %s", self.id, arrival_time)
         self.notify(arrival_time)
 
+    def summary(self) -> UserSummary:
+        """Method that returns the summary record of this user, it holds no reference
+        to the simulation objects.
+        """
+        return UserSummary(self.id, self.departure_time, self.arrival_time, self._distance,
+                           tuple(self._achieved_path), tuple(self._achieved_path_ms))
+
     def set_pickup_dt(self, ms, dt):
         self.pickup_dt[ms] = dt
 
     def set_available_mobility_services(self, ams):
         self.available_mobility_services = ams
-        log.info(f'User {self.id} updated list of available mobility services to {self.available_mobility_services}')
+        log.info('User %s updated list of available mobility services to %s', self.id, self.available_mobility_services)
 
     def remove_available_mobility_service(self, ms):
         self.available_mobility_services.remove(ms)
-        log.info(f'User {self.id} updated list of available mobility services to {self.available_mobility_services}')
+        log.info('User %s updated list of available mobility services to %s', self.id, self.available_mobility_services)
 
     def cancel_match(self, mlgraph, cost):
         """Method that cancels user's current match by removing user's pickup and
@@ -355,7 +409,7 @@ class User(TimeDependentSubject):
             log.warning(f'Could not find the {ms_id} leg to modify in user path {self.path}...')
         else:
             ##TODO: Update path cost if it is used somehow after path leg modification because of ridesharing detour
-            pass
+            self.notify_path_change()
 
     def update_path(self, path: "Path", gnodes, mlgraph, cost: str, max_teleport_dist: float = None):
         """Method that updates the path of user.
@@ -750,10 +804,14 @@ class User(TimeDependentSubject):
             -ms: name of the mobility service with which is associated the parked vehicle
             -node: location where the personal vehicle is parked
         """
+        if self._parked_personal_vehicles is _NO_PARKED_VEHICLES:
+            self._parked_personal_vehicles = dict()
         self._parked_personal_vehicles[ms] = node
 
 
 class Path(object):
+    __slots__ = ('path_cost', 'nodes', 'link_indices', 'layers', 'mobility_services', 'service_costs')
+
     def __init__(self, cost: float=None, nodes: Union[List[str], Tuple[str]] = None):
         """
         Path object describing a User path in the simulation
@@ -764,14 +822,25 @@ class Path(object):
         """
         self.path_cost: float = cost
         self.nodes: Tuple[str] = nodes
+        # Optional integer ids of the links of the path in the graph index
+        self.link_indices: Optional[np.ndarray] = None
 
-        self.layers: List[Tuple[str, slice]] = list()
-        self.mobility_services = list()
-        self.service_costs = dict()
+        # Empty containers are shared until the path is decomposed
+        self.layers: Sequence[Tuple[str, slice]] = ()
+        self.mobility_services: Sequence[str] = ()
+        self.service_costs = _NO_SERVICE_COSTS
 
     def set_mobility_services(self, ms):
         self.mobility_services = ms
 
+    def set_link_indices(self, index: "GraphIndex"):
+        """Method that sets the integer ids of the links of this path.
+
+        Args:
+            -index: the index of the graph where path is defined
+        """
+        self.link_indices = index.path_link_indices(self.nodes)
+
     def construct_layers_from_links(self, gnodes):
         previous_layer = gnodes[self.nodes[0]].adj[self.nodes[1]].label
         index = 0
@@ -787,6 +856,7 @@ class Path(object):
         self.layers = layers
 
     def construct_layers(self, gnodes):
+        layers = list(self.layers)
         layer = gnodes[self.nodes[1]].label
         start = 1
         nodes_number = len(self.nodes)
@@ -797,31 +867,35 @@ class Path(object):
             # with a transit link, this is the case when user transfer from one
             # bus line to another bus line belonging to the same layer for example
             if ilayer != layer or linklayer == 'TRANSIT':
-                self.layers.append((layer, slice(start, i, 1)))
+                layers.append((layer, slice(start, i, 1)))
                 layer = ilayer
                 start = i
-        self.layers.append((layer, slice(start, nodes_number-1, 1)))
+        layers.append((layer, slice(start, nodes_number-1, 1)))
+        self.layers = layers
 
     def __repr__(self):
         return f"Path(path_cost={self.path_cost}, nodes={self.nodes}, layers={self.layers}, services={self.mobility_services})"
 
     def __eq__(self, other: "Path"):
         same_nodes = (self.nodes == other.nodes)
-        same_ms = (self.mobility_services == other.mobility_services)
+        same_ms = (tuple(self.mobility_services) == tuple(other.mobility_services))
         return same_nodes and same_ms
 
     def __deepcopy__(self, memo={}):
         cls = self.__class__
         result = cls.__new__(cls)
         memo[id(self)] = result
-        for k, v in self.__dict__.items():
-            setattr(result, k, deepcopy(v, memo))
+        # The shared empty mapping is immutable, it is not copied
+        memo[id(_NO_SERVICE_COSTS)] = _NO_SERVICE_COSTS
+        for k in cls.__slots__:
+            setattr(result, k, deepcopy(getattr(self, k), memo))
         return result
 
     def __copy__(self):
         cls = self.__class__
         result = cls.__new__(cls)
-        result.__dict__.update(self.__dict__)
+        for k in cls.__slots__:
+            setattr(result, k, getattr(self, k))
         return result
 
     def update_path_cost(self, mlgraph, cost):
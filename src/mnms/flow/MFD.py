@@ -69,11 +69,11 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
         self.dict_speeds: Optional[Dict] = None
         self.remaining_length: Optional[Dict] = None
 
-        self.veh_manager: Optional[VehicleManager] = None
         self.graph_nodes: Optional[Dict] = None
 
         self._layer_link_length_mapping: Dict[str, LinkInfo] = dict()
         self._section_to_reservoir: Dict[str, Union[str, None]] = dict()
+        self._link_to_reservoir: Dict[Tuple[str, str], Union[str, None]] = dict()    # (unode, dnode), reservoir id
 
     def _reset_mapping(self):
         graph = self._graph.graph
@@ -104,6 +104,7 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
 
                 self._layer_link_length_mapping[lid] = LinkInfo(link, link_layer.vehicle_type.upper(), sections_length)
 
+        self._link_to_reservoir = dict()
         res_links = {res.id: roads.zones[res.id] for res in self.reservoirs.values()}
         res_dict = {res.id: res for res in self.reservoirs.values()}
         for section in roads.sections.keys():
@@ -128,10 +129,85 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
         self.dict_speeds[None] = {m: 0 for r in self.reservoirs.values() for m in r.modes} | {None: 0}
         self.remaining_length = dict()
 
-        self.veh_manager = VehicleManager()
+        if self.veh_manager is None:
+            self.veh_manager = VehicleManager.default()
         self.graph_nodes = self._graph.graph.nodes
 
         self._reset_mapping()
+        self._apply_warm_start()
+
+    def _apply_warm_start(self):
+        """Method that applies the traffic conditions set with set_warm_start to the
+        reservoirs and the links costs.
+        """
+        if self._warm_start_accumulations is not None:
+            self._set_reservoirs_accumulations(self._warm_start_accumulations)
+            self.update_graph(0)
+        if self._warm_start_speeds is not None:
+            self._set_links_speeds(self._warm_start_speeds)
+        if self._warm_start_accumulations is not None or self._warm_start_speeds is not None:
+            log.info('Flow motor warm started')
+
+    def _set_reservoirs_accumulations(self, accumulations: Dict[str, Dict[str, float]]):
+        """Method that sets the accumulations of the reservoirs and updates their speeds.
+
+        Args:
+            -accumulations: accumulation of each mode by reservoir id
+        """
+        for resid, res_accumulations in accumulations.items():
+            res = self.reservoirs.get(resid)
+            if res is None:
+                log.warning('Unknown reservoir %s in warm start accumulations', resid)
+                continue
+            res.update_accumulations(res_accumulations)
+            res.update_speeds()
+
+    def _set_links_speeds(self, link_speeds: Dict[str, float]):
+        """Method that sets the speeds of links and updates their costs accordingly.
+
+        Args:
+            -link_speeds: speed by link id, the transit links, the unknown links and
+             the non positive speeds are ignored
+        """
+        linkcosts = {}
+        updated_links = {}
+        for lid, speed in link_speeds.items():
+            link_info = self._layer_link_length_mapping.get(lid)
+            if link_info is None or not speed > 0:
+                continue
+            total_len = sum(length for _, length in link_info.sections)
+            linkcosts[lid] = self._compute_link_costs(link_info.link, float(speed), total_len)
+            updated_links[lid] = link_info.link
+
+        self._set_links_costs(updated_links, linkcosts)
+
+    def _compute_link_costs(self, link: Link, speed: float, length: float) -> Dict[str, Dict[str, float]]:
+        """Method that computes the critical and scalar generalized costs of a link
+        for a new speed.
+
+        Args:
+            -link: the link
+            -speed: the new speed on the link
+            -length: the length of the link
+
+        Returns:
+            -the costs of each mobility service of the link
+        """
+        costs = defaultdict(dict)
+
+        # Update critical costs first
+        for mservice in link.costs.keys():
+            costs[mservice] = {'travel_time': length / speed,
+                               'speed': speed,
+                               'length': length}
+
+        # The update the generalized one
+        costs_functions = self._graph.layers[link.label]._costs_functions
+        for mservice, cost_funcs in costs_functions.items():
+            for cost_name, cost_f in cost_funcs.items():
+                costs[mservice][cost_name] = cost_f(self._graph, link, costs)
+
+        return costs
 
     def add_reservoir(self, res: Reservoir):
         self.reservoirs[res.id] = res
@@ -201,11 +277,17 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
             return dt
 
     def get_vehicle_zone(self, veh):
+        current_link = veh.current_link
+        res_id = self._link_to_reservoir.get(current_link, False)
+        if res_id is not False:
+            return res_id
         try:
-            unode, dnode = veh.current_link
+            unode, dnode = current_link
             curr_link = self.graph_nodes[unode].adj[dnode]
             lid = self._graph.map_reference_links[curr_link.id][0]  # take reservoir of first part of trip
             res_id = self._graph.roads.sections[lid].zone
+            # The reservoir of a link does not change, memorize it
+            self._link_to_reservoir[current_link] = res_id
         except:
             pos = veh.position
             res_id = None
@@ -218,7 +300,7 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
 
     def step(self, dt: Dt):
 
-        log.info(f'MFD step {self._tcurrent}')
+        log.info('MFD step %s', self._tcurrent)
 
         for res in self.reservoirs.values():
             ghost_acc = res.ghost_accumulation(self._tcurrent)
@@ -241,7 +323,7 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
             if veh.is_moving:
                 self.count_moving_vehicle(veh, current_vehicles)
 
-        log.info(f"Moving {len(current_vehicles)} vehicles")
+        log.info("Moving %s vehicles", len(current_vehicles))
 
         # Update the traffic conditions
         for res in self.reservoirs.values():
@@ -274,7 +356,7 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
 
     def finish_vehicle_activities(self, veh: Vehicle):
         elapsed_time = Dt(seconds=veh.remaining_link_length / veh.speed)
-        log.info(f"{veh} finished its activity {veh.activity_type}")
+        log.info("%s finished its activity %s", veh, veh.activity_type)
         veh.update_distance(veh.remaining_link_length)
         veh._remaining_link_length = 0
         veh._current_node = veh._current_link[1]
@@ -293,14 +375,9 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
         """
 
         graph = self._graph.graph
-        banned_links = self._graph.dynamic_space_sharing.banned_links
-        banned_cost = self._graph.dynamic_space_sharing.cost
-
-        link_layers = list()
-        for _, layer in self._graph.layers.items():
-            link_layers.append(layer.graph.links)
 
         linkcosts = {}
+        updated_links = {}
 
         for lid, link in graph.links.items():
             if link.label == 'TRANSIT':
@@ -321,34 +398,48 @@ class MFDFlowMotor(AbstractMFDFlowMotor):
                     new_speed += length * old_speed
             new_speed = new_speed / total_len if total_len != 0 else new_speed
             if new_speed != 0 and abs(new_speed - old_speed) > threshold:
-                costs = defaultdict(dict)
-
-                # Update critical costs first
-                for mservice in link.costs.keys():
-                    costs[mservice] = {'travel_time': total_len / new_speed,
-                                       'speed': new_speed,
-                                       'length': total_len}
-
-                # The update the generalized one
-                costs_functions = layer._costs_functions
-                for mservice, cost_funcs in costs_functions.items():
-                    for cost_name, cost_f in cost_funcs.items():
-                        costs[mservice][cost_name] = cost_f(self._graph, link, costs)
-
-                # Test if link is banned, if yes do not update the cost for the banned mobility service
-                if lid in banned_links:
-                    mservice = banned_links[lid].mobility_service
-                    costs[mservice].pop(banned_cost, None)
-
-                linkcosts[lid]=costs
-
-                # Update of the cost in the corresponding graph layer
-                for links in link_layers:
-                    if lid in links:
-                        links[lid].update_costs(costs)
-                        break
-        if len(linkcosts) > 0:
-            graph.update_costs(linkcosts)
+                linkcosts[lid] = self._compute_link_costs(link, new_speed, total_len)
+                updated_links[lid] = link
+
+        self._set_links_costs(updated_links, linkcosts)
+
+    def _set_links_costs(self, links: Dict[str, Link], linkcosts: Dict[str, Dict[str, Dict[str, float]]]):
+        """Method that evaluates the vectorized cost functions of the layers on the
+        updated links, then sets their costs in the layers and the transportation graph.
+
+        Args:
+            -links: the updated links
+            -linkcosts: the critical and scalar generalized costs of the updated links
+        """
+        if len(linkcosts) == 0:
+            return
+
+        banned_links = self._graph.dynamic_space_sharing.banned_links
+        banned_cost = self._graph.dynamic_space_sharing.cost
+
+        # Vectorized cost functions are evaluated once per layer, after the scalar ones
+        layers_lids = defaultdict(list)
+        for lid, link in links.items():
+            layers_lids[link.label].append(lid)
+        for label, lids in layers_lids.items():
+            layer = self._graph.layers[label]
+            if layer.has_vectorized_costs_functions:
+                layer.compute_vectorized_costs(self._graph, [links[lid] for lid in lids],
+                                               [linkcosts[lid] for lid in lids])
+
+        for lid, costs in linkcosts.items():
+            # Test if link is banned, if yes do not update the cost for the banned mobility service
+            if lid in banned_links:
+                mservice = banned_links[lid].mobility_service
+                costs[mservice].pop(banned_cost, None)
+
+            # Update of the cost in the corresponding graph layer
+            layer_links = self._graph.layers[links[lid].label].graph.links
+            if lid in layer_links:
+                layer_links[lid].update_costs(costs)
+
+        self._graph.graph.update_costs(linkcosts)
+        self._graph.mark_updated_links(linkcosts.keys())
 
     def write_result(self, step_affectation: int, step_flow:int):
         tcurrent = self._tcurrent.time
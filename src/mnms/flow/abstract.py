@@ -6,6 +6,7 @@ import csv
 from mnms.graph.zone import Zone
 from mnms.time import Time, Dt
 from mnms.graph.layers import MultiLayerGraph
+from mnms.vehicles.manager import VehicleManager
 
 class AbstractReservoir(ABC):
     def __init__(self, zone: Zone, modes: List[str]):
@@ -67,6 +68,11 @@ class AbstractMFDFlowMotor(ABC):
 
         self._demand = dict()
         self._tcurrent: Time = Time()
+        self.veh_manager: Optional[VehicleManager] = None
+
+        # State from which the runs start instead of the free flow one, see set_warm_start
+        self._warm_start_speeds: Optional[Dict[str, float]] = None
+        self._warm_start_accumulations: Optional[Dict[str, Dict[str, float]]] = None
 
         if outfile is None:
             self._write = False
@@ -78,6 +84,9 @@ class AbstractMFDFlowMotor(ABC):
     def set_graph(self, mlgraph: MultiLayerGraph):
         self._graph = mlgraph
 
+    def set_vehicle_manager(self, veh_manager: VehicleManager):
+        self.veh_manager = veh_manager
+
     def set_time(self, time:Time):
         self._tcurrent = time.copy()
 
@@ -96,6 +105,23 @@ class AbstractMFDFlowMotor(ABC):
     def update_graph(self, threshold):
         pass
 
+    def set_warm_start(self,
+                       link_speeds: Optional[Dict[str, float]] = None,
+                       accumulations: Optional[Dict[str, Dict[str, float]]] = None):
+        """Method that sets the traffic conditions from which the next runs start, e.g.
+        the ones of a previous run, instead of the free flow ones. They are applied
+        when the motor is initialized, after the initialization of the graph costs.
+
+        Args:
+            -link_speeds: speed of the links by link id, e.g. read from a link costs file
+             with LinkCostsReader.link_speeds_at, the other links start at the default
+             speed of their layer
+            -accumulations: accumulation of each mode by reservoir id, the speeds of the
+             reservoirs computed from them are applied to the links first
+        """
+        self._warm_start_speeds = link_speeds
+        self._warm_start_accumulations = accumulations
+
     def write_result(self, step_affectation:int, step_flow:int):
         raise NotImplementedError(f"{self.__class__.__name__} do not implement a write_result method")
 
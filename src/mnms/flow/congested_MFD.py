@@ -1,5 +1,5 @@
-from collections import deque, defaultdict
-from typing import List, Callable, Dict, Optional, Deque
+from bisect import bisect_left
+from typing import List, Callable, Dict, Optional
 from dataclasses import dataclass, field
 
 from mnms.flow.MFD import MFDFlowMotor
@@ -12,7 +12,7 @@ from mnms.vehicles.veh_type import Vehicle, Car
 @dataclass
 class QueuedVehicle:
     veh: Vehicle
-    entrance_time: Time
+    entrance_time: float        # in seconds
     previous_reservoir: str
     id: str = field(init=False)
 
@@ -41,16 +41,61 @@ class CongestedReservoir(AbstractReservoir):
         self.f_entry: Callable[[int, int], float] = f_entry
         self.f_speed = f_speed
         self.n_car_max: int = n_car_max
-        self.car_queue: Deque[QueuedVehicle] = deque()
+        # Queue of the vehicles waiting to enter the reservoir, the released vehicles
+        # are skipped with a head index and the list is compacted from time to time
+        self._queue: List[QueuedVehicle] = list()
+        # Time from which each vehicle can leave the queue, i.e. the max of the entrance
+        # times of the vehicles up to it in the queue, it is sorted
+        self._release_times: List[float] = list()
+        self._queue_head = 0
         self.last_car_entrance = None
-        self.time_interval = Time("00:00:00")
+        self.time_interval = 0.
         self.car_in_outgoing_queues = 0
 
         self.update_speeds()
 
-    def compute_time_interval(self, entrance_time: Time):
-        self.time_interval = entrance_time.add_time(
-            Dt(seconds=1/self.f_entry(self.dict_accumulations["CAR"], self.n_car_max)))
+    @property
+    def car_queue(self) -> List[QueuedVehicle]:
+        return self._queue[self._queue_head:]
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._queue) - self._queue_head
+
+    def enqueue(self, queued_veh: QueuedVehicle):
+        """Method that adds a vehicle at the end of the queue of this reservoir.
+
+        Args:
+            -queued_veh: the queued vehicle
+        """
+        release_time = queued_veh.entrance_time
+        if self.queue_length > 0:
+            release_time = max(release_time, self._release_times[-1])
+        self._queue.append(queued_veh)
+        self._release_times.append(release_time)
+
+    def release(self, tcurrent: float) -> List[QueuedVehicle]:
+        """Method that removes from the queue the vehicles whose entrance time is
+        passed, stopping at the first vehicle which cannot enter yet.
+
+        Args:
+            -tcurrent: current time in seconds
+
+        Returns:
+            -the released vehicles in the order of the queue
+        """
+        head = self._queue_head
+        end = bisect_left(self._release_times, tcurrent, lo=head)
+        released = self._queue[head:end]
+        self._queue_head = end
+        if self._queue_head > 64 and 2 * self._queue_head > len(self._queue):
+            del self._queue[:self._queue_head]
+            del self._release_times[:self._queue_head]
+            self._queue_head = 0
+        return released
+
+    def compute_time_interval(self, entrance_time: float):
+        self.time_interval = entrance_time + 1/self.f_entry(self.dict_accumulations["CAR"], self.n_car_max)
 
     def update_speeds(self):
         updated_acc = {k: v for k, v in self.dict_accumulations.items()}
@@ -75,39 +120,20 @@ class CongestedMFDFlowMotor(MFDFlowMotor):
         super(CongestedMFDFlowMotor, self).__init__(outfile)
 
         self.reservoirs: Dict[str, CongestedReservoir] = dict()
+        # Ids of the queued vehicles, maintained as vehicles are enqueued and released
         self.car_in_queues = set()
-        self.car_previous_zone = defaultdict(set)
 
     def step(self, dt: Dt):
-        # self.car_in_queues = {queued_car.id for res in self.reservoirs.values() for queued_car in res.car_queue}
-
+        tcurrent = self._tcurrent.to_seconds()
         for res_id, res in self.reservoirs.items():
-            # ind_to_del = 0
-            car_queue = res.car_queue
-            to_pop = 0
-            for queued_car in car_queue:
-                if queued_car.entrance_time < self._tcurrent:
-                    speed = self.dict_speeds[res_id]["CAR"]
-                    queued_car.veh.speed = speed
-                    self.move_veh(queued_car.veh, self._tcurrent, dt.to_seconds(), speed)
-                    to_pop += 1
-                else:
-                    break
-
-            for _ in range(to_pop):
-                car_queue.popleft()
-
-        self.car_previous_zone = defaultdict(set)
-        self.car_in_queues = set()
-
-        for res in self.reservoirs.values():
-            for queued_car in res.car_queue:
-                queued_car_id = queued_car.id
-                self.car_in_queues.add(queued_car_id)
-                self.car_previous_zone[queued_car.previous_reservoir].add(queued_car_id)
-
-        for resid, res in self.reservoirs.items():
-            res.car_in_outgoing_queues = len(self.car_previous_zone[resid])
+            for queued_car in res.release(tcurrent):
+                self.car_in_queues.discard(queued_car.id)
+                previous_res = self.reservoirs.get(queued_car.previous_reservoir)
+                if previous_res is not None:
+                    previous_res.car_in_outgoing_queues -= 1
+                speed = self.dict_speeds[res_id]["CAR"]
+                queued_car.veh.speed = speed
+                self.move_veh(queued_car.veh, self._tcurrent, dt.to_seconds(), speed)
 
         super(CongestedMFDFlowMotor, self).step(dt)
 
@@ -119,11 +145,15 @@ class CongestedMFDFlowMotor(MFDFlowMotor):
 
             if previous_veh_zone != next_veh_zone:
                 new_res = self.reservoirs[next_veh_zone]
-                entrance_time = self._tcurrent.add_time(Dt(seconds=elapsed_time))
-                res_time_interval = new_res.time_interval.copy()
+                entrance_time = self._tcurrent.to_seconds() + elapsed_time
+                res_time_interval = new_res.time_interval
                 new_res.compute_time_interval(entrance_time)
                 if entrance_time <= res_time_interval:
-                    new_res.car_queue.append(QueuedVehicle(veh, entrance_time, previous_veh_zone))
+                    new_res.enqueue(QueuedVehicle(veh, entrance_time, previous_veh_zone))
+                    self.car_in_queues.add(veh.id)
+                    previous_res = self.reservoirs.get(previous_veh_zone)
+                    if previous_res is not None:
+                        previous_res.car_in_outgoing_queues += 1
                     upnode, downode = veh.current_link
                     link = self.graph_nodes[upnode].adj[downode]
 
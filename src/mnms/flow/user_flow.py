@@ -1,4 +1,5 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple, Iterable
+from collections import defaultdict
 
 import numpy as np
 import sys
@@ -31,7 +32,16 @@ class UserFlow(object):
 
         self._waiting_answer: Dict[str, tuple[Time, AbstractMobilityService]] = dict()
 
+        # Inverted index of the transit links of the paths of the users
+        self._transit_link_users: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self._users_transit_links: Dict[str, List[Tuple[str, str]]] = dict()
+        self._users_ranks: Dict[str, int] = dict()
+        self._rank_counter = 0
+
+        # Nodes of the graph, the graph builds a new dict at each access so it is
+        # only read again when the topology of the graph changes
         self._gnodes = None
+        self._gnodes_version = None
 
     def set_graph(self, mlgraph:MultiLayerGraph):
         """Method to associate a multi layer graph to a UserFlow object.
@@ -40,6 +50,16 @@ class UserFlow(object):
             -mlgraph: multi layer graph on which users travel
         """
         self._graph = mlgraph
+        self._gnodes = None
+
+    def _graph_nodes(self) -> Dict:
+        """Method that returns the nodes of the graph, read again only if nodes
+        or links were added to or deleted from the graph since the last call.
+        """
+        if self._gnodes is None or self._gnodes_version != self._graph.topology_version:
+            self._gnodes = self._graph.graph.nodes
+            self._gnodes_version = self._graph.topology_version
+        return self._gnodes
 
     def set_time(self, time:Time):
         """Method to set current time for the UserFlow module.
@@ -57,6 +77,72 @@ class UserFlow(object):
         """
         self._tcurrent = self._tcurrent.add_time(dt)
 
+    def add_user(self, user: User):
+        """Method that adds a user to the users traveling in this user flow.
+
+        Args:
+            -user: the user to add
+        """
+        self.users[user.id] = user
+        self._users_ranks[user.id] = self._rank_counter
+        self._rank_counter += 1
+        user._user_flow = self
+        self.index_user_path(user)
+
+    def remove_user(self, uid: str):
+        """Method that removes a user from the users traveling in this user flow.
+
+        Args:
+            -uid: id of the user to remove
+        """
+        user = self.users.pop(uid)
+        self._unindex_user_path(uid)
+        del self._users_ranks[uid]
+        user._user_flow = None
+
+    def index_user_path(self, user: User):
+        """Method that updates the index of the transit links of user's path, it is
+        called each time user's path changes.
+
+        Args:
+            -user: the user whose path has changed
+        """
+        self._unindex_user_path(user.id)
+        if user.path is None:
+            return
+        gnodes = self._graph_nodes()
+        unodes = user.path.nodes
+        transit_links = list()
+        for i in range(len(unodes)-1):
+            link = gnodes[unodes[i]].adj.get(unodes[i+1]) if unodes[i] in gnodes else None
+            # A link absent from the graph has been deleted, keep it indexed as well
+            if link is None or link.label == "TRANSIT":
+                transit_links.append((unodes[i], unodes[i+1]))
+                self._transit_link_users[(unodes[i], unodes[i+1])].add(user.id)
+        self._users_transit_links[user.id] = transit_links
+
+    def _unindex_user_path(self, uid: str):
+        for l in self._users_transit_links.pop(uid, []):
+            users = self._transit_link_users[l]
+            users.discard(uid)
+            if not users:
+                del self._transit_link_users[l]
+
+    def get_users_on_links(self, links: Iterable[Tuple[str, str]]) -> List[User]:
+        """Method that returns the users of this user flow whose path passes through
+        at least one of the transit links, in the order in which users were added.
+
+        Args:
+            -links: list of transit links as (upstream node, downstream node)
+
+        Returns:
+            -list of users
+        """
+        uids = set()
+        for l in links:
+            uids.update(self._transit_link_users.get(l, ()))
+        return [self.users[uid] for uid in sorted(uids, key=self._users_ranks.__getitem__)]
+
     def set_user_position(self, user: User):
         """Method to move/update the position of a user.
 
@@ -85,7 +171,7 @@ class UserFlow(object):
         finish_walk_and_request = list()
         finish_walk = list()
         finish_trip = list()
-        graph = self._graph.graph
+        gnodes = self._graph_nodes()
         for uid in self._walking.keys():
             user = self.users[uid]
             if user.state == UserState.WALKING:
@@ -118,10 +204,10 @@ class UserFlow(object):
                             else:
                                 cnode_ind = user.get_current_node_index()
                                 next_next_node = upath[cnode_ind + 1]
-                                next_link = graph.nodes[user.current_node].adj[next_next_node]
+                                next_link = gnodes[user.current_node].adj[next_next_node]
                                 if next_link.label == 'TRANSIT':
                                     # User keeps walking
-                                    log.info(f"User {uid} enters connection on {next_link.id}")
+                                    log.info("User %s enters connection on %s", uid, next_link.id)
                                     dist_travelled = dist_travelled - remaining_length
                                     self._walking[uid] = next_link.length
                                     user.current_link = (user.current_node, next_next_node)
@@ -146,13 +232,13 @@ class UserFlow(object):
 
         for user in finish_walk_and_request:
             del self._walking[user.id]
-            log.info(f'User {user.id} is about to request a vehicle because he has finished walking')
+            log.info('User %s is about to request a vehicle because he has finished walking', user.id)
             user.set_state_waiting_answer()
             requested_mservice = self._request_user_vehicles(user)
             self._waiting_answer.setdefault(user.id, (user.response_dt.copy(),requested_mservice))
 
         for user in finish_trip:
-            del self.users[user.id]
+            self.remove_user(user.id)
             del self._walking[user.id]
 
     def _request_user_vehicles(self, user):
@@ -178,7 +264,7 @@ class UserFlow(object):
                 if slice_nodes.start == ind_node_start:
                     mservice_id = user.path.mobility_services[ilayer]
                     mservice = self._graph.layers[layer].mobility_services[mservice_id]
-                    log.info(f"User {user.id} requests mobility service {mservice._id}")
+                    log.info("User %s requests mobility service %s", user.id, mservice._id)
                     mservice.add_request(user, upath[slice_nodes][-1], self._tcurrent)
                     user.requested_service = mservice
                     return mservice
@@ -200,14 +286,14 @@ class UserFlow(object):
             -refused_users: the list of users who can be considered as refused by the
                             mobility service they requested
         """
-        log.info(f"Step User Flow {self._tcurrent}")
-        self._gnodes = self._graph.graph.nodes
+        log.info("Step User Flow %s", self._tcurrent)
+        self._graph_nodes()
 
         refused_user = self.check_user_waiting_answers(dt)
 
         for u in new_users:
             if u.path is not None:
-                self.users[u.id] = u
+                self.add_user(u)
 
         self.determine_user_states()
 
@@ -234,21 +320,21 @@ class UserFlow(object):
                     u.notify(self._tcurrent)
                 elif next_link.label == "TRANSIT":
                     # User is about to walk
-                    log.info(f"User {u.id} enters connection on {next_link.id}")
+                    log.info("User %s enters connection on %s", u.id, next_link.id)
                     u.set_state_walking()
                     self._walking[u.id] = next_link.length
                 else:
                     # User is about to request a service
                     self._walking.pop(u.id, None)
                     u.set_state_waiting_answer()
-                    log.info(f'User {u.id} is about to request a vehicle because he is stopped')
+                    log.info('User %s is about to request a vehicle because he is stopped', u.id)
                     requested_mservice = self._request_user_vehicles(u)
                     self._waiting_answer.setdefault(u.id, (u.response_dt.copy(),requested_mservice))
 
                 u.notify(self._tcurrent)
 
         for uid in to_del:
-            self.users.pop(uid)
+            self.remove_user(uid)
 
     def check_user_waiting_answers(self, dt: Dt):
         """Method to manage users who are waiting an answer from a mobility service.
@@ -264,7 +350,7 @@ class UserFlow(object):
             if self.users[uid].state is UserState.WAITING_ANSWER:
                 new_time = time.to_seconds() - dt.to_seconds()
                 if new_time <= 0:
-                    log.info(f"User {uid} waited answer too long, cancels request for {requested_mservice._id}")
+                    log.info("User %s waited answer too long, cancels request for %s", uid, requested_mservice._id)
                     requested_mservice.cancel_request(uid)
                     refused_users.append(self.users[uid])
                     # Interrupt user's path but keep user in the list of user_flow
@@ -301,14 +387,19 @@ class UserFlow(object):
         """
         interrupted_users = []
         users_canceling = []
-        for u in list(self.users.values()) + new_users:
+        deleted_links = set(deleted_links)
+        # Users of the user flow are found through the index of the transit links of
+        # their paths, new users are not indexed yet and are checked one by one
+        candidates = self.get_users_on_links(deleted_links) + [u for u in new_users if u.id not in self.users]
+        for u in candidates:
             if u.id != matched_user_id and u.path is not None:
                 unodes = u.path.nodes
                 path_links = [(unodes[i],unodes[i+1]) for i in range(len(unodes)-1)]
-                intersect = set(deleted_links).intersection(set(path_links))
+                intersect = deleted_links.intersection(path_links)
                 if len(intersect) > 0:
-                    log.info(f"User {u.id} was supposed to pass through links {intersect} which were deleted, '\
-                        f'trigger an INTERRUPTION event (current node = {u.current_node}, state = {u.state})")
+                    log.info('User %s was supposed to pass through links %s which were deleted, '\
+                             'trigger an INTERRUPTION event (current node = %s, state = %s)',
+                             u.id, intersect, u.current_node, u.state)
                     interrupted_users.append(u)
                     # Clean eventual request already formulated by user to this service
                     if u.id in service._user_buffer.keys():
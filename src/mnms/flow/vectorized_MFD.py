@@ -0,0 +1,379 @@
+from typing import List, Callable, Dict, Optional, Tuple, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from mnms.flow.MFD import MFDFlowMotor
+from mnms.graph.zone import Zone
+from mnms.log import create_logger
+from mnms.time import Dt, Time
+from mnms.vehicles.manager import VehicleManager
+from mnms.vehicles.veh_type import Vehicle
+
+log = create_logger(__name__)
+
+
+def greenshields_speed_function(v_free, n_jam, pcu=None, v_min: float = 0.) -> Callable[[np.ndarray], np.ndarray]:
+    """Returns a vectorized Greenshields MFD speed function, the speed of each mode in
+    reservoir r is v_free[r, m] * (1 - n[r] / n_jam[r]), where n[r] is the accumulation
+    of reservoir r in passenger car units.
+
+    Args:
+        -v_free: free flow speeds, array like broadcastable to (n_reservoirs, n_modes)
+        -n_jam: jam accumulations, scalar or array of shape (n_reservoirs,)
+        -pcu: passenger car unit of each mode, array of shape (n_modes,), 1 for all
+         modes by default
+        -v_min: minimal speed
+
+    Returns:
+        -the speed function taking the accumulations array and returning the speeds array
+    """
+    v_free = np.asarray(v_free, dtype=float)
+    n_jam = np.asarray(n_jam, dtype=float)
+
+    def f_speed(accumulations: np.ndarray) -> np.ndarray:
+        weights = np.ones(accumulations.shape[1]) if pcu is None else np.asarray(pcu, dtype=float)
+        ratio = np.clip(1 - (accumulations @ weights) / n_jam, 0, 1)
+        return np.maximum(v_free * ratio[:, None], v_min)
+
+    return f_speed
+
+
+def linear_3d_mfd_speed_function(v_free, coefficients, v_min: float = 0.) -> Callable[[np.ndarray], np.ndarray]:
+    """Returns a vectorized linear 3D-MFD speed function, the speed of mode m in
+    reservoir r is v_free[r, m] - sum_k coefficients[r, m, k] * n[r, k], where n[r, k]
+    is the accumulation of mode k in reservoir r.
+
+    Args:
+        -v_free: free flow speeds, array like broadcastable to (n_reservoirs, n_modes)
+        -coefficients: impact of the accumulation of each mode on the speed of each mode,
+         array of shape (n_modes, n_modes) shared by all reservoirs or (n_reservoirs, n_modes, n_modes)
+        -v_min: minimal speed
+
+    Returns:
+        -the speed function taking the accumulations array and returning the speeds array
+    """
+    v_free = np.asarray(v_free, dtype=float)
+    coefficients = np.asarray(coefficients, dtype=float)
+
+    def f_speed(accumulations: np.ndarray) -> np.ndarray:
+        if coefficients.ndim == 2:
+            impact = accumulations @ coefficients.T
+        else:
+            impact = np.einsum('rmk,rk->rm', coefficients, accumulations)
+        return np.maximum(v_free - impact, v_min)
+
+    return f_speed
+
+
+class ReservoirSet(object):
+    def __init__(self,
+                 zones: List[Zone],
+                 modes: List[str],
+                 f_speed: Callable[[np.ndarray], np.ndarray]):
+        """
+        Set of MFD reservoirs whose accumulations and speeds are stored in arrays of
+        shape (n_reservoirs, n_modes), the speeds of all reservoirs are computed by
+        one call to a vectorized speed function
+
+        Args:
+            zones: The zones corresponding to the reservoirs
+            modes: The modes in the reservoirs
+            f_speed: The vectorized MFD speed function, it takes the accumulations array
+                     and returns the speeds array
+        """
+        self.zones: List[Zone] = zones
+        self.ids: List[str] = [z.id for z in zones]
+        self.modes: List[str] = modes
+        self.reservoir_index: Dict[str, int] = {rid: i for i, rid in enumerate(self.ids)}
+        self.mode_index: Dict[str, int] = {m: i for i, m in enumerate(modes)}
+        self.f_speed = f_speed
+
+        self.accumulations = np.zeros((len(zones), len(modes)))
+        self.speeds = np.zeros((len(zones), len(modes)))
+
+        # Ghost accumulations, the row of the last time lower or equal to the current
+        # time is used, no ghost accumulation before the first time
+        self._ghost_times: Optional[np.ndarray] = None
+        self._ghost_table: Optional[np.ndarray] = None
+
+        self.update_speeds(self.accumulations)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.accumulations.shape
+
+    def set_ghost_accumulation_table(self, times: List[Union[Time, float]], table):
+        """Method that sets the ghost accumulations of all reservoirs as a step
+        function of time.
+
+        Args:
+            -times: increasing times (Time or seconds) from which each row of the table applies
+            -table: array like of shape (n_times, n_reservoirs, n_modes)
+        """
+        times = np.array([t.to_seconds() if isinstance(t, Time) else t for t in times], dtype=float)
+        table = np.asarray(table, dtype=float)
+        assert table.shape == (len(times),) + self.shape, \
+            f'Ghost accumulation table should be of shape {(len(times),) + self.shape}'
+        assert np.all(np.diff(times) > 0), 'Ghost accumulation times should be increasing'
+        self._ghost_times = times
+        self._ghost_table = table
+
+    def ghost_accumulations(self, tcurrent: float) -> np.ndarray:
+        """Method that returns the ghost accumulations at a certain time.
+
+        Args:
+            -tcurrent: time in seconds
+
+        Returns:
+            -array of shape (n_reservoirs, n_modes)
+        """
+        if self._ghost_times is None:
+            return np.zeros(self.shape)
+        ind = np.searchsorted(self._ghost_times, tcurrent, side='right') - 1
+        if ind < 0:
+            return np.zeros(self.shape)
+        return self._ghost_table[ind].copy()
+
+    def update_speeds(self, accumulations: np.ndarray) -> np.ndarray:
+        self.accumulations = accumulations
+        self.speeds = np.asarray(self.f_speed(accumulations), dtype=float).reshape(self.shape)
+        return self.speeds
+
+
+class VectorizedMFDFlowMotor(MFDFlowMotor):
+    def __init__(self, reservoirs: ReservoirSet, outfile: Optional[str] = None):
+        """
+        MFD flow motor whose reservoirs are gathered in a ReservoirSet, the traffic
+        conditions of all reservoirs and the speeds on the graph links are updated
+        with array operations
+
+        Args:
+            reservoirs: The set of reservoirs
+            outfile: If not None, write ouptut in that file
+        """
+        super(VectorizedMFDFlowMotor, self).__init__(outfile)
+        self.reservoir_set: ReservoirSet = reservoirs
+
+        self._section_to_reservoir_index: Dict[str, int] = dict()
+        # Reservoir of each link indexed by its integer id in the graph index, -1
+        # outside all reservoirs, -2 if unknown (the vehicle position is then used)
+        self._link_reservoir_index: np.ndarray = np.zeros(0, dtype=int)
+
+        # Data of the non transit links used to update their speeds
+        self._links_ids: List[str] = list()
+        self._links_mode_index: Optional[np.ndarray] = None
+        self._links_length: Optional[np.ndarray] = None
+        self._links_speeds: Optional[np.ndarray] = None
+        self._links_weights: Optional[csr_matrix] = None
+        self._links_outside_weights: Optional[np.ndarray] = None
+
+    def add_reservoir(self, res):
+        raise TypeError('VectorizedMFDFlowMotor does not accept individual reservoirs, '
+                        'define all of them with the ReservoirSet given at its creation')
+
+    def _reset_mapping(self):
+        # Computes the sections of each link
+        super(VectorizedMFDFlowMotor, self)._reset_mapping()
+
+        rset = self.reservoir_set
+        self._section_to_reservoir_index = dict()
+        for i, zone in reversed(list(enumerate(rset.zones))):
+            # The first reservoir containing a section is kept
+            for section in zone.sections:
+                self._section_to_reservoir_index[section] = i
+
+        index = self._graph.index
+        self._link_reservoir_index = np.full(index.nb_links, -2, dtype=int)
+        for lid, ind in index.link_index.items():
+            sections = self._graph.map_reference_links.get(lid)
+            if sections:
+                # Take reservoir of first part of trip
+                self._link_reservoir_index[ind] = self._section_to_reservoir_index.get(sections[0], -1)
+
+        rows, cols, weights = [], [], []
+        self._links_ids = list()
+        links_mode_index = []
+        links_length = []
+        links_speeds = []
+        links_outside_weights = []
+        for lid, link_info in self._layer_link_length_mapping.items():
+            link = link_info.link
+            layer = self._graph.layers[link.label]
+            row = len(self._links_ids)
+            self._links_ids.append(lid)
+            links_mode_index.append(rset.mode_index.get(link_info.veh, -1))
+            links_speeds.append(link.costs[list(layer.mobility_services.keys())[0]]["speed"])
+            total_len = sum(length for _, length in link_info.sections)
+            links_length.append(total_len)
+            outside_weight = 0.
+            for section, length in link_info.sections:
+                w = length / total_len if total_len != 0 else 0.
+                res_ind = self._section_to_reservoir_index.get(section)
+                if res_ind is None:
+                    outside_weight += w
+                else:
+                    rows.append(row)
+                    cols.append(res_ind)
+                    weights.append(w)
+            links_outside_weights.append(outside_weight)
+
+        self._links_mode_index = np.array(links_mode_index, dtype=int)
+        self._links_length = np.array(links_length, dtype=float)
+        self._links_speeds = np.array(links_speeds, dtype=float)
+        self._links_outside_weights = np.array(links_outside_weights, dtype=float)
+        self._links_weights = csr_matrix((weights, (rows, cols)), shape=(len(self._links_ids), len(rset.zones)))
+
+    def initialize(self, walk_speed):
+        self._graph.initialize_costs(walk_speed)
+
+        if self.veh_manager is None:
+            self.veh_manager = VehicleManager.default()
+        self.graph_nodes = self._graph.graph.nodes
+
+        self._reset_mapping()
+        self._apply_warm_start()
+
+    def _set_reservoirs_accumulations(self, accumulations: Dict[str, Dict[str, float]]):
+        rset = self.reservoir_set
+        new_accumulations = rset.accumulations.copy()
+        for resid, res_accumulations in accumulations.items():
+            i = rset.reservoir_index.get(resid)
+            if i is None:
+                log.warning('Unknown reservoir %s in warm start accumulations', resid)
+                continue
+            for mode, acc in res_accumulations.items():
+                j = rset.mode_index.get(mode)
+                if j is not None:
+                    new_accumulations[i, j] = acc
+        rset.update_speeds(new_accumulations)
+
+    def _set_links_speeds(self, link_speeds: Dict[str, float]):
+        super(VectorizedMFDFlowMotor, self)._set_links_speeds(link_speeds)
+        # Keep the speeds compared by update_graph in line with the graph
+        for i, lid in enumerate(self._links_ids):
+            speed = link_speeds.get(lid)
+            if speed is not None and speed > 0:
+                self._links_speeds[i] = speed
+
+    def get_vehicle_reservoir_index(self, veh: Vehicle) -> int:
+        """Method that returns the index in the reservoir set of the reservoir where
+        a vehicle is, -1 if it is outside all reservoirs.
+
+        Args:
+            -veh: the vehicle
+        """
+        res_ind = -2
+        current_link = veh.current_link
+        if current_link is not None:
+            try:
+                link_ind = self._graph.index.get_link_index(*current_link)
+            except KeyError:
+                link_ind = None
+            if link_ind is not None and link_ind < len(self._link_reservoir_index):
+                res_ind = int(self._link_reservoir_index[link_ind])
+        if res_ind == -2:
+            pos = veh.position
+            res_ind = -1
+            for i, zone in enumerate(self.reservoir_set.zones):
+                if zone.is_inside([pos]):
+                    res_ind = i
+                    break
+        return res_ind
+
+    def get_vehicle_zone(self, veh):
+        res_ind = self.get_vehicle_reservoir_index(veh)
+        return self.reservoir_set.ids[res_ind] if res_ind >= 0 else None
+
+    def step(self, dt: Dt):
+
+        log.info('Vectorized MFD step %s', self._tcurrent)
+
+        rset = self.reservoir_set
+        accumulations = rset.ghost_accumulations(self._tcurrent.to_seconds())
+
+        while self.veh_manager.has_new_vehicles:
+            new_veh = self.veh_manager._new_vehicles.pop()
+            if new_veh.position is None:
+                self.set_vehicle_position(new_veh)
+            new_veh.notify(self._tcurrent)
+
+        # Calculate accumulations
+        current_vehicles = list()
+        vehicles_modes = list()
+        vehicles_reservoirs = list()
+        mode_index = rset.mode_index
+        for veh_id, veh in self.veh_manager._vehicles.items():
+            if veh.activity is None:
+                veh.next_activity(self._tcurrent)
+            while veh.activity.is_done:
+                veh.next_activity(self._tcurrent)
+            if veh.is_moving:
+                current_vehicles.append(veh)
+                vehicles_modes.append(mode_index.get(veh.type.upper(), -1))
+                vehicles_reservoirs.append(self.get_vehicle_reservoir_index(veh))
+
+        log.info("Moving %s vehicles", len(current_vehicles))
+
+        if current_vehicles:
+            vehicles_modes = np.array(vehicles_modes, dtype=int)
+            vehicles_reservoirs = np.array(vehicles_reservoirs, dtype=int)
+            counted = (vehicles_modes >= 0) & (vehicles_reservoirs >= 0)
+            np.add.at(accumulations, (vehicles_reservoirs[counted], vehicles_modes[counted]), 1)
+
+        # Update the traffic conditions
+        speeds = rset.update_speeds(accumulations)
+
+        # Move the vehicles
+        new_time = self._tcurrent.add_time(dt)
+        for veh, mode_ind in zip(current_vehicles, vehicles_modes):
+            veh_dt = dt.to_seconds()
+            while veh_dt > 0:
+                res_ind = self.get_vehicle_reservoir_index(veh)
+                speed = float(speeds[res_ind, mode_ind]) if res_ind >= 0 and mode_ind >= 0 else 0.
+                veh.speed = speed
+                elapsed_time = self.move_veh(veh, self._tcurrent, veh_dt, speed)
+                veh_dt -= elapsed_time
+            veh.notify(new_time)
+            veh.notify_passengers(new_time)
+
+    def update_graph(self, threshold):
+        """Method that updates the costs on links of the transportation graph.
+
+        Args:
+            -threshold: threshold on the speed variation below which costs are not
+             updated on a certain link
+        """
+        if len(self._links_ids) == 0:
+            return
+
+        # Length weighted mean of the speeds of the reservoirs crossed by each link
+        reservoirs_speeds = self._links_weights @ self.reservoir_set.speeds
+        has_mode = self._links_mode_index >= 0
+        new_speeds = np.zeros(len(self._links_ids))
+        new_speeds[has_mode] = reservoirs_speeds[np.nonzero(has_mode)[0], self._links_mode_index[has_mode]]
+        new_speeds += self._links_outside_weights * self._links_speeds
+
+        to_update = np.nonzero((new_speeds != 0) & (np.abs(new_speeds - self._links_speeds) > threshold))[0]
+        if len(to_update) == 0:
+            return
+
+        linkcosts = {}
+        updated_links = {}
+        for i in to_update:
+            lid = self._links_ids[i]
+            link = self._layer_link_length_mapping[lid].link
+            new_speed = float(new_speeds[i])
+            linkcosts[lid] = self._compute_link_costs(link, new_speed, float(self._links_length[i]))
+            updated_links[lid] = link
+            self._links_speeds[i] = new_speed
+
+        self._set_links_costs(updated_links, linkcosts)
+
+    def write_result(self, step_affectation: int, step_flow: int):
+        tcurrent = self._tcurrent.time
+        rset = self.reservoir_set
+        for i, resid in enumerate(rset.ids):
+            for j, mode in enumerate(rset.modes):
+                self._csvhandler.writerow([str(step_affectation), str(step_flow), tcurrent, resid, mode,
+                                           rset.speeds[i, j], rset.accumulations[i, j]])
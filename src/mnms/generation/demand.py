@@ -1,13 +1,108 @@
-from operator import attrgetter
-from itertools import count
-import numpy as np
-from random import choice
+import csv
+from math import ceil
+from typing import Callable, Optional, Tuple, Union
+from pathlib import Path
 
+import numpy as np
 
-from hipop.shortest_path import dijkstra
+from hipop.shortest_path import parallel_dijkstra
 from mnms.demand.user import User
 from mnms.time import Time
 from mnms.demand.manager import BaseDemandManager
+from mnms.log import create_logger
+from mnms.tools.execution import ExecutionResources
+
+log = create_logger(__name__)
+
+
+def _draw_random_demand(mlgraph: "MultiLayerGraph",
+                        nb_user: int,
+                        tstart: str,
+                        tend: str,
+                        min_cost: float,
+                        cost_path: Optional[str],
+                        distrib_time: Optional[Callable],
+                        repeat: int,
+                        seed: Optional[int],
+                        batch_size: int,
+                        thread_number: Optional[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Draws the origins, destinations and departure times of a random demand, the
+    candidate origin destination pairs are drawn by batches and their costs computed
+    with one parallel_dijkstra call per batch. The arrays are empty if no pair is
+    accepted.
+
+    Returns:
+        -origins: array of origin ids sorted by departure time
+        -destinations: array of destination ids sorted by departure time
+        -departures: sorted array of departure times in seconds
+    """
+    if cost_path is None:
+        cost_path = "length"
+
+    rng = np.random.default_rng(seed)
+
+    tstart = Time(tstart).to_seconds()
+    tend = Time(tend).to_seconds()
+
+    origins = np.array(list(mlgraph.odlayer.origins.keys()))
+    destinations = np.array(list(mlgraph.odlayer.destinations.keys()))
+
+    graph = mlgraph.graph
+    resources = ExecutionResources.default()
+
+    map_layer_services = {lid: list(layer.mobility_services.keys())[0] for lid, layer in mlgraph.layers.items()}
+    map_layer_services["TRANSIT"] = "WALK"
+
+    nb_pairs = ceil(nb_user / repeat)
+    accepted_origins = []
+    accepted_destinations = []
+    nb_accepted = 0
+    acceptance_rate = 1.
+    while nb_accepted < nb_pairs:
+        # Oversample according to the acceptance rate observed so far
+        nb_candidates = min(batch_size, ceil(1.1 * (nb_pairs - nb_accepted) / acceptance_rate))
+        ind_origins = rng.integers(len(origins), size=nb_candidates)
+        ind_destinations = rng.integers(len(destinations), size=nb_candidates)
+        batch_origins = origins[ind_origins]
+        batch_destinations = destinations[ind_destinations]
+
+        paths = parallel_dijkstra(graph,
+                                  batch_origins.tolist(),
+                                  batch_destinations.tolist(),
+                                  [map_layer_services] * nb_candidates,
+                                  cost_path,
+                                  resources.nb_threads(nb_candidates) if thread_number is None else thread_number)
+        costs = np.array([cost for _, cost in paths], dtype=float)
+        mask = (min_cost <= costs) & (costs < float('inf'))
+        nb_valid = int(mask.sum())
+        if nb_valid == 0 and nb_candidates == batch_size:
+            log.warning(f'No origin destination pair with a {cost_path} of at least {min_cost} found among '
+                        f'{nb_candidates} candidates, only {nb_accepted * repeat} users are generated')
+            nb_pairs = nb_accepted
+            break
+        acceptance_rate = max(nb_valid / nb_candidates, 1e-3)
+
+        # Keep the pairs in drawing order so that the demand only depends on the seed
+        nb_kept = min(nb_valid, nb_pairs - nb_accepted)
+        accepted_origins.append(batch_origins[mask][:nb_kept])
+        accepted_destinations.append(batch_destinations[mask][:nb_kept])
+        nb_accepted += nb_kept
+
+    if nb_accepted == 0:
+        return origins[:0], destinations[:0], np.empty(0)
+    pair_origins = np.concatenate(accepted_origins)
+    pair_destinations = np.concatenate(accepted_destinations)
+
+    if distrib_time is None:
+        departures = rng.uniform(tstart, tend, size=nb_pairs * repeat)
+    else:
+        departures = np.array([distrib_time(tstart, tend) for _ in range(nb_pairs * repeat)], dtype=float)
+
+    order = np.argsort(departures, kind='stable')
+    user_origins = np.repeat(pair_origins, repeat)[order]
+    user_destinations = np.repeat(pair_destinations, repeat)[order]
+
+    return user_origins, user_destinations, departures[order]
 
 
 def generate_random_demand(mlgraph: "MultiLayerGraph",
@@ -16,61 +111,98 @@ def generate_random_demand(mlgraph: "MultiLayerGraph",
                            tend="18:00:00",
                            min_cost=0,
                            cost_path=None,
-                           distrib_time=np.random.uniform,
-                           repeat=1, seed=None) -> BaseDemandManager:
+                           distrib_time=None,
+                           repeat=1,
+                           seed=None,
+                           batch_size: int = 10000,
+                           thread_number: Optional[int] = None) -> BaseDemandManager:
     """Create a random demand by using the extremities of the mobility_graph as origin destination pair, the departure
     time use a distribution function to generate the departure between tstart and tend.
 
     Args:
         mmgraph: The graph use to generate the demand
+        nb_user: Number of users to generate, rounded up to a multiple of repeat
         tstart: Lower bound of departure time
         tend: Upper boumd of departure time
         min_cost: Minimal cost to accept an origin destination pair
         cost_path: The name of the cost to use for shortest path
-        distrib_time: Distribution function to generate random departure dates
+        distrib_time: Distribution function to generate random departure dates, called
+                      with tstart and tend in seconds, uniform if None
         repeat: Repeat each origin destination pair
-        seed: Random seed
+        seed: Random seed, the demand is the same for a given seed
+        batch_size: Maximal number of origin destination pairs checked at once
+        thread_number: Number of threads used to compute the costs of the pairs, taken
+                       from the default execution resources if None
 
     Returns:
         The generated demand
 
     """
-    if cost_path is None:
-        cost_path = "length"
+    origins, destinations, departures = _draw_random_demand(mlgraph, nb_user, tstart, tend, min_cost, cost_path,
+                                                            distrib_time, repeat, seed, batch_size, thread_number)
 
-    if seed is not None:
-        np.random.seed(seed)
-
-    tstart = Time(tstart).to_seconds()
-    tend = Time(tend).to_seconds()
-
-    demand = []
-    origins = list(mlgraph.odlayer.origins.keys())
-    destinations = list(mlgraph.odlayer.destinations.keys())
-    uid = count(0)
-
-    graph = mlgraph.graph
-    user_count = 0
-
-    map_layer_services = {lid:list(layer.mobility_services.keys())[0] for lid, layer in mlgraph.layers.items()}
-    map_layer_services["TRANSIT"] = "WALK"
+    demand = [User(str(i), o, d, Time.from_seconds(t)) for i, (o, d, t) in
+              enumerate(zip(origins.tolist(), destinations.tolist(), departures.tolist()))]
+    return BaseDemandManager(demand)
 
-    while user_count <= nb_user:
-        unode = choice(origins)
-        dnode = choice(destinations)
 
-        _, path_cost = dijkstra(graph, unode, dnode, cost_path, map_layer_services)
-        if min_cost <= path_cost < float('inf'):
-            demand.extend([User(str(next(uid)), unode, dnode, Time.from_seconds(distrib_time(tstart, tend))) for _ in
-                           range(repeat)])
-            user_count+=repeat
+def _format_departures(departures: np.ndarray):
+    """Formats departure times in seconds as HH:MM:SS.ss strings."""
+    centiseconds = np.rint(departures * 100).astype(np.int64)
+    hours, centiseconds = np.divmod(centiseconds, 360000)
+    minutes, centiseconds = np.divmod(centiseconds, 6000)
+    seconds, centiseconds = np.divmod(centiseconds, 100)
+    return [f'{h:02d}:{m:02d}:{s:02d}.{c:02d}' for h, m, s, c in
+            zip(hours.tolist(), minutes.tolist(), seconds.tolist(), centiseconds.tolist())]
+
+
+def generate_random_demand_file(mlgraph: "MultiLayerGraph",
+                                filename: Union[str, Path],
+                                nb_user: int,
+                                tstart="07:00:00",
+                                tend="18:00:00",
+                                min_cost=0,
+                                cost_path=None,
+                                distrib_time=None,
+                                repeat=1,
+                                seed=None,
+                                batch_size: int = 10000,
+                                thread_number: Optional[int] = None,
+                                delimiter: str = ';'):
+    """Same as generate_random_demand but the users are written by chunks in a CSV
+    file readable by CSVDemandManager instead of being created, it should be preferred
+    for large demands.
 
-    demand.sort(key=attrgetter('departure_time'))
+    Args:
+        mmgraph: The graph use to generate the demand
+        filename: The CSV file to write
+        nb_user: Number of users to generate, rounded up to a multiple of repeat
+        tstart: Lower bound of departure time
+        tend: Upper boumd of departure time
+        min_cost: Minimal cost to accept an origin destination pair
+        cost_path: The name of the cost to use for shortest path
+        distrib_time: Distribution function to generate random departure dates, called
+                      with tstart and tend in seconds, uniform if None
+        repeat: Repeat each origin destination pair
+        seed: Random seed, the demand is the same for a given seed
+        batch_size: Maximal number of origin destination pairs checked at once, also
+                    the number of users written at once
+        thread_number: Number of threads used to compute the costs of the pairs, taken
+                       from the default execution resources if None
+        delimiter: Delimiter of the CSV file
+    """
+    origins, destinations, departures = _draw_random_demand(mlgraph, nb_user, tstart, tend, min_cost, cost_path,
+                                                            distrib_time, repeat, seed, batch_size, thread_number)
 
-    uid = count(0)
-    for u in demand:
-        u.id = str(next(uid))
-    return BaseDemandManager(demand)
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerow(["ID", "DEPARTURE", "ORIGIN", "DESTINATION"])
+        for start in range(0, len(departures), batch_size):
+            end = start + batch_size
+            writer.writerows(zip(map(str, range(start, min(end, len(departures)))),
+                                 _format_departures(departures[start:end]),
+                                 origins[start:end],
+                                 destinations[start:end]))
 
 
 if __name__ == "__main__":
@@ -86,4 +218,4 @@ if __name__ == "__main__":
 
     demand.to_csv("random_demand_20x20.csv")
     save_odlayer(mlgraph.odlayer, "odlayer_20x20.json")
-    save_graph(mlgraph, "manhattan_20x20.json")
\ No newline at end of file
+    save_graph(mlgraph, "manhattan_20x20.json")
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Optional, Dict, Callable, List, Tuple
+from typing import Optional, Dict, Callable, List, Tuple, Iterable
+from collections import defaultdict
 
 from mnms.time import Time
 from mnms.vehicles.veh_type import Vehicle, VehicleActivity
@@ -34,8 +35,12 @@ class DynamicSpaceSharing(object):
         assert dt >= 0, "Dynamic Space Sharing dt must be strictly positive"
         self._dt = dt
 
-    def ban_link(self, lid: str, mobility_service: str, period: int, vehicles: List[Vehicle]) -> List[Tuple[Vehicle, VehicleActivity]]:
-        link = self.graph.graph.links[lid]
+    def ban_link(self, lid: str, mobility_service: str, period: int, vehicles: Iterable[Vehicle]) -> List[Tuple[Vehicle, VehicleActivity]]:
+        link_border = self._set_banned_link(lid, mobility_service, period)
+        return self.find_vehicles_to_reroute([link_border], vehicles)[link_border]
+
+    def _set_banned_link(self, lid: str, mobility_service: str, period: int) -> Tuple[str, str]:
+        link = self.graph.graph.get_link(lid)
         costs = link.costs
 
         banned_link = BannedLink(lid, mobility_service, costs[mobility_service][self.cost], period)
@@ -45,66 +50,103 @@ class DynamicSpaceSharing(object):
 
         self.graph.graph.update_link_costs(lid, costs)
         layer = self.graph.mapping_layer_services[mobility_service]
-        layer.graph.links[lid].update_costs(costs)
+        layer.graph.get_link(lid).update_costs(costs)
+        self.graph.mark_updated_links([lid])
 
+        return (link.upstream, link.downstream)
 
-        link_border = (link.upstream, link.downstream)
+    @staticmethod
+    def find_vehicles_to_reroute(link_borders: List[Tuple[str, str]], vehicles: Iterable[Vehicle]) -> Dict[Tuple[str, str], List[Tuple[Vehicle, VehicleActivity]]]:
+        """Method that indexes the vehicles planning to pass through some links in one
+        pass over the paths of the vehicles activities.
 
-        vehicles_to_reroute = []
+        Args:
+            -link_borders: the links as (upstream node, downstream node)
+            -vehicles: the vehicles to check
 
+        Returns:
+            -dict with, for each link, the list of vehicles and the activity to reroute
+             because its path passes through the link
+        """
+        link_borders = set(link_borders)
+        link_vehicles = defaultdict(list)
         for veh in vehicles:
-            current_link = veh.current_link
-
             current_act = veh.activity
-            path = [p[0] for p in current_act.path]
-
-            ind_veh_link = path.index(current_link)
-
-            try:
-                ind_banned_link = path.index(link_border)
-            except ValueError:
-                for act in veh.activities:
-                    path = {p[0] for p in act.path}
-                    if link_border in path:
-                        vehicles_to_reroute.append((veh, act))
+            if current_act is None:
                 continue
-
-            if ind_banned_link > ind_veh_link:
-                vehicles_to_reroute.append((veh, current_act))
-
-        return vehicles_to_reroute
+            # Index of the first passage through each link of the current activity path
+            path_indices = dict()
+            for i, p in enumerate(current_act.path):
+                path_indices.setdefault(p[0], i)
+            ind_veh_link = path_indices.get(veh.current_link, -1)
+
+            queued_act_links = None
+            for link_border in link_borders:
+                ind_banned_link = path_indices.get(link_border)
+                if ind_banned_link is None:
+                    if queued_act_links is None:
+                        queued_act_links = [(act, {p[0] for p in act.path}) for act in veh.activities]
+                    for act, act_links in queued_act_links:
+                        if link_border in act_links:
+                            link_vehicles[link_border].append((veh, act))
+                elif ind_banned_link > ind_veh_link:
+                    link_vehicles[link_border].append((veh, current_act))
+
+        return link_vehicles
 
     def unban_link(self, lid: str):
-        link = self.graph.graph.links[lid]
+        link = self.graph.graph.get_link(lid)
         costs = link.costs
         costs[self.banned_links[lid].mobility_service][self.cost] = self.banned_links[lid].previous_cost
         self.graph.graph.update_link_costs(lid, costs)
         layer = self.graph.mapping_layer_services[self.banned_links[lid].mobility_service]
-        layer.graph.links[lid].update_costs(costs)
+        layer.graph.get_link(lid).update_costs(costs)
+        self.graph.mark_updated_links([lid])
 
-    def update(self, tcurrent: Time, vehicles: List[Vehicle]) -> List[Tuple[Vehicle, VehicleActivity]]:
-        to_del = list()
+    def update(self, tcurrent: Time, vehicles: Iterable[Vehicle]) -> List[Tuple[Vehicle, VehicleActivity]]:
+        """Method that unbans the links whose period is over and bans the links returned
+        by the dynamic rule.
 
+        Args:
+            -tcurrent: current time
+            -vehicles: the vehicles of the simulation, only iterated if a link is banned
+
+        Returns:
+            -the list of vehicles and activities to reroute, each pair appears once
+        """
         vehicle_to_reroute = []
         self._flow_step_counter += 1
 
-        for lid, banned_link in self.banned_links.items():
-            banned_link.period -= 1
-            if banned_link.period <= 0:
-                to_del.append(lid)
+        if self.banned_links:
+            to_del = list()
+            for lid, banned_link in self.banned_links.items():
+                banned_link.period -= 1
+                if banned_link.period <= 0:
+                    to_del.append(lid)
 
-        for lid in to_del:
-            self.unban_link(lid)
+            for lid in to_del:
+                self.unban_link(lid)
 
-            del self.banned_links[lid]
+                del self.banned_links[lid]
 
         if self._flow_step_counter >= self._dt:
             self._flow_step_counter = 0
             new_banned_links = self._dynamic(self.graph, tcurrent)
 
+            link_borders = []
             for lid, mobility_service, period in new_banned_links:
                 if lid not in self.banned_links:
-                    vehicle_to_reroute.extend(self.ban_link(lid, mobility_service, period, vehicles))
+                    link_borders.append(self._set_banned_link(lid, mobility_service, period))
+
+            if link_borders:
+                # Vehicles are indexed once for all the links banned at this step
+                link_vehicles = self.find_vehicles_to_reroute(link_borders, vehicles)
+                rerouted = set()
+                for link_border in link_borders:
+                    for veh, act in link_vehicles.get(link_border, []):
+                        if (id(veh), id(act)) not in rerouted:
+                            rerouted.add((id(veh), id(act)))
+                            vehicle_to_reroute.append((veh, act))
 
         return vehicle_to_reroute
 
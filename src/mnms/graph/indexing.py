@@ -0,0 +1,226 @@
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+class GraphIndex(object):
+    """Dense integer ids of the nodes and links of a multi layer graph, with the
+    attributes of the links stored in arrays indexed by these ids.
+
+    The ids are interned: a node or a link keeps its integer id for the whole
+    simulation, the links deleted from the graph (e.g. the transit links of a
+    disconnected station) are only flagged as inactive, and new nodes and links
+    get the next free ids. String ids should only be reconstructed at the I/O
+    boundaries.
+
+    Attributes:
+        node_ids (list): string id of each node, indexed by integer id
+        node_index (dict): integer id of each node, by string id
+        link_ids (list): string id of each link, indexed by integer id
+        link_index (dict): integer id of each link, by string id
+        layer_ids (list): ids of the layers ('TRANSIT' included) the links belong to
+        link_upstream (np.ndarray): integer id of the upstream node of each link
+        link_downstream (np.ndarray): integer id of the downstream node of each link
+        link_length (np.ndarray): length of each link
+        link_layer (np.ndarray): index in layer_ids of the layer of each link
+        link_active (np.ndarray): False for the links deleted from the graph
+    """
+
+    def __init__(self, mlgraph: "MultiLayerGraph"):
+        self._mlgraph = mlgraph
+
+        self.node_ids: List[str] = list()
+        self.node_index: Dict[str, int] = dict()
+        self.link_ids: List[str] = list()
+        self.link_index: Dict[str, int] = dict()
+        self.layer_ids: List[str] = list()
+        self._layer_index: Dict[str, int] = dict()
+        self._links_by_nodes: Dict[Tuple[str, str], int] = dict()
+
+        self.link_upstream = np.zeros(0, dtype=np.int64)
+        self.link_downstream = np.zeros(0, dtype=np.int64)
+        self.link_length = np.zeros(0, dtype=float)
+        self.link_layer = np.zeros(0, dtype=np.int32)
+        self.link_active = np.zeros(0, dtype=bool)
+
+        self.update()
+
+    @property
+    def nb_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def nb_links(self) -> int:
+        return len(self.link_ids)
+
+    def intern_node(self, nid: str) -> int:
+        """Method that returns the integer id of a node, a new one if the node has
+        never been interned.
+
+        Args:
+            -nid: string id of the node
+        """
+        ind = self.node_index.get(nid)
+        if ind is None:
+            ind = len(self.node_ids)
+            self.node_index[nid] = ind
+            self.node_ids.append(nid)
+        return ind
+
+    def intern_link(self, lid: str) -> int:
+        """Method that returns the integer id of a link, a new one if the link has
+        never been interned.
+
+        Args:
+            -lid: string id of the link
+        """
+        ind = self.link_index.get(lid)
+        if ind is None:
+            ind = len(self.link_ids)
+            self.link_index[lid] = ind
+            self.link_ids.append(lid)
+        return ind
+
+    def _intern_layer(self, label: str) -> int:
+        ind = self._layer_index.get(label)
+        if ind is None:
+            ind = len(self.layer_ids)
+            self._layer_index[label] = ind
+            self.layer_ids.append(label)
+        return ind
+
+    def update(self):
+        """Method that synchronizes the index with the current nodes and links of
+        the graph, the already interned ids are kept.
+        """
+        graph = self._mlgraph.graph
+        for nid in graph.nodes.keys():
+            self.intern_node(nid)
+
+        links = graph.links
+        for lid in links.keys():
+            self.intern_link(lid)
+
+        nb_links = len(self.link_ids)
+        upstream = np.full(nb_links, -1, dtype=np.int64)
+        downstream = np.full(nb_links, -1, dtype=np.int64)
+        length = np.full(nb_links, np.nan)
+        layer = np.full(nb_links, -1, dtype=np.int32)
+        active = np.zeros(nb_links, dtype=bool)
+        # Attributes of the inactive links are kept from the previous update
+        nb_previous = len(self.link_active)
+        upstream[:nb_previous] = self.link_upstream
+        downstream[:nb_previous] = self.link_downstream
+        length[:nb_previous] = self.link_length
+        layer[:nb_previous] = self.link_layer
+
+        links_by_nodes = dict()
+        node_index = self.node_index
+        link_index = self.link_index
+        for lid, link in links.items():
+            ind = link_index[lid]
+            unode = link.upstream
+            dnode = link.downstream
+            upstream[ind] = node_index[unode]
+            downstream[ind] = node_index[dnode]
+            length[ind] = link.length
+            layer[ind] = self._intern_layer(link.label)
+            active[ind] = True
+            links_by_nodes[(unode, dnode)] = ind
+
+        self.link_upstream = upstream
+        self.link_downstream = downstream
+        self.link_length = length
+        self.link_layer = layer
+        self.link_active = active
+        self._links_by_nodes = links_by_nodes
+
+    def get_link_index(self, unode: str, dnode: str) -> int:
+        """Method that returns the integer id of the active link between two nodes.
+
+        Args:
+            -unode: string id of the upstream node
+            -dnode: string id of the downstream node
+        """
+        return self._links_by_nodes[(unode, dnode)]
+
+    def path_link_indices(self, nodes: Sequence[str]) -> np.ndarray:
+        """Method that returns the integer ids of the links of a path.
+
+        Args:
+            -nodes: string ids of the nodes of the path
+
+        Returns:
+            -the array of integer ids of the successive links
+        """
+        links_by_nodes = self._links_by_nodes
+        return np.fromiter((links_by_nodes[(nodes[i], nodes[i+1])] for i in range(len(nodes)-1)),
+                           dtype=np.int64, count=max(len(nodes)-1, 0))
+
+    def vehicle_path_link_indices(self, veh_path: Iterable[Tuple[Tuple[str, str], float]]) -> np.ndarray:
+        """Method that returns the integer ids of the links of a vehicle activity path.
+
+        Args:
+            -veh_path: the vehicle activity path, list of ((unode, dnode), length)
+
+        Returns:
+            -the array of integer ids of the successive links
+        """
+        links_by_nodes = self._links_by_nodes
+        return np.array([links_by_nodes[key] for key, _ in veh_path], dtype=np.int64)
+
+    def link_indices_to_nodes(self, link_indices: Sequence[int]) -> List[str]:
+        """Method that reconstructs the string ids of the nodes of a path from the
+        integer ids of its links.
+
+        Args:
+            -link_indices: integer ids of the successive links of the path
+        """
+        if len(link_indices) == 0:
+            return []
+        link_indices = np.asarray(link_indices, dtype=np.int64)
+        node_ids = self.node_ids
+        nodes = [node_ids[self.link_upstream[link_indices[0]]]]
+        nodes.extend(node_ids[n] for n in self.link_downstream[link_indices].tolist())
+        return nodes
+
+    def link_indices_to_vehicle_path(self, link_indices: Sequence[int]) -> List[Tuple[Tuple[str, str], float]]:
+        """Method that reconstructs a vehicle activity path from the integer ids of
+        its links.
+
+        Args:
+            -link_indices: integer ids of the successive links of the path
+        """
+        link_indices = np.asarray(link_indices, dtype=np.int64)
+        node_ids = self.node_ids
+        return [((node_ids[u], node_ids[d]), l) for u, d, l in zip(self.link_upstream[link_indices].tolist(),
+                                                                   self.link_downstream[link_indices].tolist(),
+                                                                   self.link_length[link_indices].tolist())]
+
+    def get_layer_mask(self, layer_id: str) -> np.ndarray:
+        """Method that returns the mask of the active links of a layer.
+
+        Args:
+            -layer_id: id of the layer, 'TRANSIT' for the transit links
+        """
+        ind = self._layer_index.get(layer_id, -2)
+        return (self.link_layer == ind) & self.link_active
+
+    def link_costs(self, mobility_service: str, cost_name: str, default: float = np.nan) -> np.ndarray:
+        """Method that returns the current value of a cost on all links.
+
+        Args:
+            -mobility_service: the mobility service of the cost
+            -cost_name: the name of the cost
+            -default: value of the links that do not have this cost (or are inactive)
+
+        Returns:
+            -the array of costs indexed by link integer id
+        """
+        costs = np.full(self.nb_links, default, dtype=float)
+        link_index = self.link_index
+        for lid, link in self._mlgraph.graph.links.items():
+            service_costs = link.costs.get(mobility_service)
+            if service_costs is not None and cost_name in service_costs:
+                costs[link_index[lid]] = service_costs[cost_name]
+        return costs
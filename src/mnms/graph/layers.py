@@ -1,6 +1,6 @@
 from abc import abstractmethod
 from collections import defaultdict
-from typing import Optional, Dict, List, Type, Callable, Set
+from typing import Optional, Dict, List, Type, Callable, Set, Iterable
 from collections import ChainMap
 import numpy as np
 
@@ -10,6 +10,7 @@ from mnms.tools.observer import CSVVehicleObserver
 from mnms.vehicles.fleet import FleetManager
 from mnms.graph.specific_layers import OriginDestinationLayer
 from mnms.graph.dynamic_space_sharing import DynamicSpaceSharing
+from mnms.graph.indexing import GraphIndex
 from mnms.io.utils import load_class_by_module_name
 from mnms.log import create_logger
 from mnms.mobility_service.public_transport import PublicTransportMobilityService
@@ -24,10 +25,54 @@ log = create_logger(__name__)
 class CostFunctionLayer(object):
     def __init__(self):
         self._costs_functions: Dict[str, Dict[str, Callable]] = defaultdict(dict)
+        self._vectorized_costs_functions: Dict[str, Dict[str, Callable]] = defaultdict(dict)
 
     def add_cost_function(self, mobility_service: str, cost_name: str, cost_function: Callable[[Dict[str, float]], float]):
+        self._vectorized_costs_functions[mobility_service].pop(cost_name, None)
         self._costs_functions[mobility_service][cost_name] = cost_function
 
+    def add_vectorized_cost_function(self, mobility_service: str, cost_name: str,
+                                     cost_function: Callable[["MultiLayerGraph", List, Dict[str, np.ndarray]], np.ndarray]):
+        """Method that adds a cost function evaluated on many links of the layer at once.
+
+        Args:
+            -mobility_service: the mobility service concerned
+            -cost_name: the name of the cost
+            -cost_function: function called with the multi layer graph, the list of links
+             and a dict of arrays with their 'length', 'speed', 'travel_time' and already
+             computed vectorized costs, it returns the array of costs of the links
+        """
+        self._costs_functions[mobility_service].pop(cost_name, None)
+        self._vectorized_costs_functions[mobility_service][cost_name] = cost_function
+
+    @property
+    def has_vectorized_costs_functions(self) -> bool:
+        return any(len(cost_funcs) > 0 for cost_funcs in self._vectorized_costs_functions.values())
+
+    def compute_vectorized_costs(self, mlgraph: "MultiLayerGraph", links: List, links_costs: List[Dict[str, Dict[str, float]]]):
+        """Method that evaluates the vectorized cost functions on links of this layer,
+        they are evaluated after the scalar ones with one call per mobility service and
+        cost.
+
+        Args:
+            -mlgraph: the multi layer graph
+            -links: the links of this layer
+            -links_costs: the costs of each link per mobility service, updated in place
+        """
+        if len(links) == 0:
+            return
+        lengths = np.array([link.length for link in links], dtype=float)
+        for mservice, cost_funcs in self._vectorized_costs_functions.items():
+            if len(cost_funcs) == 0:
+                continue
+            arrays = {'length': lengths,
+                      'speed': np.array([c[mservice]['speed'] for c in links_costs], dtype=float),
+                      'travel_time': np.array([c[mservice]['travel_time'] for c in links_costs], dtype=float)}
+            for cost_name, cost_f in cost_funcs.items():
+                arrays[cost_name] = np.asarray(cost_f(mlgraph, links, arrays), dtype=float)
+                for c, value in zip(links_costs, arrays[cost_name].tolist()):
+                    c[mservice][cost_name] = value
+
 
 class AbstractLayer(CostFunctionLayer):
     def __init__(self,
@@ -207,6 +252,13 @@ class MultiLayerGraph(object):
 
         self.dynamic_space_sharing = DynamicSpaceSharing(self)
 
+        self._index: Optional[GraphIndex] = None
+        self._index_outdated = True
+        # Incremented each time nodes or links are added to or deleted from the graph
+        self.topology_version = 0
+        # Ids of the links added or whose costs changed since the last call of pop_updated_links
+        self._updated_links: Set[str] = set()
+
         for l in layers:
             self.map_reference_links.maps.append(l.map_reference_links)
             for lid in l.map_reference_links.keys():
@@ -224,19 +276,42 @@ class MultiLayerGraph(object):
             if connection_distance is not None:
                 self.connect_origindestination_layers(connection_distance)
 
-    def add_transit_links(self, transit_links):
+    @property
+    def index(self) -> GraphIndex:
+        """Dense integer ids of the nodes and links of the graph and arrays of the
+        links attributes, synchronized with the graph at access when it has changed.
+        """
+        if self._index is None:
+            self._index = GraphIndex(self)
+        elif self._index_outdated:
+            self._index.update()
+        self._index_outdated = False
+        return self._index
 
-        for tl in transit_links:
-            self.graph.add_link(tl['id'], tl['upstream_node'], tl['downstream_node'], tl['dist'],
-                                {"WALK": {'length': tl['dist']}}, "TRANSIT")
-            self.map_linkid_layerid[tl['id']] = "TRANSIT"
-            # Add the transit link into the transit layer
-            up_layer = self.graph.nodes[tl['upstream_node']].label
-            down_layer = self.graph.nodes[tl['downstream_node']].label
-            self.transitlayer.add_link(tl['id'], up_layer, down_layer)
+    def _outdate_index(self):
+        self._index_outdated = True
+        self.topology_version += 1
+
+    def mark_updated_links(self, lids: Iterable[str]):
+        """Method that marks links as added or whose costs changed, e.g. for the link
+        costs recorder.
+
+        Args:
+            -lids: ids of the links
+        """
+        self._updated_links.update(lids)
+
+    def pop_updated_links(self) -> Set[str]:
+        """Method that returns the ids of the links added or whose costs changed
+        since the previous call of this method.
+        """
+        updated_links = self._updated_links
+        self._updated_links = set()
+        return updated_links
 
     def add_origin_destination_layer(self, odlayer: OriginDestinationLayer):
         self.odlayer = odlayer
+        self._outdate_index()
 
         [self.graph.add_node(nid, pos[0], pos[1], odlayer.id) for nid, pos in odlayer.origins.items()]
         [self.graph.add_node(nid, pos[0], pos[1], odlayer.id) for nid, pos  in odlayer.destinations.items()]
@@ -285,6 +360,7 @@ class MultiLayerGraph(object):
                     lid = f"{nid}_{layer_nid}"
                     self.graph.add_link(lid, nid, layer_nid, dist, {"WALK": {'length': dist}}, "TRANSIT")
                     self.map_linkid_layerid[lid] = "TRANSIT"
+                    self._outdate_index()
                     # Add the transit link into the transit layer
                     self.transitlayer.add_link(lid, layer_id, layer_id)
 
@@ -330,6 +406,7 @@ class MultiLayerGraph(object):
                                 idxd = np.where(graph_dnode_ids == layer_nid)
                                 lid = f"{onid}_{layer_nid}"
                                 self.graph.add_link(lid, onid, layer_nid, dist, {"WALK": {'length': dist}}, "TRANSIT")
+                                self._outdate_index()
                                 self.map_linkid_layerid[lid] = "TRANSIT"
                                 # Add the transit link into the transit layer
                                 self.transitlayer.add_link(lid, olayer_id, dlayer_id)
@@ -343,6 +420,7 @@ class MultiLayerGraph(object):
         if "WALK" not in costs:
             costs = {"WALK": costs}
         self.graph.add_link(lid, upstream, downstream, length, costs, "TRANSIT")
+        self._outdate_index()
         self.map_linkid_layerid[lid]="TRANSIT"
         # Add the transit link into the transit layer
         link_olayer_id = self.graph.nodes[upstream].label
@@ -357,6 +435,10 @@ class MultiLayerGraph(object):
         for lid, layer in self.layers.items():
             link_layers.append(layer.graph.links)  # only non transit links concerned
 
+        # Links and costs of the layers with vectorized costs functions, keyed by layer id
+        vectorized_links = defaultdict(list)
+        vectorized_costs = defaultdict(list)
+
         for link in self.graph.links.values():
             costs = {}
             if link.label == "TRANSIT":
@@ -381,14 +463,42 @@ class MultiLayerGraph(object):
                     for cost_name, cost_func in cost_functions.items():
                         costs[mservice][cost_name] = cost_func(self, link, costs)
 
-            link.update_costs(costs)
+            if layer.has_vectorized_costs_functions:
+                vectorized_links[link.label].append(link)
+                vectorized_costs[link.label].append(costs)
+                continue
 
-            for links in link_layers: # only non transit links concerned
-                layer_link = links.get(link.id, None)
-                if layer_link is not None:
-                    layer_link.update_costs(costs)
+            self._update_link_costs(link, costs, link_layers)
 
-    def add_cost_function(self, layer_id: str, cost_name: str, cost_function: Callable, mobility_service: Optional[str] = None):
+        for label, links in vectorized_links.items():
+            layer = self.transitlayer if label == "TRANSIT" else self.layers[label]
+            layer.compute_vectorized_costs(self, links, vectorized_costs[label])
+            for link, costs in zip(links, vectorized_costs[label]):
+                self._update_link_costs(link, costs, link_layers)
+
+    @staticmethod
+    def _update_link_costs(link, costs, link_layers):
+        link.update_costs(costs)
+
+        for links in link_layers: # only non transit links concerned
+            layer_link = links.get(link.id, None)
+            if layer_link is not None:
+                layer_link.update_costs(costs)
+
+    def add_cost_function(self, layer_id: str, cost_name: str, cost_function: Callable, mobility_service: Optional[str] = None,
+                          vectorized: bool = False):
+        """Method that adds a generalized cost function on the links of a layer.
+
+        Args:
+            -layer_id: id of the layer, 'TRANSIT' for the transit links
+            -cost_name: name of the cost
+            -cost_function: scalar function f(mlgraph, link, costs) returning the cost of
+             one link, or if vectorized, f(mlgraph, links, arrays) returning the array
+             of costs of the links (see CostFunctionLayer.add_vectorized_cost_function)
+            -mobility_service: the mobility service concerned, all the services of the
+             layer if None
+            -vectorized: specifies if cost_function is vectorized
+        """
         # Retrieve layer
         if layer_id == 'TRANSIT':
             layer = self.transitlayer
@@ -398,22 +508,36 @@ class MultiLayerGraph(object):
             mservices = list(layer.mobility_services.keys())
 
         # Add cost function on layer
+        add_function = layer.add_vectorized_cost_function if vectorized else layer.add_cost_function
         if mobility_service is not None:
-            layer.add_cost_function(mobility_service, cost_name, cost_function)
+            add_function(mobility_service, cost_name, cost_function)
         else:
             for mservice in mservices:
-                layer.add_cost_function(mservice, cost_name, cost_function)
+                add_function(mservice, cost_name, cost_function)
 
     def add_transit_links(self, transit_links):
+        """
+        Adds transit links to the graph and the transit layer
+
+        Args:
+            transit_links: list of dict with the keys 'id', 'upstream_node', 'downstream_node' and 'dist'
+        """
+        if len(transit_links) == 0:
+            return
 
+        self._outdate_index()
+        # NB: the nodes dict of the graph is built at each access, get it once for all links
+        graph = self.graph
+        gnodes = graph.nodes
         for tl in transit_links:
-            self.graph.add_link(tl['id'], tl['upstream_node'], tl['downstream_node'], tl['dist'],
-                                {"WALK": {'length': tl['dist']}}, "TRANSIT")
+            graph.add_link(tl['id'], tl['upstream_node'], tl['downstream_node'], tl['dist'],
+                           {"WALK": {'length': tl['dist']}}, "TRANSIT")
             self.map_linkid_layerid[tl['id']] = "TRANSIT"
             # Add the transit link into the transit layer
-            up_layer = self.graph.nodes[tl['upstream_node']].label
-            down_layer = self.graph.nodes[tl['downstream_node']].label
+            up_layer = gnodes[tl['upstream_node']].label
+            down_layer = gnodes[tl['downstream_node']].label
             self.transitlayer.add_link(tl['id'], up_layer, down_layer)
+        self.mark_updated_links(tl['id'] for tl in transit_links)
 
     def add_zone(self, zone: MLZone):
         if zone.id in self.zones.keys():
@@ -432,7 +556,9 @@ class MultiLayerGraph(object):
 class TransitLayer(CostFunctionLayer):
     def __init__(self):
         super(TransitLayer, self).__init__()
-        self.links: defaultdict[str, defaultdict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        # NB: links ids are stored as the keys of dicts to keep their insertion
+        #     order while allowing constant time removals
+        self.links: defaultdict[str, defaultdict[str, Dict[str, None]]] = defaultdict(lambda: defaultdict(dict))
 
     def add_link(self, lid, olayer, dlayer):
         """
@@ -440,7 +566,15 @@ class TransitLayer(CostFunctionLayer):
         olayer: name of the layer origin node of link belongs to
         dlayer: name of the layer destination node of link belongs to
         """
-        self.links[olayer][dlayer].append(lid)
+        self.links[olayer][dlayer][lid] = None
+
+    def remove_link(self, lid, olayer, dlayer):
+        """
+        lid: id of link
+        olayer: name of the layer origin node of link belongs to
+        dlayer: name of the layer destination node of link belongs to
+        """
+        del self.links[olayer][dlayer][lid]
 
     def iter_links(self):
         """
@@ -470,14 +604,15 @@ class TransitLayer(CostFunctionLayer):
                         yield lid
 
     def __dump__(self):
-        return dict(self.links)
+        return {olayer: {dlayer: list(lids) for dlayer, lids in dlinks.items()} for olayer, dlinks in self.links.items()}
 
     @classmethod
     def __load__(cls, data):
         new_obj = cls()
         for olayer in data:
-            for dlayer, lid in data[olayer].items():
-                new_obj.add_link(lid, olayer, dlayer)
+            for dlayer, lids in data[olayer].items():
+                for lid in lids:
+                    new_obj.add_link(lid, olayer, dlayer)
 
         return new_obj
 
@@ -689,7 +824,7 @@ class SharedVehicleLayer(AbstractLayer):
                  observer: Optional = None):
         super(SharedVehicleLayer, self).__init__(roads, _id, veh_type, default_speed, services, observer)
 
-        self.stations = []
+        self.stations: Dict[str, Dict] = dict()        # id_station, {'id', 'node', 'position'}
 
     def create_node(self, nid: str, dbnode: str, exclude_movements: Optional[Dict[str, Set[str]]] = None):
         assert dbnode in self.roads.nodes
@@ -730,41 +865,45 @@ class SharedVehicleLayer(AbstractLayer):
 
         assert odlayer is not None
 
-        _norm = np.linalg.norm
-
         odlayer_nodes = set()
         odlayer_nodes.update(odlayer.origins.keys())
         odlayer_nodes.update(odlayer.destinations.keys())
 
         # Origins to link to the stations
-        graph_node_ids = np.array([s['node'] for s in self.stations])
-        graph_node_pos = np.array([s['position'] for s in self.stations])
-
-        for nid in odlayer.origins:
-            npos = np.array(odlayer.origins[nid])
-            dist_nodes = _norm(graph_node_pos - npos, axis=1)
-            mask = dist_nodes < connection_distance
-            for layer_nid, dist in zip(graph_node_ids[mask], dist_nodes[mask]):
-                if layer_nid not in odlayer_nodes:
-                    lid = f"{nid}_{layer_nid}"
-                    transit_links.append(
-                        {'id': lid, 'upstream_node': nid, 'downstream_node': layer_nid, 'dist': dist})
+        graph_node_ids = [s['node'] for s in self.stations.values()]
+        graph_node_pos = np.array([s['position'] for s in self.stations.values()])
+
+        # NB: links are sorted by od node then layer node to be created in the
+        #     same order as with a loop over the od nodes
+        origins_ranks = {nid: i for i, nid in enumerate(odlayer.origins)}
+        connections = []
+        for i, near_origins in enumerate(odlayer.get_origins_in_radius(graph_node_pos, connection_distance)):
+            for nid, dist in near_origins:
+                connections.append((origins_ranks[nid], i, nid, dist))
+        for _, i, nid, dist in sorted(connections, key=lambda c: c[:2]):
+            layer_nid = graph_node_ids[i]
+            if layer_nid not in odlayer_nodes:
+                lid = f"{nid}_{layer_nid}"
+                transit_links.append(
+                    {'id': lid, 'upstream_node': nid, 'downstream_node': layer_nid, 'dist': dist})
 
         # Destinations to link to the stations or to all the nodes
         if list(self.mobility_services.values())[0].free_floating_possible:   # each node must be considered
             graph_nodes = self.graph.nodes
-            graph_node_ids = np.array([nid for nid in graph_nodes])
+            graph_node_ids = [nid for nid in graph_nodes]
             graph_node_pos = np.array([n.position for n in graph_nodes.values()])
 
-        for nid in odlayer.destinations:
-            npos = np.array(odlayer.destinations[nid])
-            dist_nodes = _norm(graph_node_pos - npos, axis=1)
-            mask = dist_nodes < connection_distance
-            for layer_nid, dist in zip(graph_node_ids[mask], dist_nodes[mask]):
-                if layer_nid not in odlayer_nodes:
-                    lid = f"{layer_nid}_{nid}"
-                    transit_links.append(
-                        {'id': lid, 'upstream_node': layer_nid, 'downstream_node': nid, 'dist': dist})
+        destinations_ranks = {nid: i for i, nid in enumerate(odlayer.destinations)}
+        connections = []
+        for i, near_destinations in enumerate(odlayer.get_destinations_in_radius(graph_node_pos, connection_distance)):
+            for nid, dist in near_destinations:
+                connections.append((destinations_ranks[nid], i, nid, dist))
+        for _, i, nid, dist in sorted(connections, key=lambda c: c[:2]):
+            layer_nid = graph_node_ids[i]
+            if layer_nid not in odlayer_nodes:
+                lid = f"{layer_nid}_{nid}"
+                transit_links.append(
+                    {'id': lid, 'upstream_node': layer_nid, 'downstream_node': nid, 'dist': dist})
 
         return transit_links
 
@@ -779,8 +918,9 @@ class SharedVehicleLayer(AbstractLayer):
             the list of nodes
         """
         nodes=[]
-        for s in self.stations:
-            nodes.append(node_to_dict(self.graph.nodes[s['node']]))
+        gnodes = self.graph.nodes
+        for s in self.stations.values():
+            nodes.append(node_to_dict(gnodes[s['node']]))
 
         return nodes
 
@@ -799,30 +939,44 @@ class SharedVehicleLayer(AbstractLayer):
         transit_links: list of created transit links
 
         """
-        node_id = next((item for item in self.stations if item["id"] == station_id), None)['node']
-        pos = next((item for item in self.stations if item["id"] == station_id), None)['position']
+        return self.connect_stations([station_id], odlayer, connection_distance)
 
-        transit_links = []
+    def connect_stations(self, station_ids: List[str], odlayer: OriginDestinationLayer, connection_distance: float):
+        """
+        Connect free floating stations to the origins of the odlayer, the origins
+        close to the stations are found with the KD-tree of the odlayer and all
+        transit links are added at once
 
-        assert odlayer is not None
+        Parameters
+        ----------
+        station_ids: ids of the stations to connect
+        odlayer
+        connection_distance
 
-        _norm = np.linalg.norm
+        Returns
+        -------
+        transit_links: list of created transit links
 
-        odlayer_nodes = set()
-        odlayer_nodes.update(odlayer.origins.keys())
+        """
+        assert odlayer is not None
 
-        for nid in odlayer.origins:
-            npos = np.array(odlayer.origins[nid])
-            dist_node = _norm(pos - npos)
-            if dist_node < connection_distance:
-                if node_id not in odlayer_nodes:
-                    lid = f"{nid}_{node_id}"
-                    transit_links.append(
-                        {'id': lid, 'upstream_node': nid, 'downstream_node': node_id, 'dist': dist_node})
+        transit_links = []
+        if len(station_ids) == 0:
+            return transit_links
+
+        positions = np.array([self.stations[sid]['position'] for sid in station_ids])
+        for sid, near_origins in zip(station_ids, odlayer.get_origins_in_radius(positions, connection_distance)):
+            node_id = self.stations[sid]['node']
+            if node_id in odlayer.origins:
+                continue
+            for nid, dist_node in near_origins:
+                lid = f"{nid}_{node_id}"
+                transit_links.append(
+                    {'id': lid, 'upstream_node': nid, 'downstream_node': node_id, 'dist': dist_node})
 
         self._multi_graph.add_transit_links(transit_links)
 
-        return
+        return transit_links
 
     def disconnect_station(self, station_id: str):
         """
@@ -836,29 +990,27 @@ class SharedVehicleLayer(AbstractLayer):
         -------
         the list of links that have been deleted
         """
-        for s in self.stations:
-            if s['id'] == station_id:
-                # Gather all transit links arriving at this station's node and delete them
-                # NB: for now, we cannot define free-floating and station-based
-                #     vehicle sharing services on the same layer because this
-                #     disconnection would impact the station-based service
-                to_delete = []
-                for layer_id in self.multi_graph.transitlayer.links.keys():
-                    for link_id in self.multi_graph.transitlayer.links[layer_id][self._id]:
-                        link_obj = self.multi_graph.graph.links[link_id]
-                        if link_obj.downstream == s['node']:
-                            link = self.multi_graph.graph.links[link_id]
-                            to_delete.append((layer_id,link_id, link.upstream, link.downstream))
-                # Delete the links
-                for layer_id,link_id,_,_ in to_delete:
-                    self.multi_graph.graph.delete_link(link_id)
-                    self.multi_graph.transitlayer.links[layer_id][self._id].remove(link_id)
-                    del self.multi_graph.map_linkid_layerid[link_id]
-                # Remove the station
-                self.stations.remove(s)
-                # Return the list of links that have been deleted
-                return [(onid,dnid) for _,_,onid,dnid in to_delete]
-        return []
+        s = self.stations.pop(station_id, None)
+        if s is None:
+            return []
+        # Gather all transit links arriving at this station's node and delete them
+        # NB: for now, we cannot define free-floating and station-based
+        #     vehicle sharing services on the same layer because this
+        #     disconnection would impact the station-based service
+        gnodes = self.multi_graph.graph.nodes
+        to_delete = []
+        for upstream, link in gnodes[s['node']].radj.items():
+            if link.label == "TRANSIT":
+                to_delete.append((gnodes[upstream].label, link.id, upstream, s['node']))
+        # Delete the links
+        for layer_id,link_id,_,_ in to_delete:
+            self.multi_graph.graph.delete_link(link_id)
+            self.multi_graph.transitlayer.remove_link(link_id, layer_id, self._id)
+            del self.multi_graph.map_linkid_layerid[link_id]
+        if to_delete:
+            self.multi_graph._outdate_index()
+        # Return the list of links that have been deleted
+        return [(onid,dnid) for _,_,onid,dnid in to_delete]
 
     def __dump__(self):
         return {'ID': self.id,
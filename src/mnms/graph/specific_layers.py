@@ -1,5 +1,6 @@
 from mnms.log import create_logger
 import numpy as np
+from scipy.spatial import cKDTree
 
 log = create_logger(__name__)
 
@@ -9,15 +10,36 @@ class OriginDestinationLayer(object):
         self.destinations = dict()
         self.id = "ODLAYER"
 
+        # Cached KD-trees of origins and destinations, (re)built lazily when
+        # a snapping is requested after the creation of new nodes
+        self._origins_kdtree = None
+        self._origins_kdtree_ids = None
+        self._destinations_kdtree = None
+        self._destinations_kdtree_ids = None
+
     def create_origin_node(self, nid, pos: np.ndarray):
         # new_node = Node(nid, pos[0], pos[1], self.id)
 
         self.origins[nid] = pos
+        self._origins_kdtree = None
 
     def create_destination_node(self, nid, pos: np.ndarray):
         # new_node = Node(nid, pos[0], pos[1], self.id)
 
         self.destinations[nid] = pos
+        self._destinations_kdtree = None
+
+    def _get_origins_kdtree(self):
+        if self._origins_kdtree is None:
+            self._origins_kdtree_ids = list(self.origins.keys())
+            self._origins_kdtree = cKDTree(np.array([pos for pos in self.origins.values()], dtype=float).reshape(-1, 2))
+        return self._origins_kdtree, self._origins_kdtree_ids
+
+    def _get_destinations_kdtree(self):
+        if self._destinations_kdtree is None:
+            self._destinations_kdtree_ids = list(self.destinations.keys())
+            self._destinations_kdtree = cKDTree(np.array([pos for pos in self.destinations.values()], dtype=float).reshape(-1, 2))
+        return self._destinations_kdtree, self._destinations_kdtree_ids
 
     def __dump__(self):
         return {'ORIGINS': {node: self.origins[node] for node in self.origins},
@@ -31,4 +53,87 @@ class OriginDestinationLayer(object):
         for nid, pos in data['DESTINATIONS'].items():
             new_obj.create_destination_node(nid, pos)
 
-        return new_obj
\ No newline at end of file
+        return new_obj
+
+    def get_nearest_origins(self, positions) -> list:
+        """Method that returns the id of the nearest origin node of each position.
+
+        Args:
+            -positions: array like of shape (n, 2) with the positions to snap
+
+        Returns:
+            -list of the ids of the nearest origin nodes
+        """
+        return self._query_kdtree(*self._get_origins_kdtree(), positions)
+
+    def get_nearest_destinations(self, positions) -> list:
+        """Method that returns the id of the nearest destination node of each position.
+
+        Args:
+            -positions: array like of shape (n, 2) with the positions to snap
+
+        Returns:
+            -list of the ids of the nearest destination nodes
+        """
+        return self._query_kdtree(*self._get_destinations_kdtree(), positions)
+
+    def get_origins_in_radius(self, positions, radius: float) -> list:
+        """Method that returns the origin nodes strictly closer than a radius of each position.
+
+        Args:
+            -positions: array like of shape (n, 2)
+            -radius: the radius in meters
+
+        Returns:
+            -list with, for each position, the list of (origin id, distance) in the
+             order of the origins
+        """
+        return self._query_kdtree_radius(*self._get_origins_kdtree(), positions, radius)
+
+    def get_destinations_in_radius(self, positions, radius: float) -> list:
+        """Method that returns the destination nodes strictly closer than a radius of each position.
+
+        Args:
+            -positions: array like of shape (n, 2)
+            -radius: the radius in meters
+
+        Returns:
+            -list with, for each position, the list of (destination id, distance) in
+             the order of the destinations
+        """
+        return self._query_kdtree_radius(*self._get_destinations_kdtree(), positions, radius)
+
+    @staticmethod
+    def _query_kdtree_radius(kdtree, ids, positions, radius):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        if len(positions) == 0 or kdtree.n == 0:
+            return [[] for _ in positions]
+        res = []
+        # The ball is slightly enlarged, distances are then computed exactly as
+        # a brute force search would do to keep the strict inequality
+        for pos, candidates in zip(positions, kdtree.query_ball_point(positions, radius * (1 + 1e-9) + 1e-9)):
+            candidates = np.sort(np.asarray(candidates, dtype=int))
+            dists = np.linalg.norm(kdtree.data[candidates] - pos, axis=1)
+            mask = dists < radius
+            res.append([(ids[i], d) for i, d in zip(candidates[mask], dists[mask])])
+        return res
+
+    @staticmethod
+    def _query_kdtree(kdtree, ids, positions):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        if len(positions) == 0:
+            return []
+        if kdtree.n == 1:
+            return [ids[0]] * len(positions)
+        dists, indices = kdtree.query(positions, k=2)
+        nearest = indices[:, 0]
+        # Break ties as a brute force argmin would do, i.e. by taking the first node
+        # in the order of the odlayer among the equidistant ones
+        ties = np.nonzero(dists[:, 1] <= dists[:, 0] * (1 + 1e-9) + 1e-9)[0]
+        if len(ties) > 0:
+            radii = dists[ties, 0] * (1 + 1e-9) + 1e-9
+            for i, candidates in zip(ties, kdtree.query_ball_point(positions[ties], radii)):
+                candidates = np.sort(candidates)
+                cand_dists = np.linalg.norm(kdtree.data[candidates] - positions[i], axis=1)
+                nearest[i] = candidates[np.argmin(cand_dists)]
+        return [ids[i] for i in nearest]
@@ -0,0 +1,310 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from pathlib import Path
+
+import numpy as np
+
+from mnms.graph.layers import MultiLayerGraph
+from mnms.log import create_logger
+
+log = create_logger(__name__)
+
+_FORMAT_TAG = np.array(['mnms-link-costs', '1'])
+
+# Arrays written for each recorded affectation step, in this order
+_CHUNK_ARRAYS = ['header',              # float64 [affectation step, time in seconds]
+                 'new_link_ids',        # ids of the links interned since the previous chunk
+                 'new_service_ids',     # ids of the mobility services seen for the first time
+                 'cost_names',          # names of the cost columns of this chunk
+                 'links',               # int32, integer id of the link of each row
+                 'services',            # int16, integer id of the mobility service of each row
+                 'values']              # float64 (nb cost names, nb rows), NaN when a cost is not defined
+_NB_CHUNK_ARRAYS = len(_CHUNK_ARRAYS)
+
+
+class LinkCostsRecorder(object):
+    def __init__(self, filename: Union[str, Path], mlgraph: MultiLayerGraph):
+        """Records the costs of the links of a multi layer graph at each affectation
+        step in a binary file, read it back with LinkCostsReader.
+
+        The first recorded step holds the costs of all links, the next ones only the
+        costs of the links updated in between. Each step is written as a chunk of
+        numpy arrays, one row per link and mobility service: the link integer id (see
+        MultiLayerGraph.index), the mobility service integer id and one column per cost
+        (travel time, speed, length and generalized costs).
+
+        Args:
+            -filename: the file to write
+            -mlgraph: the multi layer graph whose costs are recorded
+        """
+        self._mlgraph = mlgraph
+        self._file = open(filename, 'wb')
+        np.save(self._file, _FORMAT_TAG, allow_pickle=False)
+
+        self._nb_written_links = 0
+        self._service_index: Dict[str, int] = dict()
+        self._nb_chunks = 0
+
+    def record(self, affectation_step: int, time: float, updated_links: Iterable[str]):
+        """Method that writes the chunk of an affectation step.
+
+        Args:
+            -affectation_step: the affectation step number
+            -time: the current time in seconds
+            -updated_links: ids of the links added or whose costs changed since the previous
+             chunk (see MultiLayerGraph.pop_updated_links), ignored for the first chunk
+             which holds all links
+        """
+        index = self._mlgraph.index
+        graph = self._mlgraph.graph
+        if self._nb_chunks == 0:
+            glinks = graph.links
+            lids = sorted(glinks.keys(), key=index.link_index.__getitem__)
+            get_link = glinks.get
+        else:
+            # Links are fetched one by one, only a few of them are updated at each step
+            lids = sorted(updated_links, key=index.link_index.__getitem__)
+            get_link = graph.get_link
+
+        new_link_ids = index.link_ids[self._nb_written_links:]
+        self._nb_written_links = index.nb_links
+
+        nb_services = len(self._service_index)
+        cost_columns: Dict[str, int] = dict()
+        links, services, rows = [], [], []
+        link_index = index.link_index
+        service_index = self._service_index
+        for lid in lids:
+            link = get_link(lid)
+            if link is None:
+                # Link deleted since its update
+                continue
+            ind = link_index[lid]
+            for mservice, costs in link.costs.items():
+                sind = service_index.get(mservice)
+                if sind is None:
+                    sind = len(service_index)
+                    service_index[mservice] = sind
+                links.append(ind)
+                services.append(sind)
+                for cost_name in costs:
+                    if cost_name not in cost_columns:
+                        cost_columns[cost_name] = len(cost_columns)
+                rows.append(costs)
+
+        cost_names = list(cost_columns.keys())
+        values = np.full((len(cost_names), len(rows)), np.nan)
+        for j, costs in enumerate(rows):
+            for cost_name, value in costs.items():
+                values[cost_columns[cost_name], j] = value
+
+        new_service_ids = list(service_index.keys())[nb_services:]
+        for arr in (np.array([affectation_step, time], dtype=np.float64),
+                    np.array(new_link_ids, dtype=str),
+                    np.array(new_service_ids, dtype=str),
+                    np.array(cost_names, dtype=str),
+                    np.array(links, dtype=np.int32),
+                    np.array(services, dtype=np.int16),
+                    values):
+            np.save(self._file, arr, allow_pickle=False)
+        self._nb_chunks += 1
+        log.info('Link costs of %s links recorded for affectation step %s', len(lids), affectation_step)
+
+    def close(self):
+        self._file.close()
+
+
+class LinkCostsReader(object):
+    def __init__(self, filename: Union[str, Path]):
+        """Reader of a file written by a LinkCostsRecorder. Only the small arrays are
+        read at opening, the rows of a chunk are read on demand.
+
+        Args:
+            -filename: the file to read
+
+        Attributes:
+            link_ids (list): string id of each link, indexed by link integer id
+            service_ids (list): string id of each mobility service, indexed by service integer id
+            steps (np.ndarray): affectation step of each chunk
+            times (np.ndarray): time in seconds of each chunk
+        """
+        self._filename = filename
+        self.link_ids: List[str] = list()
+        self.service_ids: List[str] = list()
+        self._chunks_offsets: List[int] = list()
+        self._chunks_cost_names: List[List[str]] = list()
+        steps, times = [], []
+
+        with open(filename, 'rb') as f:
+            tag = np.load(f, allow_pickle=False)
+            assert tag[0] == _FORMAT_TAG[0], f'{filename} is not a link costs file'
+            while True:
+                offset = f.tell()
+                if not f.read(1):
+                    break
+                f.seek(offset)
+                self._chunks_offsets.append(offset)
+                header = np.load(f, allow_pickle=False)
+                steps.append(int(header[0]))
+                times.append(header[1])
+                self.link_ids.extend(np.load(f, allow_pickle=False).tolist())
+                self.service_ids.extend(np.load(f, allow_pickle=False).tolist())
+                self._chunks_cost_names.append(np.load(f, allow_pickle=False).tolist())
+                for _ in range(_NB_CHUNK_ARRAYS - 4):
+                    self._skip_array(f)
+
+        self.steps = np.array(steps, dtype=np.int64)
+        self.times = np.array(times, dtype=np.float64)
+        self._link_index = {lid: i for i, lid in enumerate(self.link_ids)}
+        self._service_index = {sid: i for i, sid in enumerate(self.service_ids)}
+
+    @staticmethod
+    def _skip_array(f):
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+        f.seek(int(np.prod(shape)) * dtype.itemsize, 1)
+
+    @property
+    def nb_chunks(self) -> int:
+        return len(self._chunks_offsets)
+
+    def chunk(self, i: int) -> Dict:
+        """Method that reads a chunk.
+
+        Args:
+            -i: index of the chunk, in order of the recorded affectation steps
+
+        Returns:
+            -dict with keys 'step', 'time', 'links' and 'services' (integer ids of each row)
+             and 'costs' (dict of the array of each cost)
+        """
+        with open(self._filename, 'rb') as f:
+            f.seek(self._chunks_offsets[i])
+            for _ in range(4):
+                self._skip_array(f)
+            links = np.load(f, allow_pickle=False)
+            services = np.load(f, allow_pickle=False)
+            values = np.load(f, allow_pickle=False)
+        return {'step': int(self.steps[i]),
+                'time': float(self.times[i]),
+                'links': links,
+                'services': services,
+                'costs': dict(zip(self._chunks_cost_names[i], values))}
+
+    def iter_chunks(self) -> Iterator[Dict]:
+        for i in range(self.nb_chunks):
+            yield self.chunk(i)
+
+    def costs_at(self, step: int, mservice: str, cost_name: str) -> np.ndarray:
+        """Method that rebuilds the costs of all links at an affectation step by
+        replaying the chunks up to it.
+
+        Args:
+            -step: the affectation step
+            -mservice: the mobility service of the cost
+            -cost_name: the name of the cost
+
+        Returns:
+            -the array of costs indexed by link integer id, NaN for the links which do
+             not have this cost
+        """
+        costs = np.full(len(self.link_ids), np.nan)
+        sind = self._service_index.get(mservice)
+        if sind is None:
+            return costs
+        for i in np.nonzero(self.steps <= step)[0].tolist():
+            chunk = self.chunk(i)
+            if cost_name not in chunk['costs']:
+                continue
+            mask = chunk['services'] == sind
+            costs[chunk['links'][mask]] = chunk['costs'][cost_name][mask]
+        return costs
+
+    def iter_links_costs(self, cost_name: str) -> Iterator[Tuple[int, np.ndarray]]:
+        """Method that replays the chunks once and yields the cost of all links after
+        each recorded affectation step. The costs of the mobility services of a link
+        are not distinguished, this is meant for the costs which only depend on the
+        link (travel time, speed, length).
+
+        Args:
+            -cost_name: the name of the cost
+
+        Returns:
+            -iterator of (affectation step, array of costs indexed by link integer id,
+             NaN for the links which do not have this cost)
+        """
+        costs = np.full(len(self.link_ids), np.nan)
+        for chunk in self.iter_chunks():
+            values = chunk['costs'].get(cost_name)
+            if values is not None:
+                defined = ~np.isnan(values)
+                costs[chunk['links'][defined]] = values[defined]
+            yield chunk['step'], costs.copy()
+
+    def link_speeds_at(self, step: Optional[int] = None) -> Dict[str, float]:
+        """Method that returns the speeds of the links at an affectation step, in the
+        format expected by AbstractMFDFlowMotor.set_warm_start.
+
+        Args:
+            -step: the affectation step, the last recorded one if None
+
+        Returns:
+            -dict of the speed of each link by link id
+        """
+        speeds = np.full(len(self.link_ids), np.nan)
+        for chunk_step, costs in self.iter_links_costs('speed'):
+            if step is not None and chunk_step > step:
+                break
+            speeds = costs
+        return {lid: float(s) for lid, s in zip(self.link_ids, speeds) if not np.isnan(s)}
+
+    def link_history(self, link_id: str, mservice: str, cost_name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Method that returns the successive values of a cost on a link.
+
+        Args:
+            -link_id: the link id
+            -mservice: the mobility service of the cost
+            -cost_name: the name of the cost
+
+        Returns:
+            -steps: the affectation steps at which the cost was recorded
+            -values: the recorded values
+        """
+        lind = self._link_index[link_id]
+        sind = self._service_index.get(mservice)
+        steps, values = [], []
+        for chunk in self.iter_chunks():
+            if cost_name not in chunk['costs']:
+                continue
+            rows = np.nonzero((chunk['links'] == lind) & (chunk['services'] == sind))[0]
+            if len(rows):
+                steps.append(chunk['step'])
+                values.append(chunk['costs'][cost_name][rows[0]])
+        return np.array(steps, dtype=np.int64), np.array(values, dtype=np.float64)
+
+    def to_dataframe(self, cost_names: Optional[List[str]] = None):
+        """Method that gathers all recorded rows in a pandas DataFrame with the columns
+        AFFECTATION_STEP, TIME, LINK, MOBILITY_SERVICE and one column per cost.
+
+        Args:
+            -cost_names: the costs to keep, all of them if None
+        """
+        import pandas as pd
+
+        frames = []
+        link_ids = np.array(self.link_ids, dtype=object)
+        service_ids = np.array(self.service_ids, dtype=object)
+        for chunk in self.iter_chunks():
+            data = {'AFFECTATION_STEP': np.full(len(chunk['links']), chunk['step']),
+                    'TIME': np.full(len(chunk['links']), chunk['time']),
+                    'LINK': link_ids[chunk['links']],
+                    'MOBILITY_SERVICE': service_ids[chunk['services']]}
+            for cost_name, values in chunk['costs'].items():
+                if cost_names is None or cost_name in cost_names:
+                    data[cost_name] = values
+            frames.append(pd.DataFrame(data))
+        if not frames:
+            return pd.DataFrame(columns=['AFFECTATION_STEP', 'TIME', 'LINK', 'MOBILITY_SERVICE'])
+        return pd.concat(frames, ignore_index=True)
@@ -10,6 +10,20 @@ class LOGLEVEL():
     NOTSET   = 0
 
 
+class LazyStr(object):
+    """Log message argument computed only when the record is emitted, mnms loggers
+    use %-style messages so that nothing is formatted for disabled levels, e.g.
+    log.info('Next departures until %s', LazyStr(tcurrent.add_time, dt))"""
+    __slots__ = ('_func', '_args')
+
+    def __init__(self, func, *args):
+        self._func = func
+        self._args = args
+
+    def __str__(self):
+        return str(self._func(*self._args))
+
+
 def create_logger(logname,
                   base_level=LOGLEVEL.WARNING,
                   # stream_level=LOGLEVEL.INFO,
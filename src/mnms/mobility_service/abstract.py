@@ -1,11 +1,14 @@
 from abc import ABC, abstractmethod, ABCMeta
+from collections import defaultdict
 from typing import List, Tuple, Optional, Dict
 import numpy as np
+from scipy.spatial import cKDTree
 
 from mnms.log import create_logger
 from mnms.demand.horizon import AbstractDemandHorizon
 from mnms.demand.user import User
 from mnms.tools.cost import create_service_costs
+from mnms.tools.execution import ExecutionResources
 from mnms.time import Time, Dt
 from mnms.vehicles.fleet import FleetManager
 from mnms.vehicles.veh_type import Vehicle, VehicleActivity, VehicleActivityStop, ActivityType
@@ -71,6 +74,12 @@ class Request(object):
             return False
 
 class AbstractMobilityService(ABC):
+    # True when the maintenance and the matching of the service only modify its own
+    # fleet, requests and estimations: no vehicle creation, no graph modification, no
+    # interaction with the users flow or the decision model. They can then run
+    # concurrently with the ones of the other such services (see Supervisor.run)
+    concurrent_matching = False
+
     def __init__(self,
                  id: str,
                  veh_capacity: int,
@@ -105,10 +114,23 @@ class AbstractMobilityService(ABC):
 
         self._observer: Optional = None
 
+        # Compute budget of the parallel shortest paths computations, the default
+        # one of the process if None
+        self._execution_resources: Optional[ExecutionResources] = None
+
     @property
     def id(self):
         return self._id
 
+    @property
+    def execution_resources(self) -> ExecutionResources:
+        if self._execution_resources is None:
+            return ExecutionResources.default()
+        return self._execution_resources
+
+    def set_execution_resources(self, resources: ExecutionResources):
+        self._execution_resources = resources
+
     @property
     def user_buffer(self):
         return self._user_buffer
@@ -271,7 +293,7 @@ class AbstractMobilityService(ABC):
                         # Remove user from list of users waiting to be matched
                         self.cancel_request(uid)
                     else:
-                        log.info(f"{uid} refused {self.id} offer (predicted pickup time ({service_dt}) is too long, wait for better proposition...")
+                        log.info("%s refused %s offer (predicted pickup time (%s) is too long, wait for better proposition...", uid, self.id, service_dt)
                     self._cache_request_vehicles = dict()
             for uid in users_canceling:
                 self.cancel_request(uid)
@@ -637,6 +659,9 @@ class AbstractOnDemandMobilityService(AbstractMobilityService, metaclass=ABCMeta
         self._zones = {}
         self.default_waiting_time = default_waiting_time
         self._estimated_pickup_times = {'default': default_waiting_time}
+        self._map_node_zones = defaultdict(list)        # Zones ids each node of the layer belongs to
+        self._node_estimated_pickup_times = dict()      # Memoised estimated pickup time per node, reset
+                                                        # at each update of the estimated pickup times
 
     @property
     def zones(self):
@@ -683,6 +708,13 @@ class AbstractOnDemandMobilityService(AbstractMobilityService, metaclass=ABCMeta
         # Add the zone and initialize the estimated pickup time in it to the default value
         self._zones[zone.id] = zone
         self._estimated_pickup_times[zone.id] = self.default_waiting_time
+        self._node_estimated_pickup_times = dict()
+        # Register the nodes of the layer which belong to this zone, or postpone
+        # the mapping till the first estimation if the layer is not yet known
+        if self.layer is not None and self._map_node_zones is not None:
+            self.register_zone_nodes(zone)
+        else:
+            self._map_node_zones = None
 
     def add_zoning(self, zones: List[LayerZone]):
         """Method to add a zoning to the service.
@@ -691,10 +723,39 @@ class AbstractOnDemandMobilityService(AbstractMobilityService, metaclass=ABCMeta
             -zones: list of zones to add to the service
         """
         # We overwrite the current zoning
-        self._zones = {}
+        self.clean_zoning()
         for zone in zones:
             self.add_zone(zone)
 
+    def clean_zoning(self):
+        """Method that removes all zones of this service and the related mappings.
+        """
+        self._zones = {}
+        self._map_node_zones = defaultdict(list)
+        self._node_estimated_pickup_times = dict()
+
+    def register_zone_nodes(self, zone: LayerZone):
+        """Method that registers the zone in the list of zones of each node of this
+        service's layer located inside it.
+
+        Args:
+            -zone: the zone to map
+        """
+        gnodes = self.graph.nodes
+        node_ids = list(gnodes.keys())
+        mask = zone.is_inside([node.position for node in gnodes.values()])
+        for nid, inside in zip(node_ids, mask):
+            if inside:
+                self._map_node_zones[nid].append(zone.id)
+
+    def build_map_node_zones(self):
+        """Method that (re)builds the mapping between the nodes of this service's layer
+        and the zones they belong to.
+        """
+        self._map_node_zones = defaultdict(list)
+        for zone in self._zones.values():
+            self.register_zone_nodes(zone)
+
     def estimate_pickup_time_for_planning(self, pu_node):
         """Method that returns the estimated pickup time at a specific node. This
         information is used by user to (re)plan. If the node belongs to several zones,
@@ -706,25 +767,27 @@ class AbstractOnDemandMobilityService(AbstractMobilityService, metaclass=ABCMeta
         Returns:
             -estimated pickup time in seconds
         """
+        # Estimated pickup times are memoised per node until their next update
+        if pu_node in self._node_estimated_pickup_times:
+            return self._node_estimated_pickup_times[pu_node]
+
         # Find the zone(s) the pickup node belongs to
-        wts = []
-        for zid, z in self.zones.items():
-            punode_in_z = z.is_inside([self.graph.nodes[pu_node].position])[0]
-            if punode_in_z:
-                wts.append(self.estimated_pickup_times[zid])
+        if self._map_node_zones is None:
+            self.build_map_node_zones()
+        wts = [self.estimated_pickup_times[zid] for zid in self._map_node_zones.get(pu_node, [])]
         if wts:
-            return np.mean(wts)
+            estimated_putime = np.mean(wts)
         else:
             # Pickup node belongs to no zone
-            return self.estimated_pickup_times['default']
+            estimated_putime = self.estimated_pickup_times['default']
+        self._node_estimated_pickup_times[pu_node] = estimated_putime
+        return estimated_putime
 
     def get_idle_vehicles(self):
         """Method that returns the array of idle vehicles of this service.
         """
-        all_vehs = self.get_all_vehicles()
-        mask = [True if (veh.activity_type in [ActivityType.STOP, ActivityType.REPOSITIONING]) and (not veh.activities) \
-            else False for veh in all_vehs]
-        idle_vehs = all_vehs[mask]
+        vehs = self.fleet.veh_manager.get_vehicles(self.id, [ActivityType.STOP, ActivityType.REPOSITIONING])
+        idle_vehs = np.array([veh for veh in vehs if not veh.activities])
         return idle_vehs
 
     def get_all_vehicles(self):
@@ -760,6 +823,7 @@ class AbstractOnDemandDepotMobilityService(AbstractOnDemandMobilityService):
         super(AbstractOnDemandDepotMobilityService, self).__init__(id, veh_capacity, dt_matching,
             dt_periodic_maintenance, default_waiting_time)
         self.depots = dict()
+        self._depots_kdtree = None
 
     def add_depot(self, node: str, capacity: int, fill: bool = True):
         """Method to create a depot full of vehicles.
@@ -771,6 +835,7 @@ class AbstractOnDemandDepotMobilityService(AbstractOnDemandMobilityService):
         """
         assert node not in self.depots, f'There is already one {self.id} depot at node {node}...'
         self.depots[node] = Depot(f'Depot_{self.id}_{node}', node, capacity)
+        self._depots_kdtree = None
         if fill:
             for _ in range(capacity):
                 new_veh = self.create_waiting_vehicle(node)
@@ -785,7 +850,7 @@ class AbstractOnDemandDepotMobilityService(AbstractOnDemandMobilityService):
              corresponding to Voronoi diagram of the depots is created
         """
         # We overwrite the current zoning
-        self._zones = {}
+        self.clean_zoning()
         if zones is not None:
             for zone in zones:
                 self.add_zone(zone)
@@ -807,3 +872,52 @@ class AbstractOnDemandDepotMobilityService(AbstractOnDemandMobilityService):
         """Method that returns the array of all depots of this service.
         """
         return np.array(list(self.depots.values()))
+
+    def _get_depots_kdtree(self):
+        if self._depots_kdtree is None:
+            nodes = self.layer.graph.nodes
+            self._depots_kdtree_depots = list(self.depots.values())
+            self._depots_kdtree = cKDTree(np.array([nodes[d.node].position for d in self._depots_kdtree_depots],
+                dtype=float).reshape(-1, 2))
+        return self._depots_kdtree, self._depots_kdtree_depots
+
+    def assign_nearest_free_depots(self, vehicles: List[Vehicle], reserved: Optional[Dict[str, int]] = None,
+                                   k: int = 8) -> List[Optional[Depot]]:
+        """Method that assigns to each vehicle the nearest depot (as the crow flies)
+        which is not full, the vehicles are considered in order and each assignment
+        takes a place in the depot.
+
+        Args:
+            -vehicles: the vehicles to assign
+            -reserved: number of places already reserved in each depot, by depot node
+            -k: number of nearest depots looked at first for each vehicle, all depots
+             are looked at when they are all full
+
+        Returns:
+            -the depot assigned to each vehicle, None when all depots are full
+        """
+        if len(vehicles) == 0 or len(self.depots) == 0:
+            return [None] * len(vehicles)
+        reserved = {} if reserved is None else reserved
+        tree, depots = self._get_depots_kdtree()
+        free_places = [d.get_free_places() - reserved.get(d.node, 0) for d in depots]
+        if sum(fp for fp in free_places if fp > 0) == 0:
+            return [None] * len(vehicles)
+
+        positions = np.array([veh.position for veh in vehicles], dtype=float).reshape(-1, 2)
+        k = min(k, len(depots))
+        _, nearest = tree.query(positions, k=k)
+        nearest = nearest.reshape(len(vehicles), k)
+
+        assigned = []
+        for veh_ind, candidates in enumerate(nearest.tolist()):
+            depot_ind = next((i for i in candidates if free_places[i] > 0), None)
+            if depot_ind is None and k < len(depots):
+                _, candidates = tree.query(positions[veh_ind], k=len(depots))
+                depot_ind = next((i for i in candidates.tolist() if free_places[i] > 0), None)
+            if depot_ind is None:
+                assigned.append(None)
+            else:
+                free_places[depot_ind] -= 1
+                assigned.append(depots[depot_ind])
+        return assigned
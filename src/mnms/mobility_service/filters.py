@@ -124,11 +124,13 @@ class PlanEndsInRadiusFilter(VehicleFilter):
         Return a mask (boolean array), if vehicle in radius around position at the
         end of its plan True, else False.
         """
-        vehs_last_nodes = [v.activity.node if not v.activities else v.activities[-1].node for v in vehicles]
-        vehs_last_pos = np.array([layer.graph.nodes[n].position for n in vehs_last_nodes])
-        dist_vector = np.linalg.norm(vehs_last_pos - np.array(position), axis=1)
-
-        return dist_vector <= self.radius
+        if len(vehicles) > 0:
+            vehs_last_nodes = [v.activity.node if not v.activities else v.activities[-1].node for v in vehicles]
+            vehs_last_pos = np.array([layer.graph.nodes[n].position for n in vehs_last_nodes])
+            dist_vector = np.linalg.norm(vehs_last_pos - np.array(position), axis=1)
+            return dist_vector <= self.radius
+        else:
+            return []
 
 
 class IsNearestFilter(VehicleFilter):
@@ -197,6 +199,23 @@ class InZoneFilter(VehicleFilter):
         return mask
 
 
+def _depots_vehicles_mask(vehicles: Iterable[Vehicle], depots: Iterable[Depot], multiple: bool) -> Mask:
+    """Returns the mask of the vehicles parked in the depots, all of them if multiple
+    is True, else only the one waiting for the longest time in each depot."""
+    veh_index = {veh.id: i for i, veh in enumerate(vehicles)}
+    mask = [False for _ in range(len(vehicles))]
+    for depot in depots:
+        if multiple:
+            depot_vehs = [veh for veh, _ in depot.vehicles]
+        else:
+            depot_vehs = [depot.get_first_vehicle()[0]] if depot.vehicles else []
+        for veh in depot_vehs:
+            ind = veh_index.get(veh.id)
+            if ind is not None:
+                mask[ind] = True
+    return mask
+
+
 class InZonalDepot(VehicleFilter):
     def __init__(self, multiple: bool):
         self.multiple = multiple
@@ -212,19 +231,7 @@ class InZonalDepot(VehicleFilter):
         """
         position_zone = get_zone(layer.roads, position)
         depots_in_zone = [d for d in deposits if d.zone == position_zone]
-        veh_ids = [veh.id for veh in vehicles]
-        mask = [False for _ in range(len(vehicles))]
-        if self.multiple:
-            for depot in depots_in_zone:
-                for vid in depot.vehicles:
-                    mask[veh_ids.index(vid)] = True
-
-        else:
-            for depot in depots_in_zone:
-                first_veh = depot.vehicles[-1]
-                mask[veh_ids.index(first_veh)] = True
-
-        return mask
+        return _depots_vehicles_mask(vehicles, depots_in_zone, self.multiple)
 
 
 class InNearestDepot(VehicleFilter):
@@ -242,24 +249,13 @@ class InNearestDepot(VehicleFilter):
         If not self.multiple: if vehicle is the vehicle of the nearest depot waiting for the longest time True, else False
         """
 
-        nodes = self.layer.graph.nodes
+        nodes = layer.graph.nodes
         depot_pos = np.array([nodes[d.node].position for d in deposits])
         dist_vector = np.linalg.norm(depot_pos - np.array(position), axis=1)
         nearest_depot_ind = np.argmin(dist_vector)
         nearest_depot = deposits[nearest_depot_ind]
 
-        veh_ids = [veh.id for veh in vehicles]
-        mask = [False for _ in range(len(vehicles))]
-
-        if self.multiple:
-            for vid in nearest_depot.vehicles:
-                mask[veh_ids.index(vid)] = True
-
-        else:
-            first_veh = nearest_depot.vehicles[-1]
-            mask[veh_ids.index(first_veh)] = True
-
-        return mask
+        return _depots_vehicles_mask(vehicles, [nearest_depot], self.multiple)
 
 
 class InNearestZonalDepot(VehicleFilter):
@@ -286,18 +282,7 @@ class InNearestZonalDepot(VehicleFilter):
         nearest_depot_ind = np.argmin(dist_vector)
         nearest_depot = depots_in_zone[nearest_depot_ind]
 
-        veh_ids = [veh.id for veh in vehicles]
-        mask = [False for _ in range(len(vehicles))]
-
-        if self.multiple:
-            for vid in nearest_depot.vehicles:
-                mask[veh_ids.index(vid)] = True
-
-        else:
-            first_veh = nearest_depot.vehicles[-1]
-            mask[veh_ids.index(first_veh)] = True
-
-        return mask
+        return _depots_vehicles_mask(vehicles, [nearest_depot], self.multiple)
 
 
 class ToNearestDepot(VehicleFilter):
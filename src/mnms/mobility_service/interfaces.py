@@ -1,10 +1,13 @@
 from collections import deque
 from dataclasses import dataclass, field
-from typing import List, Deque, Tuple
+from typing import List, Deque, Set, Tuple
 
+from mnms.log import create_logger
 from mnms.time import Time
 from mnms.vehicles.veh_type import Vehicle
 
+log = create_logger(__name__)
+
 ItemVehicleQueue = Tuple[Vehicle, Time]
 
 
@@ -14,20 +17,24 @@ class Depot:
     node: str
     capacity: int
     vehicles: Deque[ItemVehicleQueue] = field(default_factory=deque)
+    # Ids of the vehicles in the depot, for constant time membership tests
+    vehicles_ids: Set[str] = field(default_factory=set, repr=False, compare=False)
 
     def add_vehicle(self, vehicle: Vehicle, time: Time) -> None:
         if self.contains(vehicle):
             log.warning(f'Depot {self.id} already contains vehicle {vehicle}')
         else:
             self.vehicles.appendleft((vehicle, time))
+            self.vehicles_ids.add(vehicle.id)
 
     def remove_vehicle_by_index(self, index: int) -> ItemVehicleQueue:
         veh, time = self.vehicles[index]
         del self.vehicles[index]
+        self.vehicles_ids.discard(veh.id)
         return veh, time
 
     def remove_vehicle(self, veh: Vehicle) -> ItemVehicleQueue:
-        veh_index = [i for i,item in enumerate(self.vehicles) if item[0] == veh][0]
+        veh_index = next(i for i, item in enumerate(self.vehicles) if item[0].id == veh.id)
         _, time = self.remove_vehicle_by_index(veh_index)
         return veh, time
 
@@ -37,5 +44,8 @@ class Depot:
     def is_full(self) -> bool:
         return self.capacity <= len(self.vehicles)
 
+    def get_free_places(self) -> int:
+        return max(self.capacity - len(self.vehicles), 0)
+
     def contains(self, veh: Vehicle) -> bool:
-        return sum([1 for v,_ in self.vehicles if v == veh])
+        return veh.id in self.vehicles_ids
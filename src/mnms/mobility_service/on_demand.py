@@ -1,8 +1,8 @@
+from collections import defaultdict
 from typing import Tuple, Dict, List
 
 import numpy as np
 from scipy.optimize import linear_sum_assignment
-import multiprocessing
 import sys
 import math
 
@@ -11,7 +11,7 @@ from hipop.shortest_path import dijkstra, parallel_dijkstra
 from mnms import create_logger
 from mnms.demand import User
 from mnms.mobility_service.abstract import AbstractOnDemandMobilityService, AbstractOnDemandDepotMobilityService, Request, compute_path_travel_time
-from mnms.mobility_service.filters import PlanEndsInRadiusFilter, IsIdle, InRadiusFilter, DepotIsNotFull, IsNearestDepotFilter
+from mnms.mobility_service.filters import PlanEndsInRadiusFilter, IsIdle, InRadiusFilter
 from mnms.time import Dt, Time
 from mnms.tools.exceptions import PathNotFound
 from mnms.vehicles.veh_type import ActivityType, VehicleActivityServing, VehicleActivityStop, \
@@ -23,6 +23,7 @@ log = create_logger(__name__)
 
 
 class OnDemandMobilityService(AbstractOnDemandMobilityService):
+    concurrent_matching = True
 
     def __init__(self,
                  id: str,
@@ -103,6 +104,9 @@ class OnDemandMobilityService(AbstractOnDemandMobilityService):
         Args:
             -dt: time elapsed since the previous maintenance phase
         """
+        # Estimated pickup times memoised per node are outdated
+        self._node_estimated_pickup_times = dict()
+
         # Treat zone per zone when they are defined
         count_links_treated = 0
         for zid, z in self._zones.items():
@@ -237,7 +241,7 @@ class OnDemandMobilityService(AbstractOnDemandMobilityService):
                 # Remove user from list of users waiting to be matched
                 self.cancel_request(user.id)
             else:
-                log.info(f"{user.id} refused {self.id} offer (predicted pickup time ({service_dt}) is too long, wait for better proposition...")
+                log.info("%s refused %s offer (predicted pickup time (%s) is too long, wait for better proposition...", user.id, self.id, service_dt)
             self._cache_request_vehicles = dict()
 
     def launch_matching_batch(self):
@@ -281,13 +285,15 @@ class OnDemandMobilityService(AbstractOnDemandMobilityService):
                 destinations.append(req.user.current_node)
 
         ## Call Dijkstra once
-        paths = parallel_dijkstra(self.graph,
-                                  origins,
-                                  destinations,
-                                  [{self.layer.id: self.id}]*len(origins),
-                                  'travel_time',
-                                  multiprocessing.cpu_count(),
-                                  [{self.layer.id}]*len(origins))
+        resources = self.execution_resources
+        with resources.reserve_threads(resources.nb_threads(len(origins))) as nb_threads:
+            paths = parallel_dijkstra(self.graph,
+                                      origins,
+                                      destinations,
+                                      [{self.layer.id: self.id}]*len(origins),
+                                      'travel_time',
+                                      nb_threads,
+                                      [{self.layer.id}]*len(origins))
 
         ## Parse outputs and complete the pickup times and veh paths matrices
         for i in range(len(paths)):
@@ -481,7 +487,7 @@ class OnDemandMobilityService(AbstractOnDemandMobilityService):
         user = request.user
         drop_node = request.drop_node
         veh, veh_path = self._cache_request_vehicles[user.id]
-        log.info(f'User {user.id} matched with vehicle {veh.id} of mobility service {self._id}')
+        log.info('User %s matched with vehicle %s of mobility service %s', user.id, veh.id, self._id)
         upath = list(user.path.nodes)
         upath = upath[user.get_current_node_index():user.get_node_index_in_path(drop_node) + 1]
         user_path = self.construct_veh_path(upath)
@@ -534,6 +540,7 @@ class OnDemandDepotMobilityService(OnDemandMobilityService, AbstractOnDemandDepo
         #    it contains the same attributes except depots
         self.gnodes = None
         self.depots = dict()
+        self._depots_kdtree = None
 
     def step_maintenance(self, dt: Dt):
         """Method that proceeds to the maintenance phase.
@@ -552,37 +559,50 @@ class OnDemandDepotMobilityService(OnDemandMobilityService, AbstractOnDemandDepo
         self.update_estimated_pickup_times(dt)
 
         ## Make stopped vehicles reposition toward the closest non full depot
-        depots = self.get_all_depots()
-        # For each stopped vehicle
-        for veh in self.fleet.vehicles.values():
-            if veh.activity_type is ActivityType.STOP:
-                if veh._current_node not in self.depots:
-                    # Find the nearest non full depot
-                    filter = DepotIsNotFull() & IsNearestDepotFilter()
-                    mask = filter.get_mask(self.layer, depots, position=veh.position)
-                    nearest_depot = depots[mask]
-                    if len(nearest_depot) > 0:
-                        # Get the shortest path till the nearest depot
-                        nearest_depot = nearest_depot[0]
-                        veh_path, cost = dijkstra(self.graph,
-                                                veh._current_node,
-                                                nearest_depot.node,
-                                                'travel_time',
-                                                {self.layer.id: self.id,
-                                                "TRANSIT": "WALK"},
-                                                {self.layer.id})
-                        if cost == float('inf'):
-                            raise PathNotFound(veh._current_node, depots)
-                        # Make the vehicle reposition till the nearest depot
-                        veh_path = self.construct_veh_path(veh_path)
-                        repositioning = VehicleActivityRepositioning(node=nearest_depot.node,
-                                                                 path=veh_path)
-                        veh.activity.is_done = True
-                        veh.add_activities([repositioning])
-                else:
-                    # Add the vehicle in the depot if it is not yet inside
-                    if not self.depots[veh._current_node].contains(veh):
-                        self.depots[veh._current_node].add_vehicle(veh, None)
+        to_reposition = []
+        for veh in self.fleet.veh_manager.get_idle_vehicles(self.id):
+            if veh._current_node not in self.depots:
+                to_reposition.append(veh)
+            else:
+                # Add the vehicle in the depot if it is not yet inside
+                if not self.depots[veh._current_node].contains(veh):
+                    self.depots[veh._current_node].add_vehicle(veh, None)
+        if len(to_reposition) == 0:
+            return
+
+        # The places of the depots toward which vehicles are already heading are reserved
+        reserved = defaultdict(int)
+        for veh in self.fleet.veh_manager.get_vehicles(self.id, [ActivityType.REPOSITIONING]):
+            if veh.activity.node in self.depots:
+                reserved[veh.activity.node] += 1
+        assigned_depots = self.assign_nearest_free_depots(to_reposition, reserved)
+        vehs, depots = [], []
+        for veh, depot in zip(to_reposition, assigned_depots):
+            if depot is not None:
+                vehs.append(veh)
+                depots.append(depot)
+        if len(vehs) == 0:
+            return
+
+        # Get the shortest paths till the depots at once
+        resources = self.execution_resources
+        with resources.reserve_threads(resources.nb_threads(len(vehs))) as nb_threads:
+            paths = parallel_dijkstra(self.graph,
+                                      [veh._current_node for veh in vehs],
+                                      [depot.node for depot in depots],
+                                      [{self.layer.id: self.id, "TRANSIT": "WALK"}]*len(vehs),
+                                      'travel_time',
+                                      nb_threads,
+                                      [{self.layer.id}]*len(vehs))
+        for veh, depot, (veh_path, cost) in zip(vehs, depots, paths):
+            if cost == float('inf'):
+                raise PathNotFound(veh._current_node, depot.node)
+            # Make the vehicle reposition till the depot
+            veh_path = self.construct_veh_path(veh_path)
+            repositioning = VehicleActivityRepositioning(node=depot.node,
+                                                         path=veh_path)
+            veh.activity.is_done = True
+            veh.add_activities([repositioning])
 
     def matching(self, request: Request):
         """Method that matches a user with an already identified vehicle of this
@@ -594,7 +614,7 @@ class OnDemandDepotMobilityService(OnDemandMobilityService, AbstractOnDemandDepo
         user = request.user
         drop_node = request.drop_node
         veh, veh_path = self._cache_request_vehicles[user.id]
-        log.info(f'User {user.id} matched with vehicle {veh.id} of mobility service {self._id}')
+        log.info('User %s matched with vehicle %s of mobility service %s', user.id, veh.id, self._id)
         upath = list(user.path.nodes)
         upath = upath[user.get_current_node_index():user.get_node_index_in_path(drop_node) + 1]
 
@@ -134,6 +134,8 @@ def get_user_nodes_from_plan(uid: str, plan: List[VehicleActivity]) -> List[str]
 
 
 class OnDemandSharedMobilityService(AbstractOnDemandMobilityService):
+    concurrent_matching = True
+
     def __init__(self,
                  id: str,
                  veh_capacity: int,
@@ -468,7 +470,7 @@ class OnDemandSharedMobilityService(AbstractOnDemandMobilityService):
                 initial_path_dist = compute_path_length(self.graph, nodes)
                 self.users[user.id] = UserInfo(request, user.distance, initial_path_dist) # NB: support only one simultaneous req per user
 
-        log.info(f'User {user.id} matched with vehicle {veh.id} of mobility service {self.id} (new plan = {new_plan})')
+        log.info('User %s matched with vehicle %s of mobility service %s (new plan = %s)', user.id, veh.id, self.id, new_plan)
 
     def launch_matching(self, new_users, user_flow, decision_model, dt):
         """Method that launches the matching phase.
@@ -618,6 +620,9 @@ class OnDemandSharedMobilityService(AbstractOnDemandMobilityService):
         Args:
             -dt: time elapsed since the previous maintenance phase
         """
+        # Estimated pickup times memoised per node are outdated
+        self._node_estimated_pickup_times = dict()
+
         # Treat zone per zone when they are defined
         count_links_treated = 0
         for zid, z in self._zones.items():
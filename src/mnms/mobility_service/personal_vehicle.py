@@ -22,7 +22,7 @@ class PersonalMobilityService(AbstractMobilityService):
         Args:
             -dt: time elapsed since the previous maintenance phase
         """
-        for veh in list(self.fleet.vehicles.values()):
+        for veh in self.fleet.veh_manager.get_idle_vehicles(self.id):
             if veh.activity_type is ActivityType.STOP:
                 if veh.last_dropped_off_user is None or (veh.last_dropped_off_user is not None and veh.last_dropped_off_user.state == UserState.ARRIVED):
                     self.fleet.delete_vehicle(veh.id)
@@ -56,7 +56,7 @@ class PersonalMobilityService(AbstractMobilityService):
         veh_path = self.construct_veh_path(upath)
         # Check if user has already used her personal vehicle
         found = False
-        for veh in list(self.fleet.vehicles.values()):
+        for veh in self.fleet.veh_manager.get_idle_vehicles(self.id):
             if veh.activity_type is ActivityType.STOP and veh.last_dropped_off_user == user:
                 found = True
                 # If so, match her with her own vehicle
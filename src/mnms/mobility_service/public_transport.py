@@ -171,7 +171,7 @@ class PublicTransportMobilityService(AbstractMobilityService):
         if len(self.vehicles[lid]) > 0:
             first_veh = self.vehicles[lid][-1]
             if first_veh.activity_type is VehicleActivityStop:
-                log.info(f"Deleting arrived {self.id} vehicle {first_veh}")
+                log.info("Deleting arrived %s vehicle %s", self.id, first_veh)
                 self.vehicles[lid].pop()
                 self.fleet.delete_vehicle(first_veh.id)
                 self.clean_arrived_vehicles(lid)
@@ -221,7 +221,7 @@ class PublicTransportMobilityService(AbstractMobilityService):
                 new_veh._current_link = veh_path[0][0]
                 new_veh._remaining_link_length = veh_path[0][1]
                 self._next_veh_departure[lid] = (self._current_time_table[lid], new_veh)
-                log.info(f"Vehicle {new_veh.id} of type {type(new_veh).__name__} created for next departure on {self.id} line {lid}")
+                log.info("Vehicle %s of type %s created for next departure on %s line %s", new_veh.id, type(new_veh).__name__, self.id, lid)
             all_departures = list()
 
         if time > self._current_time_table[lid]:
@@ -235,7 +235,7 @@ class PublicTransportMobilityService(AbstractMobilityService):
         next_time = time.add_time(dt)
         if time <= self._current_time_table[lid] < next_time:
             start_veh = self._next_veh_departure[lid][1]
-            log.info(f"Vehicle {start_veh.id} of type {type(start_veh).__name__} starts service on {self.id} line {lid}")
+            log.info("Vehicle %s of type %s starts service on %s line %s", start_veh.id, type(start_veh).__name__, self.id, lid)
             stop_activity = start_veh.activity
             repo_activity = VehicleActivityRepositioning(stop_activity.node,
                                                          stop_activity.path,
@@ -256,7 +256,7 @@ class PublicTransportMobilityService(AbstractMobilityService):
                 new_veh._current_link = veh_path[0][0]
                 new_veh._remaining_link_length = veh_path[0][1]
                 self._next_veh_departure[lid] = (self._next_time_table[lid], new_veh)
-                log.info(f"Vehicle {new_veh.id} of type {type(new_veh).__name__} created for next departure on {self.id} line {lid}")
+                log.info("Vehicle %s of type %s created for next departure on %s line %s", new_veh.id, type(new_veh).__name__, self.id, lid)
             except StopIteration:
                 self._next_veh_departure[lid] = None
                 return all_departures
@@ -274,7 +274,7 @@ class PublicTransportMobilityService(AbstractMobilityService):
             -veh: vehicle that will pick-up and drop-off the user
             -line_nodes: list of nodes the vehicle should follow
         """
-        log.info(f"User {user.id} matched with vehicle {veh.id} of mobility service {self.id}")
+        log.info("User %s matched with vehicle %s of mobility service %s", user.id, veh.id, self.id)
         user.set_state_waiting_vehicle(veh)
 
         pu_node_ind = line_nodes.index(user.current_node)
@@ -386,7 +386,7 @@ class PublicTransportMobilityService(AbstractMobilityService):
         user = request.user
         drop_node = request.drop_node
         veh, line = self._cache_request_vehicles[user.id]
-        log.info(f'User {user.id} matched with vehicle {veh.id} of mobility service {self.id}')
+        log.info('User %s matched with vehicle %s of mobility service %s', user.id, veh.id, self.id)
         self.add_passenger(user, drop_node, veh, line["nodes"])
 
     def step_maintenance(self, dt: Dt):
@@ -26,11 +26,17 @@ class Station(TimeDependentSubject):
         self.capacity = capacity
         self.free_floating = free_floating
 
-        self.waiting_vehicles = []
+        self.waiting_vehicles: Dict[str, Vehicle] = dict()      # id_veh, Vehicle
 
     def __repr__(self):
         return f'Station({self._id}, {len(self.waiting_vehicles)}/{self.capacity})'
 
+    def add_waiting_vehicle(self, veh: Vehicle):
+        self.waiting_vehicles[veh.id] = veh
+
+    def remove_waiting_vehicle(self, veh: Vehicle):
+        del self.waiting_vehicles[veh.id]
+
 
 class VehicleSharingMobilityService(AbstractMobilityService):
 
@@ -66,6 +72,7 @@ class VehicleSharingMobilityService(AbstractMobilityService):
         self.beta = beta
         self.stations = dict()
         self.map_node_station = dict()
+        self._vehicles_in_use: Dict[str, Vehicle] = dict()     # Vehicles which left their station, id_veh, Vehicle
 
     def create_station(self, id_station: str, dbroads_node: str, layer_node:str='', capacity: int=30, nb_initial_veh: int = 0, free_floating=False) \
             -> Station:
@@ -98,7 +105,7 @@ class VehicleSharingMobilityService(AbstractMobilityService):
                                           capacity=self._veh_capacity,
                                           activities=[VehicleActivityStop(node=layer_node)])
             v.set_position(self.graph.nodes[layer_node].position)
-            station.waiting_vehicles.append(v)
+            station.add_waiting_vehicle(v)
 
             if self._observer is not None:
                 v.attach(self._observer)
@@ -106,7 +113,7 @@ class VehicleSharingMobilityService(AbstractMobilityService):
         self.stations[id_station] = station
 
         roaddb_node = self.layer.map_reference_nodes[layer_node]
-        self.layer.stations.append({'id': id_station, 'node': layer_node, 'position': self.layer.roads.nodes[roaddb_node].position})
+        self.layer.stations[id_station] = {'id': id_station, 'node': layer_node, 'position': self.layer.roads.nodes[roaddb_node].position}
 
         # TO DO: 2 stations may be on the same node (free-floating stations)
         self.map_node_station[layer_node] = id_station
@@ -129,7 +136,7 @@ class VehicleSharingMobilityService(AbstractMobilityService):
             -users_canceling: the list of users who should cancel because the station was
              removed
         """
-        log.info(f'{self._id} vehicle sharing service: Station {id_station} is diconnected and removed')
+        log.info('%s vehicle sharing service: Station %s is diconnected and removed', self._id, id_station)
         self.map_node_station.pop(self.stations[id_station].node)
         del (self.stations[id_station])
 
@@ -152,21 +159,30 @@ class VehicleSharingMobilityService(AbstractMobilityService):
         id_station = 'ff_station_' + self.id + '_' + id_node
         self.create_station(id_station, id_node, '', nb_veh, nb_veh, True)
 
-    def create_free_floating_station(self, veh: Vehicle):
+    def create_free_floating_station(self, veh: Vehicle, connect: bool = True):
         """
         Creates the free floating station corresponding to the vehicle
 
         Args:
             -veh: Vehicle
+            -connect: if True, the new station is connected to the odlayer right away,
+             otherwise the caller should connect it
+
+        Returns:
+            -id_station: the id of the created station, None if the vehicle was added
+             to an existing station
         """
         id_station = 'ff_station_' + self.id + '_' + veh.current_node
 
         if id_station in self.stations.keys():
-            self.stations[id_station].waiting_vehicles.append(veh)
+            self.stations[id_station].add_waiting_vehicle(veh)
+            return None
         else:
             station = self.create_station(id_station, '', veh.current_node, 1, 0, True)
-            station.waiting_vehicles.append(veh)
-            self.layer.connect_station(id_station, self.layer._multi_graph.odlayer, 500)
+            station.add_waiting_vehicle(veh)
+            if connect:
+                self.layer.connect_station(id_station, self.layer._multi_graph.odlayer, 500)
+            return id_station
 
     def available_vehicles(self, id_station: str):
         """Method that finds the vehicles available currently at a given station.
@@ -179,33 +195,40 @@ class VehicleSharingMobilityService(AbstractMobilityService):
         """
         assert id_station in self.stations
 
-        node = self.stations[id_station].node
+        station = self.stations[id_station]
 
-        vehs = [v.id for v in self.fleet.vehicles.values() if (node == v.current_node and v.activity_type==ActivityType.STOP)]
+        vehs = [vid for vid, v in station.waiting_vehicles.items() if (station.node == v.current_node and v.activity_type==ActivityType.STOP)]
 
         return vehs
 
     def step_maintenance(self, dt: Dt):
         """Method that proceeds to the maintenance phase of this service.
-        It associates the stopped vehicles to the existing stations and eventually
-        create a new free-floating station when the service authorizes it.
+        It associates the vehicles which stopped since they left their station to
+        the existing stations and eventually create a new free-floating station
+        when the service authorizes it.
 
         Args:
             -dt: time elapsed since the previous maintenance phase
         """
-        # TO DO: optimisation (not manage all the vehicle)
-        for veh in self.fleet.vehicles.values():
+        new_stations = []
+        for veh in list(self._vehicles_in_use.values()):
             if veh.activity_type is ActivityType.STOP:
                 _current_node = veh.current_node
 
                 if self.map_node_station.get(_current_node):
                     station_id = self.map_node_station[_current_node]
-
-                    if veh not in self.stations[station_id].waiting_vehicles:
-                        self.stations[station_id].waiting_vehicles.append(veh)
+                    self.stations[station_id].add_waiting_vehicle(veh)
+                    del self._vehicles_in_use[veh.id]
                 else:
                     if self.free_floating_possible:
-                        self.create_free_floating_station(veh)
+                        id_station = self.create_free_floating_station(veh, connect=False)
+                        if id_station is not None:
+                            new_stations.append(id_station)
+                        del self._vehicles_in_use[veh.id]
+
+        # Connect all the free-floating stations created during this step at once
+        if new_stations:
+            self.layer.connect_stations(new_stations, self.layer._multi_graph.odlayer, 500)
 
     def periodic_maintenance(self, dt: Dt):
         pass
@@ -280,7 +303,7 @@ class VehicleSharingMobilityService(AbstractMobilityService):
         user = request.user
         drop_node = request.drop_node
         veh_id, veh_path = self._cache_request_vehicles[user.id]
-        log.info(f'User {user.id} matched with vehicle {veh_id} of mobility service {self._id}')
+        log.info('User %s matched with vehicle %s of mobility service %s', user.id, veh_id, self._id)
         upath = list(user.path.nodes)
         upath = upath[user.get_current_node_index():user.get_node_index_in_path(drop_node) + 1]
         user_path = self.construct_veh_path(upath)
@@ -299,7 +322,8 @@ class VehicleSharingMobilityService(AbstractMobilityService):
 
         station = self.stations[self.map_node_station[user.current_node]]
         # Delete the vehicle from the waiting vehicle list
-        station.waiting_vehicles.remove(veh)
+        station.remove_waiting_vehicle(veh)
+        self._vehicles_in_use[veh.id] = veh
 
         # Delete the station if it is free-floating and empty
         if station.free_floating and len(station.waiting_vehicles) == 0:
@@ -0,0 +1,327 @@
+import sys
+import csv
+import json
+import argparse
+import traceback
+import importlib.util
+import multiprocessing
+from multiprocessing.connection import wait
+from time import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from mnms.graph.layers import MultiLayerGraph
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.log import create_logger
+from mnms.tools.execution import ExecutionResources, available_cpu_count
+
+log = create_logger(__name__)
+
+
+class Scenario(object):
+    def __init__(self, sid: str, seed: Optional[int] = None, params: Optional[Dict] = None):
+        """Description of one run of a batch of scenarios.
+
+        Args:
+            -sid: id of the scenario, also used as name of its output directory
+            -seed: seed of the run
+            -params: free parameters passed to the function building the supervisor
+             (demand file, fleet sizes, MFD parameters, ...)
+        """
+        self.id = str(sid)
+        self.seed = seed
+        self.params = dict() if params is None else params
+
+    def __repr__(self):
+        return f"Scenario({self.id}, seed={self.seed})"
+
+    def __dump__(self) -> dict:
+        return {'ID': self.id, 'SEED': self.seed, 'PARAMS': self.params}
+
+    @classmethod
+    def __load__(cls, data: dict) -> "Scenario":
+        return cls(data['ID'], data.get('SEED'), data.get('PARAMS'))
+
+
+def default_kpis(supervisor: Supervisor, scenario: Scenario, outdir: Path) -> dict:
+    """Default KPIs computed at the end of each run of a batch of scenarios.
+
+    Args:
+        -supervisor: the supervisor of the run
+        -scenario: the scenario of the run
+        -outdir: output directory of the run
+
+    Returns:
+        -dict of KPIs
+    """
+    return {'NB_USERS_NOT_ARRIVED': len(supervisor._user_flow.users)}
+
+
+# Batch run by the forked processes, it is set by the parent process before
+# forking so that children share the loaded graph in copy-on-write
+_CURRENT_BATCH = None
+
+
+def _run_scenario_in_child(ind: int, conn) -> None:
+    # The simulations running at once share the CPUs
+    ExecutionResources.set_default(ExecutionResources(max(1, available_cpu_count() // _CURRENT_BATCH.processes)))
+    conn.send(_CURRENT_BATCH.run_scenario(_CURRENT_BATCH.scenarios[ind]))
+    conn.close()
+
+
+class ScenarioBatch(object):
+    SUMMARY_FILE = 'summary.json'
+
+    def __init__(self,
+                 mlgraph: MultiLayerGraph,
+                 build_supervisor: Callable[[MultiLayerGraph, Scenario, Path], Supervisor],
+                 scenarios: List[Scenario],
+                 outdir: Union[str, Path],
+                 tstart: Time,
+                 tend: Time,
+                 flow_dt: Dt,
+                 affectation_factor: int,
+                 update_graph_threshold: float = 0.,
+                 compute_kpis: Callable[[Supervisor, Scenario, Path], dict] = default_kpis,
+                 processes: Optional[int] = None):
+        """Batch of simulations run on the same multi layer graph. The graph is loaded
+        once, then one process is forked per scenario so that each run starts from
+        the loaded graph without reloading it, and with its own class attributes.
+
+        Args:
+            -mlgraph: the multi layer graph shared by all scenarios, with its odlayer
+             and transit links already built
+            -build_supervisor: function that takes the graph, the scenario and the
+             output directory of the run, and returns the supervisor to run
+            -scenarios: list of scenarios to run
+            -outdir: directory where the outputs of each run (in a sub directory
+             named after the scenario id) and the batch summary are written
+            -tstart: simulation start time
+            -tend: simulation end time
+            -flow_dt: the simulation flow time step
+            -affectation_factor: the number of simulation flow time step representing one affectation time step
+            -update_graph_threshold: threshold on the speed variation below which costs on the graph links are not updated
+            -compute_kpis: function that returns a dict of KPIs at the end of a run
+            -processes: number of simulations run in parallel, all the CPUs available
+             for this process by default
+        """
+        assert len(set(s.id for s in scenarios)) == len(scenarios), 'Scenarios ids should be unique'
+        self.mlgraph = mlgraph
+        self.build_supervisor = build_supervisor
+        self.scenarios = scenarios
+        self.outdir = Path(outdir)
+        self.tstart = tstart
+        self.tend = tend
+        self.flow_dt = flow_dt
+        self.affectation_factor = affectation_factor
+        self.update_graph_threshold = update_graph_threshold
+        self.compute_kpis = compute_kpis
+        self.processes = processes if processes is not None else available_cpu_count()
+
+    def scenario_outdir(self, scenario: Scenario) -> Path:
+        return self.outdir / scenario.id
+
+    def load_summary(self, scenario: Scenario) -> Optional[dict]:
+        """Method that returns the summary of a scenario if it has already been
+        successfully run, None otherwise.
+
+        Args:
+            -scenario: the scenario
+
+        Returns:
+            -summary of the run or None
+        """
+        summary_file = self.scenario_outdir(scenario) / self.SUMMARY_FILE
+        if summary_file.exists():
+            with open(summary_file, 'r') as f:
+                return json.load(f)
+        return None
+
+    def run_scenario(self, scenario: Scenario) -> dict:
+        """Method that builds the supervisor of a scenario, runs it and computes its KPIs.
+        It is called in a process forked from the one which loaded the graph.
+
+        Args:
+            -scenario: the scenario to run
+
+        Returns:
+            -summary of the run
+        """
+        outdir = self.scenario_outdir(scenario)
+        outdir.mkdir(parents=True, exist_ok=True)
+        summary = {'ID': scenario.id, 'SEED': scenario.seed, 'STATUS': 'FAILED'}
+        try:
+            start = time()
+            supervisor = self.build_supervisor(self.mlgraph, scenario, outdir)
+            summary['BUILD_TIME'] = time() - start
+
+            start = time()
+            supervisor.run(self.tstart, self.tend, self.flow_dt, self.affectation_factor,
+                           update_graph_threshold=self.update_graph_threshold, seed=scenario.seed)
+            summary['RUN_TIME'] = time() - start
+
+            summary.update(self.compute_kpis(supervisor, scenario, outdir))
+            summary['STATUS'] = 'DONE'
+        except Exception:
+            summary['ERROR'] = traceback.format_exc()
+            log.error(f'Scenario {scenario.id} failed:\n{summary["ERROR"]}')
+            return summary
+
+        # The summary file marks the scenario as done for an eventual resume
+        with open(outdir / self.SUMMARY_FILE, 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def run(self, resume: bool = True) -> List[dict]:
+        """Method that runs all scenarios of the batch and writes the summary
+        of all runs in the summary.csv file of the output directory.
+
+        Args:
+            -resume: if True, the scenarios already successfully run are not run again
+
+        Returns:
+            -list of the summaries of all runs, in the order of the scenarios
+        """
+        global _CURRENT_BATCH
+
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            log.error('ScenarioBatch requires the fork start method which is not available on this platform')
+            sys.exit(-1)
+
+        self.outdir.mkdir(parents=True, exist_ok=True)
+        summaries = {}
+        if resume:
+            for scenario in self.scenarios:
+                summary = self.load_summary(scenario)
+                if summary is not None:
+                    summaries[scenario.id] = summary
+            if summaries:
+                log.info('Resume batch, %s/%s scenarios already done', len(summaries), len(self.scenarios))
+        to_run = [i for i, s in enumerate(self.scenarios) if s.id not in summaries]
+
+        log.info('Run %s scenarios on %s processes...', len(to_run), self.processes)
+        start = time()
+        _CURRENT_BATCH = self
+        running = dict()
+        try:
+            # One fresh fork per scenario so that each run starts from the loaded graph.
+            # Processes are forked from this thread only: forking from a helper thread
+            # (as a Pool does to replace its workers) may copy locks held here, e.g.
+            # the one of a logging stream, and dead lock the child
+            ctx = multiprocessing.get_context('fork')
+            pending = list(to_run)
+            while pending or running:
+                while pending and len(running) < self.processes:
+                    ind = pending.pop(0)
+                    parent_conn, child_conn = ctx.Pipe(duplex=False)
+                    process = ctx.Process(target=_run_scenario_in_child, args=(ind, child_conn))
+                    process.start()
+                    child_conn.close()
+                    running[ind] = (process, parent_conn)
+
+                ready = wait([conn for _, conn in running.values()] + [p.sentinel for p, _ in running.values()])
+                for ind, (process, conn) in list(running.items()):
+                    if conn not in ready and process.sentinel not in ready:
+                        continue
+                    try:
+                        summary = conn.recv()
+                    except EOFError:
+                        # The process died without sending its summary
+                        summary = None
+                    process.join()
+                    conn.close()
+                    if summary is None:
+                        scenario = self.scenarios[ind]
+                        summary = {'ID': scenario.id, 'SEED': scenario.seed, 'STATUS': 'FAILED',
+                                   'ERROR': f'Process exited with code {process.exitcode}'}
+                    del running[ind]
+                    summaries[summary['ID']] = summary
+                    log.info('Scenario %s %s', summary['ID'], summary['STATUS'])
+        finally:
+            _CURRENT_BATCH = None
+            for process, conn in running.values():
+                process.terminate()
+                process.join()
+                conn.close()
+        end = time()
+        log.info('Batch done in [%.5g s]', end - start)
+
+        summaries = [summaries[s.id] for s in self.scenarios]
+        self.write_summary(summaries)
+        return summaries
+
+    def write_summary(self, summaries: List[dict]):
+        """Method that writes the summaries of the runs in the summary.csv file of
+        the output directory.
+
+        Args:
+            -summaries: list of the summaries of the runs
+        """
+        columns = []
+        for summary in summaries:
+            columns.extend([k for k in summary.keys() if k not in columns and k != 'ERROR'])
+        with open(self.outdir / 'summary.csv', 'w') as f:
+            csvhandler = csv.writer(f, delimiter=';', quotechar='|')
+            csvhandler.writerow(columns)
+            for summary in summaries:
+                csvhandler.writerow([summary.get(c, '') for c in columns])
+
+
+def load_scenarios(filename: Union[str, Path]) -> List[Scenario]:
+    """Load a list of scenarios from a JSON file with the format
+    [{"ID": "s0", "SEED": 0, "PARAMS": {...}}, ...]
+
+    Args:
+        -filename: the path to the JSON file
+
+    Returns:
+        -list of scenarios
+    """
+    with open(filename, 'r') as f:
+        data = json.load(f)
+    return [Scenario.__load__(d) for d in data]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a batch of MnMS scenarios sharing the same multi layer graph.')
+    parser.add_argument('setup', help='Python file defining build_graph() -> MultiLayerGraph, '
+                                      'build_supervisor(mlgraph, scenario, outdir) -> Supervisor and '
+                                      'optionally compute_kpis(supervisor, scenario, outdir) -> dict')
+    parser.add_argument('scenarios', help='JSON file with the list of scenarios')
+    parser.add_argument('outdir', help='Output directory of the batch')
+    parser.add_argument('--tstart', required=True, help='Simulation start time (HH:MM:SS)')
+    parser.add_argument('--tend', required=True, help='Simulation end time (HH:MM:SS)')
+    parser.add_argument('--flow-dt', type=float, required=True, help='Flow time step in seconds')
+    parser.add_argument('--affectation-factor', type=int, required=True,
+                        help='Number of flow time steps per affectation time step')
+    parser.add_argument('--update-graph-threshold', type=float, default=0.)
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of simulations run in parallel, all available CPUs by default')
+    parser.add_argument('--no-resume', action='store_true', help='Rerun the scenarios already done')
+    args = parser.parse_args(argv)
+
+    spec = importlib.util.spec_from_file_location('mnms_scenario_setup', args.setup)
+    setup = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(setup)
+
+    batch = ScenarioBatch(setup.build_graph(),
+                          setup.build_supervisor,
+                          load_scenarios(args.scenarios),
+                          args.outdir,
+                          Time(args.tstart),
+                          Time(args.tend),
+                          Dt(seconds=args.flow_dt),
+                          args.affectation_factor,
+                          update_graph_threshold=args.update_graph_threshold,
+                          compute_kpis=getattr(setup, 'compute_kpis', default_kpis),
+                          processes=args.processes)
+    summaries = batch.run(resume=not args.no_resume)
+    nb_failed = sum(s['STATUS'] != 'DONE' for s in summaries)
+    if nb_failed:
+        log.error(f'{nb_failed}/{len(summaries)} scenarios failed')
+        sys.exit(-1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,8 @@ from time import time
 import csv
 import traceback
 import random
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 import numpy as np
 
@@ -16,8 +17,10 @@ from mnms.demand.manager import AbstractDemandManager
 from mnms.travel_decision.abstract import AbstractDecisionModel, Event
 from mnms.mobility_service.public_transport import PublicTransportMobilityService
 from mnms.time import Time, Dt
-from mnms.log import create_logger, attach_log_file, LOGLEVEL
+from mnms.log import create_logger, attach_log_file, LOGLEVEL, LazyStr
 from mnms.tools.progress import ProgressBar
+from mnms.tools.execution import ExecutionResources
+from mnms.io.link_costs import LinkCostsRecorder
 from mnms.vehicles.manager import VehicleManager
 from mnms.vehicles.veh_type import Vehicle
 
@@ -32,7 +35,10 @@ class Supervisor(object):
                  decision_model: AbstractDecisionModel,
                  outfile: Optional[str] = None,
                  logfile: Optional[str] = None,
-                 loglevel: LOGLEVEL = LOGLEVEL.WARNING):
+                 loglevel: LOGLEVEL = LOGLEVEL.WARNING,
+                 veh_manager: Optional[VehicleManager] = None,
+                 execution_resources: Optional[ExecutionResources] = None,
+                 link_costs_file: Optional[str] = None):
         """
         Main class to launch a simulation.
 
@@ -45,21 +51,38 @@ class Supervisor(object):
                       of each link in the multi layer graph
             -logfile: file where simulation log should be printed
             -loglevel: level of log to print
+            -veh_manager: the registry of the vehicles of this simulation, the default
+                          one of the process if None. Giving a specific one allows several
+                          simulations to coexist in the same process
+            -execution_resources: the compute budget of the parallel calls of this simulation
+                                  (shortest paths computations, thread pools), the default
+                                  one of the process if None
+            -link_costs_file: If not None record in this binary file the costs of the links
+                              updated at each affectation step, see mnms.io.link_costs
         """
 
         self._mlgraph: MultiLayerGraph = None
+        self._veh_manager: VehicleManager = veh_manager if veh_manager is not None else VehicleManager.default()
+        self._execution_resources: ExecutionResources = execution_resources if execution_resources is not None \
+            else ExecutionResources.default()
         self._demand: AbstractDemandManager = demand
         self._flow_motor: AbstractMFDFlowMotor = flow_motor
 
         self._decision_model:AbstractDecisionModel = decision_model
+        self._decision_model.set_execution_resources(self._execution_resources)
         self._user_flow: UserFlow = UserFlow()
 
         self.add_graph(graph)
         self._flow_motor.set_graph(graph)
+        self._flow_motor.set_vehicle_manager(self._veh_manager)
         self._user_flow.set_graph(graph)
 
         self.tcurrent: Optional[Time] = None
 
+        # Thread pool running the maintenance and matching of the mobility services
+        # which support it concurrently, None if they run sequentially
+        self._services_executor: Optional[ThreadPoolExecutor] = None
+
         if outfile is None:
             self._write = False
         else:
@@ -68,6 +91,10 @@ class Supervisor(object):
             self._csvhandler = csv.writer(self._outfile, delimiter=';', quotechar='|')
             self._csvhandler.writerow(['AFFECTATION_STEP', 'TIME', 'ID', 'MOBILITY_SERVICE', 'COSTS'])
 
+        self._link_costs_recorder: Optional[LinkCostsRecorder] = None
+        if link_costs_file is not None:
+            self.set_link_costs_file(link_costs_file)
+
         if logfile is not None:
             attach_log_file(logfile, loglevel)
 
@@ -81,6 +108,35 @@ class Supervisor(object):
             # NB: For now, only the decision model can be stochastic
             self._decision_model.set_random_seed(seed)
 
+    def set_link_costs_file(self, link_costs_file: str):
+        """Method that records the costs of the links updated at each affectation step
+        in a binary file, see mnms.io.link_costs.
+
+        Args:
+            -link_costs_file: the file to write
+        """
+        if self._link_costs_recorder is not None:
+            self._link_costs_recorder.close()
+        self._link_costs_recorder = LinkCostsRecorder(link_costs_file, self._mlgraph)
+
+    def set_warm_start(self,
+                       link_speeds: Optional[Dict[str, float]] = None,
+                       accumulations: Optional[Dict[str, Dict[str, float]]] = None):
+        """Method that sets the traffic conditions from which the next runs start
+        instead of the free flow ones, see AbstractMFDFlowMotor.set_warm_start.
+
+        Args:
+            -link_speeds: speed of the links by link id
+            -accumulations: accumulation of each mode by reservoir id
+        """
+        self._flow_motor.set_warm_start(link_speeds=link_speeds, accumulations=accumulations)
+
+    def clear_users_state(self):
+        """Method that makes the decision model forget the users of the previous run,
+        see AbstractDecisionModel.clear_users_state.
+        """
+        self._decision_model.clear_users_state()
+
     def add_graph(self, mlgraph: MultiLayerGraph):
         """Method to add a multilayer graph to the supervisor.
         A map associating each mobility service of the graph to the corresponding
@@ -94,6 +150,11 @@ class Supervisor(object):
         self._mlgraph.construct_layer_service_mapping()
         for layer in mlgraph.layers.values():
             layer.initialize()
+            # Vehicles of the graph are registered in the vehicle manager of this simulation
+            for mservice in layer.mobility_services.values():
+                if mservice.fleet is not None:
+                    mservice.fleet.set_vehicle_manager(self._veh_manager)
+                mservice.set_execution_resources(self._execution_resources)
 
     def add_flow_motor(self, flow: AbstractMFDFlowMotor):
         """Method to add a flow motor to the supervisor.
@@ -103,6 +164,7 @@ class Supervisor(object):
         """
         self._flow_motor = flow
         flow.set_graph(self._mlgraph)
+        flow.set_vehicle_manager(self._veh_manager)
 
     def add_demand(self, demand: AbstractDemandManager):
         """Method to add a demand manager to the supervisor.
@@ -119,6 +181,7 @@ class Supervisor(object):
             -model: the AbstractDecisionModel object to add
         """
         self._decision_model = model
+        model.set_execution_resources(self._execution_resources)
 
     def initialize(self, tstart:Time):
         """Method that initializes the simulation by setting the time of the different
@@ -143,6 +206,10 @@ class Supervisor(object):
         class attributes.
         """
         self._flow_motor.finalize()
+        self._decision_model.discard_prefetched_paths()
+        if self._services_executor is not None:
+            self._services_executor.shutdown()
+            self._services_executor = None
 
         if self._decision_model._write:
             self._decision_model._outfile.close()
@@ -150,6 +217,9 @@ class Supervisor(object):
         if self._write:
             self._outfile.close()
 
+        if self._link_costs_recorder is not None:
+            self._link_costs_recorder.close()
+
         if self._demand:
             for obs in self._demand._observers:
                 obs.finish()
@@ -159,8 +229,8 @@ class Supervisor(object):
                 if mservice._observer is not None:
                     mservice._observer.finish()
 
-        # Clean the class attributes
-        VehicleManager.empty()
+        # Clean the vehicles registry
+        self._veh_manager.clear()
         Vehicle.reset_counter()
 
     def call_planning(self):
@@ -170,7 +240,7 @@ class Supervisor(object):
         start = time()
         self._decision_model(self.tcurrent)
         end = time()
-        log.info(f'(Re)planning done in [{end - start:.5} s]')
+        log.info('(Re)planning done in [%.5g s]', end - start)
 
     def call_update_graph(self, threshold):
         """Calls the graph update and measures execution time.
@@ -179,7 +249,57 @@ class Supervisor(object):
         start = time()
         self._flow_motor.update_graph(threshold)
         end = time()
-        log.info(f' Update graph done in [{end-start:.5} s]')
+        log.info(' Update graph done in [%.5g s]', end-start)
+
+    def split_mobility_services(self):
+        """Splits the mobility services between the ones whose maintenance and matching
+        can run concurrently and the other ones.
+
+        Returns:
+            -concurrent_services: services which support concurrent maintenance and matching
+            -sequential_services: the other services, in layers and services order
+        """
+        concurrent_services = []
+        sequential_services = []
+        for layer in self._mlgraph.layers.values():
+            for mservice in layer.mobility_services.values():
+                if mservice.concurrent_matching:
+                    concurrent_services.append(mservice)
+                else:
+                    sequential_services.append(mservice)
+        return concurrent_services, sequential_services
+
+    def _run_on_mobility_services(self, func):
+        """Applies a function to all mobility services. When the concurrent execution
+        is enabled, the services which support it are treated concurrently first, the
+        other ones are then treated sequentially, in order. Interactions with other
+        services, the graph, the users flow or the decision model only happen in this
+        second phase, so results do not depend on the threads scheduling.
+
+        Args:
+            -func: function called with each mobility service
+        """
+        if self._services_executor is None:
+            for layer in self._mlgraph.layers.values():
+                for mservice in layer.mobility_services.values():
+                    func(mservice)
+            return
+        concurrent_services, sequential_services = self.split_mobility_services()
+        if len(concurrent_services) > 1:
+            # Consume the results to raise the eventual exceptions of the threads
+            list(self._services_executor.map(func, concurrent_services))
+        else:
+            sequential_services = concurrent_services + sequential_services
+        for mservice in sequential_services:
+            func(mservice)
+
+    def _update_mobility_service(self, mservice, flow_dt: Dt):
+        log.info(' Update mobility service %s...', mservice.id)
+        start = time()
+        mservice.update(flow_dt)
+        mservice.update_time(flow_dt)
+        end = time()
+        log.info(' Update mobility service %s done in [%.5g s]', mservice.id, end-start)
 
     def call_update_mobility_services(self, flow_dt:Dt):
         """Calls the update method of all mobility services and measures the execution
@@ -188,14 +308,7 @@ class Supervisor(object):
         Args:
             -flow_dt: the simulation flow time step
         """
-        for layer in self._mlgraph.layers.values():
-            for mservice in layer.mobility_services.values():
-                log.info(f' Update mobility service {mservice.id}...')
-                start = time()
-                mservice.update(flow_dt)
-                mservice.update_time(flow_dt)
-                end = time()
-                log.info(f' Update mobility service {mservice.id} done in [{end-start:.5} s]')
+        self._run_on_mobility_services(lambda mservice: self._update_mobility_service(mservice, flow_dt))
 
     def call_user_flow_step(self, flow_dt: Dt, users_step: List[User]):
         """Calls the user flow step and measures execution time.
@@ -212,9 +325,16 @@ class Supervisor(object):
         users_reach_dt_answer = self._user_flow.step(flow_dt, users_step)
         self._user_flow.update_time(flow_dt)
         end = time()
-        log.info(f' User flow step done [{end - start:.5} s]')
+        log.info(' User flow step done [%.5g s]', end - start)
         return users_reach_dt_answer
 
+    def _match_mobility_service(self, ms, new_users, flow_dt):
+        log.info(' Perform matching for mobility service %s...', ms.id)
+        start = time()
+        ms.launch_matching(new_users, self._user_flow, self._decision_model, flow_dt)
+        end = time()
+        log.info(' Matching for mobility service %s done in [%.5g s]', ms.id, end - start)
+
     def call_matching_mobility_services(self, new_users, flow_dt):
         """Calls the matching for all mobility services and measures execution times.
 
@@ -223,13 +343,7 @@ class Supervisor(object):
                         yet been taken into account by the UserFlow object
             -flow_dt: the flow time step
         """
-        for layer in self._mlgraph.layers.values():
-            for ms in layer.mobility_services.values():
-                log.info(f' Perform matching for mobility service {ms.id}...')
-                start = time()
-                ms.launch_matching(new_users, self._user_flow, self._decision_model, flow_dt)
-                end = time()
-                log.info(f' Matching for mobility service {ms.id} done in [{end - start:.5} s]')
+        self._run_on_mobility_services(lambda ms: self._match_mobility_service(ms, new_users, flow_dt))
 
     def call_flow_motor_step(self, flow_dt: Dt):
         """Calls the flow motor step and measures execution time.
@@ -242,24 +356,36 @@ class Supervisor(object):
         self._flow_motor.step(flow_dt)
         self._flow_motor.update_time(flow_dt)
         end = time()
-        log.info(f' Flow motor step done in [{end - start:.5} s]')
+        log.info(' Flow motor step done in [%.5g s]', end - start)
 
     def step_dynamic_space_sharing(self):
+        """Updates the dynamic space sharing and reroutes the vehicles planning to pass
+        through newly banned links, all new paths are computed at once.
+        """
+        # NB: the vehicles are only iterated if a link gets banned during this step
         veh_to_reroute = self._mlgraph.dynamic_space_sharing.update(self.tcurrent,
-                                                                    list(VehicleManager._vehicles.values()))
+                                                                    self._veh_manager.vehicles.values())
+        if not veh_to_reroute:
+            return
+
+        origins = []
+        destinations = []
+        accessible_layers = []
+        chosen_services = []
         for veh, activity in veh_to_reroute:
-            origin = activity.path[0][0][0]
-            dest = activity.path[-1][0][1]
             mservice_id = veh.mobility_service
-
             layer = self._mlgraph.mapping_layer_services[mservice_id]
-            new_path, _ = self._decision_model.compute_path(origin,
-                                                            dest,
-                                                            {layer.id},
-                                                            {layer.id: mservice_id})
+            origins.append(activity.path[0][0][0])
+            destinations.append(activity.path[-1][0][1])
+            accessible_layers.append({layer.id})
+            chosen_services.append({layer.id: mservice_id})
+
+        new_paths = self._decision_model.compute_paths(origins, destinations, accessible_layers, chosen_services)
 
+        for (veh, activity), (new_path, _) in zip(veh_to_reroute, new_paths):
             if new_path:
-                mservice = layer.mobility_services[mservice_id]
+                layer = self._mlgraph.mapping_layer_services[veh.mobility_service]
+                mservice = layer.mobility_services[veh.mobility_service]
                 new_veh_path = mservice.construct_veh_path(new_path)
 
                 if activity is veh.activity:
@@ -270,21 +396,24 @@ class Supervisor(object):
 
                 activity.modify_path(new_veh_path)
 
-    def get_new_users(self, principal_dt):
+    def get_new_users(self, principal_dt, tstart: Optional[Time] = None):
         """Gathers/Creates the users who depart during the coming affectation step.
 
         Args:
             -principal_dt: duration of one affectation step
+            -tstart: start of the affectation step, current time if None
 
         Returns:
             -new_users: list of users who depart during the coming affectation step
         """
-        log.info(f'Getting next departures {self.tcurrent}->{self.tcurrent.add_time(principal_dt)} ...')
+        if tstart is None:
+            tstart = self.tcurrent
+        log.info('Getting next departures %s->%s ...', tstart, LazyStr(tstart.add_time, principal_dt))
         new_users = []
         if self._demand:
-            new_users = self._demand.get_next_departures(self.tcurrent, self.tcurrent.add_time(principal_dt))
+            new_users = self._demand.get_next_departures(tstart, tstart.add_time(principal_dt))
             self._demand.construct_user_parameters(new_users)
-        log.info(f'Getting next departures done: {len(new_users)} new departures')
+        log.info('Getting next departures done: %s new departures', len(new_users))
 
         return new_users
 
@@ -316,7 +445,8 @@ class Supervisor(object):
             pass
         return users_step, remaining_new_users
 
-    def run(self, tstart: Time, tend: Time, flow_dt: Dt, affectation_factor: int, update_graph_threshold: float = 0., seed: int=None):
+    def run(self, tstart: Time, tend: Time, flow_dt: Dt, affectation_factor: int, update_graph_threshold: float = 0., seed: int=None,
+            pipelined_planning: bool = False, concurrent_mobility_services: bool = False):
         """Launch a full simulation.
 
         Args:
@@ -326,27 +456,46 @@ class Supervisor(object):
             -affectation_factor: the number of simulation flow time step representing one affectation time step
             -update_graph_threshold: threshold on the speed variation below which costs on the graph links are not updated
             -seed: seed of the simulation
+            -pipelined_planning: if True, the paths of the users departing during the next affectation
+                                 step are computed in the background during the current one, on the
+                                 link costs of the current affectation step. These costs are one
+                                 affectation step older than without pipelining, i.e. they were updated
+                                 at most 2*flow_dt*affectation_factor before the departure planning.
+                                 Waiting and additional costs are computed at planning time.
+            -concurrent_mobility_services: if True, the maintenance and the matching of the mobility
+                                           services which support it (see AbstractMobilityService.concurrent_matching)
+                                           run concurrently in a thread pool
         """
-        log.info(f'Start run from {tstart} to {tend}')
+        log.info('Start run from %s to %s', tstart, tend)
 
         ### Initializations
         self.set_random_seed(seed)
         self.initialize(tstart)
+        if concurrent_mobility_services:
+            nb_concurrent_services = len(self.split_mobility_services()[0])
+            if nb_concurrent_services > 1:
+                self._services_executor = ThreadPoolExecutor(max_workers=min(nb_concurrent_services, self._execution_resources.thread_number),
+                                                             thread_name_prefix='mobility_services')
         affectation_step = 0
         flow_step = 0
         principal_dt = flow_dt * affectation_factor
         self.tcurrent = tstart
         progress = ProgressBar(ceil((tend-tstart).to_seconds()/(flow_dt.to_seconds()*affectation_factor)))
+        next_new_users = None
 
         ### Main loop
         while self.tcurrent < tend:
             progress.update()
             progress.show()
-            log.info(f'Current time: {self.tcurrent}, affectation step: {affectation_step}')
+            log.info('Current time: %s, affectation step: %s', self.tcurrent, affectation_step)
 
             ## Get all departures during the next principal_dt and add the ones
             ## with no forced path in the list of users about to plan their journey
-            new_users = self.get_new_users(principal_dt)
+            if next_new_users is None:
+                new_users = self.get_new_users(principal_dt)
+            else:
+                new_users = next_new_users
+                next_new_users = None
             new_users_for_planning = []
             for u in new_users:
                 if u.path is None:
@@ -362,14 +511,20 @@ class Supervisor(object):
                     user.set_pickup_dt(pt_ms, Dt(hours=24))
 
             ## Call affectation_factor simulation flow steps
-            for _ in range(affectation_factor):
+            for step in range(affectation_factor):
 
                 # Call the planning module
                 self.call_planning()
 
+                # Launch the paths discovery of the next departures, it overlaps with the
+                # next flow steps
+                if pipelined_planning and step == 0 and self.tcurrent.add_time(principal_dt) < tend:
+                    next_new_users = self.get_new_users(principal_dt, self.tcurrent.add_time(principal_dt))
+                    self._decision_model.prefetch_departures_paths([u for u in next_new_users if u.path is None])
+
                 # Gather users who depart during this flow step
                 users_step, new_users = self.get_users_step(new_users, flow_dt)
-                log.info(f'Users step:{users_step}')
+                log.info('Users step:%s', users_step)
 
                 # Call update of all mobility services, update means maintenance
                 self.call_update_mobility_services(flow_dt)
@@ -404,7 +559,11 @@ class Supervisor(object):
                     for mservice, costs in link.costs.items():
                         self._csvhandler.writerow([str(affectation_step), t_str, link.id, mservice, costs])
                 end = time()
-                log.info(f'Done [{end - start:.5} s]')
+                log.info('Done [%.5g s]', end - start)
+
+            if self._link_costs_recorder is not None:
+                self._link_costs_recorder.record(affectation_step, self.tcurrent.to_seconds(),
+                                                 self._mlgraph.pop_updated_links())
 
             ## Update affectation step number
             log.info('-'*50)
@@ -0,0 +1,137 @@
+import os
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from math import ceil
+from typing import Iterator, Optional
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """Returns the number of CPUs allowed by the cgroup CPU quota of this process,
+    None if there is no quota.
+    """
+    # cgroup v2, the file contains "<quota> <period>" or "max <period>"
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    # cgroup v1, a negative quota means no quota
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpu_count() -> int:
+    """Returns the number of CPUs this process is allowed to run on, taking into
+    account its CPU affinity and the CPU quota of its cgroup.
+    """
+    try:
+        nb_cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        nb_cpus = multiprocessing.cpu_count()
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        nb_cpus = min(nb_cpus, ceil(limit))
+    return max(1, nb_cpus)
+
+
+class ExecutionResources(object):
+
+    # Default resources used by the modules which are not given specific ones
+    _default: Optional["ExecutionResources"] = None
+
+    def __init__(self, thread_number: Optional[int] = None, inline_threshold: int = 16):
+        """Compute budget of the parallel calls of a simulation: HiPOP shortest paths
+        computations and thread pools. The budget is shared by the calls running at
+        the same time (main thread, paths prefetch thread, mobility services thread
+        pool) through reserve_threads.
+
+        Args:
+            -thread_number: maximum number of threads of all the parallel calls running
+             at the same time, all the CPUs available to this process (affinity and
+             cgroup quota) if None
+            -inline_threshold: the parallel calls with at most this number of tasks run
+             in one thread, they are too small to pay off the threads start-up, tune it
+             with the benchmarks
+        """
+        self.thread_number: int = thread_number if thread_number is not None else available_cpu_count()
+        self.inline_threshold: int = inline_threshold
+        assert self.thread_number >= 1, 'The number of threads should be at least 1'
+
+        self._threads_in_use: int = 0
+        self._threads_condition = threading.Condition()
+
+    def __repr__(self):
+        return f"ExecutionResources(thread_number={self.thread_number}, inline_threshold={self.inline_threshold})"
+
+    @property
+    def threads_in_use(self) -> int:
+        return self._threads_in_use
+
+    @classmethod
+    def default(cls) -> "ExecutionResources":
+        """Returns the default execution resources of the process.
+        """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    @classmethod
+    def set_default(cls, resources: Optional["ExecutionResources"]):
+        """Sets the default execution resources of the process, None resets them to
+        all the available CPUs.
+
+        Args:
+            -resources: the new default execution resources
+        """
+        cls._default = resources
+
+    def nb_threads(self, nb_tasks: int) -> int:
+        """Method that returns the number of threads to use for a parallel call.
+
+        Args:
+            -nb_tasks: number of independent tasks of the call, e.g. the number of
+             shortest paths to compute
+
+        Returns:
+            -the number of threads, 1 when the call should run inline
+        """
+        if nb_tasks <= self.inline_threshold:
+            return 1
+        return min(self.thread_number, nb_tasks)
+
+    @contextmanager
+    def reserve_threads(self, nb_threads: int) -> Iterator[int]:
+        """Context manager that reserves threads of the budget for a parallel call
+        during its execution. It waits until at least one thread of the budget is free
+        and grants at most the free ones, so that the concurrent calls never use more
+        than thread_number threads altogether.
+
+        Args:
+            -nb_threads: number of threads requested, e.g. returned by nb_threads
+
+        Returns:
+            -the number of threads granted to the call
+        """
+        with self._threads_condition:
+            while self._threads_in_use >= self.thread_number:
+                self._threads_condition.wait()
+            granted = max(1, min(nb_threads, self.thread_number - self._threads_in_use))
+            self._threads_in_use += granted
+        try:
+            yield granted
+        finally:
+            with self._threads_condition:
+                self._threads_in_use -= granted
+                self._threads_condition.notify_all()
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 import csv
-from typing import List
+from typing import List, Tuple
 
 from mnms.time import Time
 from mnms.log import create_logger
@@ -63,20 +63,25 @@ class TimeDependentSubject(ABC):
     """
         Represents time-dependent observations
     """
+    # NB: the subjects (users, vehicles) can be very numerous, they are slotted and
+    #     share the same empty tuple of observers until one is attached
+    __slots__ = ('_observers',)
 
     def __init__(self):
-        """Create an empty observer list"""
-        self._observers: List[TimeDependentObserver] = []
+        """Create an empty observer tuple"""
+        self._observers: Tuple[TimeDependentObserver, ...] = ()
 
     def attach(self, obs):
-        """If the observer is not in the list,
-        append it into the list"""
+        """If the observer is not in the tuple,
+        append it into the tuple"""
         if obs not in self._observers:
-            self._observers.append(obs)
+            self._observers = self._observers + (obs,)
 
     def detach(self, obs):
-        """Remove the observer from the observer list"""
-        self._observers.remove(obs)
+        """Remove the observer from the observer tuple"""
+        if obs not in self._observers:
+            raise ValueError(f'{obs} is not attached to {self}')
+        self._observers = tuple(o for o in self._observers if o is not obs)
 
     def notify(self, time: Time):
         """Alerts the observers"""
@@ -116,6 +121,41 @@ class CSVUserObserver(TimeDependentObserver):
         self._csvhandler.writerow(row)
 
 
+class CSVUserSummaryObserver(TimeDependentObserver):
+    def __init__(self, filename: str, prec:int=3):
+        """
+        Observer class to write one line per user when she arrives at destination,
+        the arrived users are then only kept in this file
+
+        Args:
+            filename: The name of the file
+            prec: The precision for floating point number
+        """
+        self._header = ["ID", "DEPARTURE", "ARRIVAL", "DISTANCE", "PATH", "SERVICES"]
+        self._filename = filename
+        self._file = open(self._filename, "w")
+        self._csvhandler = csv.writer(self._file, delimiter=';', quotechar='|')
+        self._csvhandler.writerow(self._header)
+        self._prec = prec
+        # Users are notified several times at arrival, only the first one is written
+        self._last_written_id = None
+
+    def finish(self):
+        self._file.close()
+
+    def update(self, subject: 'User', time: Time):
+        if subject.state.name != 'ARRIVED' or subject.id == self._last_written_id:
+            return
+        summary = subject.summary()
+        self._csvhandler.writerow([summary.id,
+                                   str(summary.departure_time),
+                                   str(summary.arrival_time),
+                                   f"{summary.distance:.{self._prec}f}",
+                                   ' '.join(summary.achieved_path),
+                                   ' '.join(summary.achieved_path_ms)])
+        self._last_written_id = summary.id
+
+
 class CSVVehicleObserver(TimeDependentObserver):
     def __init__(self, filename: str, prec:int=3):
         """
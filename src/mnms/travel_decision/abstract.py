@@ -1,12 +1,12 @@
 import sys
 from abc import ABC, abstractmethod
-from typing import List, Set, Dict, Callable
+from typing import List, Set, Dict, Callable, Optional
 from collections import defaultdict
 from enum import Enum
 import csv
-import multiprocessing
 import itertools
 import json
+import threading
 
 import numpy as np
 from numpy.linalg import norm as _norm
@@ -18,8 +18,10 @@ from mnms.log import create_logger
 from mnms.time import Time
 from mnms.tools.dict_tools import sum_dict
 from mnms.tools.exceptions import PathNotFound
+from mnms.tools.execution import ExecutionResources
 
-from hipop.shortest_path import parallel_k_shortest_path, parallel_k_intermodal_shortest_path, dijkstra, compute_path_length
+from hipop.graph import copy_graph
+from hipop.shortest_path import parallel_k_shortest_path, parallel_k_intermodal_shortest_path, dijkstra, parallel_dijkstra, compute_path_length
 
 log = create_logger(__name__)
 
@@ -42,7 +44,7 @@ class AbstractDecisionModel(ABC):
                  outfile: str = None,
                  verbose_file: bool = False,
                  cost: str = 'travel_time',
-                 thread_number: int = multiprocessing.cpu_count(),
+                 thread_number: Optional[int] = None,
                  mobility_services_graphs = None):
 
         """
@@ -76,7 +78,8 @@ class AbstractDecisionModel(ABC):
             -outfile: If specified the file in which chosen paths are written
             -verbose_file: If true write all the computed shortest path, not only the one that is selected
             -cost: The name of the cost to consider for the shortest path
-            -thread_number: The number of thread to user fot parallel shortest path computation
+            -thread_number: The maximal number of threads for parallel shortest path computation,
+                            the execution resources of the simulation apply if None
             -mobility_services_graphs: Dict gathering the graphs that determine how to update available
                                        mobility services following an event
         """
@@ -88,6 +91,7 @@ class AbstractDecisionModel(ABC):
         self._max_retry_to_find_k_paths = max_retry_to_find_k_paths
         self.personal_mob_service_park_radius = personal_mob_service_park_radius
         self._thread_number = thread_number
+        self._execution_resources: Optional[ExecutionResources] = None
         self.mobility_services_graphs = mobility_services_graphs
 
         self._mlgraph = mlgraph
@@ -99,6 +103,25 @@ class AbstractDecisionModel(ABC):
         self._waiting_cost_functions = {'travel_time': lambda wt: wt}
         self._additional_cost_functions = defaultdict(lambda: lambda p,u: 0)
 
+        # Nodes of the odlayer on which the coordinates origins and destinations
+        # of users are snapped, computed once per user
+        self._users_snapped_origins = dict()
+        self._users_snapped_destinations = dict()
+        self._snapping_odlayer_signature = None
+
+        # Incremental repair of the paths of users replanning after a match failure
+        # or an interruption, disabled by default (see enable_path_repair)
+        self._path_repair_tolerance = None
+        self._users_alternatives = dict()
+        self._users_alternatives_sweep_size = 1000
+        self.nb_repaired_replannings = 0
+        self.nb_replanning_searches = 0
+
+        # Paths of the next departures computed in a background thread while the
+        # simulation goes on (see prefetch_departures_paths)
+        self._prefetch = None
+        self.nb_prefetched_plannings = 0
+
         if outfile is None:
             self._write = False
             self._verbose_file = False
@@ -127,13 +150,63 @@ class AbstractDecisionModel(ABC):
             mobility_services_graphs[graphid] = new_graph
         self.mobility_services_graphs = mobility_services_graphs
 
+    @property
+    def execution_resources(self) -> ExecutionResources:
+        if self._execution_resources is None:
+            return ExecutionResources.default()
+        return self._execution_resources
+
+    def set_execution_resources(self, resources: ExecutionResources):
+        self._execution_resources = resources
+
+    def _nb_threads(self, nb_tasks: int) -> int:
+        """Method that returns the number of threads of a parallel shortest paths
+        computation.
+
+        Args:
+            -nb_tasks: number of shortest paths queries of the computation
+        """
+        nb_threads = self.execution_resources.nb_threads(nb_tasks)
+        if self._thread_number is not None:
+            nb_threads = min(nb_threads, self._thread_number)
+        return nb_threads
+
     def set_random_seed(self, seed):
         pass
 
+    def enable_path_repair(self, tolerance: float = 0.2):
+        """Method that enables the incremental repair of the paths of users who
+        replan after a match failure or an interruption. Instead of a new paths
+        discovery, such users reuse the alternatives computed during their last
+        discovery: the alternatives still usable with their available mobility services
+        are joined from their planning origin and their costs revalidated against
+        the current links costs. A new paths discovery is triggered only when no
+        alternative remains or when the remaining cost of one of them drifted
+        beyond the tolerance.
+
+        Args:
+            -tolerance: maximal relative drift of the remaining cost of an alternative
+                        since it was computed
+        """
+        self._path_repair_tolerance = tolerance
+
     @abstractmethod
     def path_choice(self, paths: List[Path]) -> Path:
         pass
 
+    def batch_path_choice(self, users_paths_lists: List[List[Path]]) -> List[Path]:
+        """Method that proceeds to the selection of the path for a batch of users.
+        By default, path_choice is called for each user, decision models can
+        override this method to proceed to a vectorized choice.
+
+        Args:
+            -users_paths_lists: list of the lists of paths each user considers
+
+        Returns:
+            -list of the path chosen by each user
+        """
+        return [self.path_choice(paths) for paths in users_paths_lists]
+
     @property
     def waiting_cost_functions(self):
         return self._waiting_cost_functions
@@ -180,6 +253,97 @@ class AbstractDecisionModel(ABC):
                 else:
                     users_events.append((u,e))
             self._users_for_planning.extend(users_events)
+            # Snap the coordinates origins and destinations of departing users at once
+            self.snap_users_origins_destinations([u for u,e in users_events if e == Event.DEPARTURE])
+
+    def snap_users_origins_destinations(self, users: List[User]):
+        """Method that snaps the coordinates origins and destinations of users on
+        the nearest nodes of the odlayer, all users are snapped with one query on the
+        odlayer KD-trees.
+
+        Args:
+            -users: list of users to snap
+        """
+        odlayer = self._mlgraph.odlayer
+        # Snapped nodes are outdated if the odlayer changed
+        signature = (id(odlayer), len(odlayer.origins), len(odlayer.destinations))
+        if signature != self._snapping_odlayer_signature:
+            self._users_snapped_origins = dict()
+            self._users_snapped_destinations = dict()
+            self._snapping_odlayer_signature = signature
+
+        users_to_snap_o = [u for u in users if isinstance(u.origin, np.ndarray) and u.id not in self._users_snapped_origins]
+        if users_to_snap_o:
+            snapped_origins = odlayer.get_nearest_origins([u.origin for u in users_to_snap_o])
+            self._users_snapped_origins.update(zip([u.id for u in users_to_snap_o], snapped_origins))
+
+        users_to_snap_d = [u for u in users if isinstance(u.destination, np.ndarray) and u.id not in self._users_snapped_destinations]
+        if users_to_snap_d:
+            snapped_destinations = odlayer.get_nearest_destinations([u.destination for u in users_to_snap_d])
+            self._users_snapped_destinations.update(zip([u.id for u in users_to_snap_d], snapped_destinations))
+
+    def get_user_origin_node(self, u: User) -> str:
+        """Method that returns the id of the node of the graph corresponding to
+        user's origin.
+
+        Args:
+            -u: user
+
+        Returns:
+            -origin node id
+        """
+        if not isinstance(u.origin, np.ndarray):
+            return u.origin
+        if u.id not in self._users_snapped_origins:
+            self.snap_users_origins_destinations([u])
+        return self._users_snapped_origins[u.id]
+
+    def get_user_planning_origin(self, u: User, gnodes) -> str:
+        """Method that returns the id of the node from which a user (re)plans
+        depending on her state.
+
+        Args:
+            -u: user
+            -gnodes: nodes of the mlgraph, passed for performances reason
+
+        Returns:
+            -planning origin node id
+        """
+        if u.state in [UserState.STOP, UserState.WAITING_ANSWER, UserState.WAITING_VEHICLE]:
+            if u.current_node is None:
+                # User has just departed from her origin, get the name of origin node
+                return self.get_user_origin_node(u)
+            # User (re)plan from current node
+            return u.current_node
+        elif u.state == UserState.INSIDE_VEHICLE:
+            # User (re)plan from next node
+            return u.current_link[1]
+        elif u.state == UserState.WALKING:
+            if u.current_link[1] in gnodes[u.current_link[0]].adj.keys():
+                # User (re)plan from next node if current transit link still exists
+                return u.current_link[1]
+            # User (re)plans from current node if current transit link does not exist
+            log.warning(f'User {u.id} was walking on link {u.current_link} when this link got deleted, '\
+                f'user will look for an alternative path from upstream node of this link...')
+            return u.current_node
+        log.error(f'In AbstractDecisionModel: {u.id} tries to replan while she is in {u.state} state.')
+        sys.exit(-1)
+
+    def get_user_destination_node(self, u: User) -> str:
+        """Method that returns the id of the node of the graph corresponding to
+        user's destination.
+
+        Args:
+            -u: user
+
+        Returns:
+            -destination node id
+        """
+        if not isinstance(u.destination, np.ndarray):
+            return u.destination
+        if u.id not in self._users_snapped_destinations:
+            self.snap_users_origins_destinations([u])
+        return self._users_snapped_destinations[u.id]
 
     def manage_forced_initial_path(self, user):
         """Method that build the forced initial path of a user.
@@ -187,13 +351,13 @@ class AbstractDecisionModel(ABC):
         Args:
             -user: the user who has a forced initial path
         """
-        if user.path.layers == []:
+        if not user.path.layers:
             user.path.construct_layers_from_links(self._mlgraph.graph.nodes)
-        if user.path.mobility_services == []:
+        if not user.path.mobility_services:
             if 'TRANSIT' not in user.forced_path_chosen_mobility_services.keys():
                 user.forced_path_chosen_mobility_services['TRANSIT'] = 'WALK'
             user.path.set_mobility_services([user.forced_path_chosen_mobility_services[l] for l,_ in user.path.layers])
-        log.info(f'User {user.id} do not plan at departure, use forced path {user.path}')
+        log.info('User %s do not plan at departure, use forced path %s', user.id, user.path)
 
     def review_availability_of_personal_mob_services(self, u: User, e: Event, gnodes):
         """Method that eventually remove the personal mobility services from user's available services and
@@ -205,9 +369,6 @@ class AbstractDecisionModel(ABC):
             -gnodes: list of mlgraph nodes, it is passed to the function for performances reason
         """
         personal_mob_services = set(self._mlgraph.get_all_mobility_services_of_type(PersonalMobilityService))
-        odlayer = self._mlgraph.odlayer
-        origins_id = list(odlayer.origins.keys())
-        origins_pos = np.array([position for position in odlayer.origins.values()])
 
         new_planning_origins = {}
 
@@ -223,7 +384,7 @@ class AbstractDecisionModel(ABC):
                         user_far_from_personal_veh = _norm(np.array(parking_pos) - np.array(planning_origin)) > self.personal_mob_service_park_radius
                     else:
                         # User has not used her personal vehicle yet, check user position compared to her origin
-                        parking_node = u.origin if isinstance(u.origin, str) else origins_id[np.argmin(_norm(origins_pos - u.origin, axis=1))]
+                        parking_node = self.get_user_origin_node(u)
                         origin_pos = u.origin if isinstance(u.origin, np.ndarray) else gnodes[u.origin].position
                         user_far_from_personal_veh = _norm(np.array(origin_pos) - np.array(planning_origin)) > self.personal_mob_service_park_radius
                     if user_far_from_personal_veh:
@@ -245,6 +406,26 @@ class AbstractDecisionModel(ABC):
         return new_planning_origins
 
 
+    def _set_departure_mobility_services(self, u: User, all_mob_services_ids):
+        """Method that initializes the list of available mobility services of a user
+        who plans her journey at departure.
+
+        Args:
+            -u: the user
+            -all_mob_services_ids: ids of all the mobility services of the mlgraph
+        """
+        if u.mobility_services_graph is None:
+            # Initialize available mobility services if needed
+            if u.available_mobility_services is None:
+                u.set_available_mobility_services(all_mob_services_ids.copy())
+        else:
+            u_graph = self.mobility_services_graphs[u.mobility_services_graph] #NB: no quality check here
+            try:
+                u.set_available_mobility_services(set(u_graph['None']['DEPARTURE']))
+            except:
+                log.warning(f'Cannot find transition None->DEPARTURE in {u.mobility_services_graph} mobility services events graph, all services available')
+                u.set_available_mobility_services(all_mob_services_ids)
+
     def _manage_users_after_event(self, users_paths, tcurrent):
         """Method that update the list of available mobility services of each user who
         require (re)planning.
@@ -268,13 +449,12 @@ class AbstractDecisionModel(ABC):
 
         ### Update the list of available_mobility_services for each user following the event
         for u,e in self._users_for_planning:
+            if e == Event.DEPARTURE:
+                self._set_departure_mobility_services(u, all_mob_services_ids)
+
             ## If no mobility services graph for this user, apply the default rules
-            if u.mobility_services_graph is None:
-                if e == Event.DEPARTURE:
-                    # Initialize available mobility services if needed
-                    if u.available_mobility_services is None:
-                        u.set_available_mobility_services(all_mob_services_ids.copy())
-                elif e == Event.MATCH_FAILURE:
+            elif u.mobility_services_graph is None:
+                if e == Event.MATCH_FAILURE:
                     # Find back the mob service for which there was a match failure
                     failed_mservice = u.get_failed_mobility_service()
                     # Remove this service from user's list of available mob services
@@ -288,13 +468,7 @@ class AbstractDecisionModel(ABC):
             else:
                 # Get the correct graph
                 u_graph = self.mobility_services_graphs[u.mobility_services_graph] #NB: no quality check here
-                if e == Event.DEPARTURE:
-                    try:
-                        u.set_available_mobility_services(set(u_graph['None']['DEPARTURE']))
-                    except:
-                        log.warning(f'Cannot find transition None->DEPARTURE in {u.mobility_services_graph} mobility services events graph, all services available')
-                        u.set_available_mobility_services(all_mob_services_ids)
-                elif e == Event.MATCH_FAILURE:
+                if e == Event.MATCH_FAILURE:
                     ams_str = ' '.join(sorted(list(u.available_mobility_services)))
                     # Find back the mob service for which there was a match failure
                     failed_mservice = u.get_failed_mobility_service()
@@ -329,80 +503,40 @@ class AbstractDecisionModel(ABC):
         ### Return the eventual planning origins to consider for available personal mobility services
         return personal_ms_planning_origins
 
-    def _process_shortest_path_inputs(self, subgraph_layers, k, personal_ms_planning_origins, intermodality=None, saved_paths=None):
-        """
-        Method that prepare the inputs for calling the parallel shortest paths computation.
+    def _users_shortest_path_combinations(self, subgraph_layers, personal_ms_planning_origins, intermodality=None):
+        """Generator of the shortest path queries of the users (re)planning, grouped
+        per user, in the order of the users.
 
         Args:
         - subgraph_layers: the layers accessible
-        - k: the number of different paths that should be computed per mobility services combination
         - personal_ms_planning_origins: dict with first level keys corresponding
                                         to users ids, second level keys corresponding to available personal
                                         mobility services names, values corresponding to planning origin to consider
                                         to be able to find a path with this personal mob service
         -intermodality: specifies the pair of layers groups between which intermodality is
-                        mandatory. If intermodality is not mandatory for this shortest path search,
-                        this arg is None.
-        -saved_paths: dict with the shortest paths already saved for each user
-
-        Returns:
-        - uids: list of users ids
-        - origins: list of origins from which shortest paths should be computed
-        - destinations: list of destinations to which shortest paths should be computed
-        - available_layers: list of layers on which to compute shortest paths
-        - chosen_mservices: list of dict with the mob service to take on each layer
-        - nb_paths: list of the number of different paths that should be computed per mobility services combination
+                        mandatory, None if intermodality is not mandatory
+
+        Yields:
+        - u: the user
+        - u_origin: the node from which the user (re)plans
+        - u_destination: the destination node of the user
+        - u_layers: the set of layers accessible to the user
+        - combinations: list of (chosen_mservices, ms_set, personal_origin) for each
+                        mobility services combination of the user, where chosen_mservices is the
+                        dict with the mob service to take on each layer, ms_set the frozenset of these
+                        mob services, and personal_origin the planning origin to consider to access
+                        a personal mob service of the combination (None if there is no such service)
         """
-        # Retrieve keys (id) and values (pos) of all origins and destinations of odlayer
-        odlayer = self._mlgraph.odlayer
-        origins_id = list(odlayer.origins.keys())
-        origins_pos = np.array([position for position in odlayer.origins.values()])
-        destinations_id = list(odlayer.destinations.keys())
-        destinations_pos = np.array([position for position in odlayer.destinations.values()])
-
-        # Init lists
-        uids = []
-        origins = []
-        destinations = []
-        available_layers = []
-        chosen_mservices = []
-        nb_paths = []
+        gnodes = self._mlgraph.graph.nodes
 
         # Loop on users requiring (re)planning
         for u,_ in self._users_for_planning:
 
             ## Get origin of the (re)planning depending on users' state
-            if u.state in [UserState.STOP, UserState.WAITING_ANSWER, UserState.WAITING_VEHICLE]:
-                if u.current_node is None:
-                    # User has just departed from her origin, get the name of origin node
-                    if isinstance(u.origin, np.ndarray):
-                        u_origin = origins_id[np.argmin(_norm(origins_pos - u.origin, axis=1))]
-                    else:
-                        u_origin = u.origin
-                else:
-                    # User (re)plan from current node
-                    u_origin = u.current_node
-            elif u.state == UserState.INSIDE_VEHICLE:
-                # User (re)plan from next node
-                u_origin = u.current_link[1]
-            elif u.state == UserState.WALKING:
-                if u.current_link[1] in self._mlgraph.graph.nodes[u.current_link[0]].adj.keys():
-                    # User (re)plan from next node if current transit link still exists
-                    u_origin = u.current_link[1]
-                else:
-                    # User (re)plans from current node if current transit link does not exist
-                    u_origin = u.current_node
-                    log.warning(f'User {u.id} was walking on link {u.current_link} when this link got deleted, '\
-                        f'user will look for an alternative path from upstream node of this link...')
-            else:
-                log.error(f'In AbstractDecisionModel: {u.id} tries to replan while she is in {u.state} state.')
-                sys.exit(-1)
+            u_origin = self.get_user_planning_origin(u, gnodes)
 
             ## Get destination
-            if isinstance(u.destination, np.ndarray):
-                u_destination = destinations_id[np.argmin(_norm(destinations_pos - u.destination, axis=1))]
-            else:
-                u_destination = u.destination
+            u_destination = self.get_user_destination_node(u)
 
             ## Get available layers depending on available mob services
             assert u.available_mobility_services is not None, f'User {u.id} should have a list as available_mobility_services attribute'
@@ -425,60 +559,117 @@ class AbstractDecisionModel(ABC):
             ams_per_alayers = []
             for u_l in u_layers_objs_list:
                 ams_per_alayers.append([ms for ms in u.available_mobility_services if ms in u_l.mobility_services])
-            all_ams_combinations = list(itertools.product(*ams_per_alayers))
 
             ## Add TRANSIT layer accessible in any case
             u_layers.add('TRANSIT')
 
-            ## For each mob services combination, compute k shortest paths
-            #log.info(f'User {u.id} will compute {len(all_ams_combinations)}x{k} shortest paths')
-            for ams_combination in all_ams_combinations:
-                ams_combination_set = set(ams_combination)
-                ams_combination_set.add('WALK')
-                # Check if user has already found the proper nb of paths for this mob services combination
-                if saved_paths is not None:
-                    if u.id in saved_paths.keys():
-                        u_saved_paths = saved_paths[u.id]['paths']
-                        if intermodality is None:
-                            u_saved_paths_of_this_ms_combination = [set(sp.mobility_services).issubset(ams_combination_set) for sp in u_saved_paths]
-                        else:
-                            u_saved_paths_of_this_ms_combination_cond1 = [set(sp.mobility_services).issubset(ams_combination_set) for sp in u_saved_paths]
-                            u_saved_paths_of_this_ms_combination_cond2 = [True if (set([l for l,_ in sp.layers]) & intermodality[0]) and \
-                                (set([l for l,_ in sp.layers]) & intermodality[1]) else False for sp in u_saved_paths]
-                            #log.info(f'User {u.id} , intermodality={intermodality}, u_saved_paths={u_saved_paths}')
-                            u_saved_paths_of_this_ms_combination = [c1 and c2 for c1,c2 in zip(u_saved_paths_of_this_ms_combination_cond1,u_saved_paths_of_this_ms_combination_cond2)]
-                        nb_saved_paths_of_this_ms_combination = sum(u_saved_paths_of_this_ms_combination)
-                        #if nb_saved_paths_of_this_ms_combination > 0 and nb_saved_paths_of_this_ms_combination < k:
-                        #    log.info(f'User {u.id} already found some paths for modes combination {ams_combination} but not enough ({nb_saved_paths_of_this_ms_combination}/{k})')
-                        if nb_saved_paths_of_this_ms_combination == k:
-                            #log.info(f'User {u.id} already found the proper nb of paths for modes combination {ams_combination}')
-                            continue
-                        # NB: even if we have found some paths for this mode combination, we still look for k cause we may find the same as the one already saved...
-                        # TODO: how to improve this?
-
+            combinations = []
+            for ams_combination in itertools.product(*ams_per_alayers):
+                ms_set = frozenset(ams_combination).union(('WALK',))
                 # Check if a specific planning origin should be used for this mobility services
                 # combination to be able to use a personal mobility service
+                personal_origin = None
                 if u.id in personal_ms_planning_origins.keys():
                     available_personal_mss = set(personal_ms_planning_origins[u.id].keys())
-                    intersection = ams_combination_set.intersection(available_personal_mss)
+                    intersection = ms_set.intersection(available_personal_mss)
                     # Launch a warning if intersection has more than one item
                     if len(intersection) > 1 and len(set([personal_ms_planning_origins[u.id][elem] for elem in intersection])) > 1:
                         log.warning(f'User {u.id} have several personal mob services available with different planning origins,'\
                             f' check what to do, for now we take the first arbitrarily ! (user intersection = {intersection})')
                     if len(intersection) >= 1:
-                        u_origin = personal_ms_planning_origins[u.id][list(intersection)[0]]
-                        log.info(f'User {u.id} consider planning origin {u_origin} to be able to access personal mob service {list(intersection)[0]}')
+                        personal_origin = personal_ms_planning_origins[u.id][list(intersection)[0]]
+                        log.info('User %s consider planning origin %s to be able to access personal mob service %s', u.id, personal_origin, list(intersection)[0])
+                u_chosen_mservices = dict(zip(u_layers_list, ams_combination))
+                # Add WALK fake mob service on TRANSIT layer
+                u_chosen_mservices['TRANSIT'] = 'WALK'
+                combinations.append((u_chosen_mservices, ms_set, personal_origin))
+
+            yield u, u_origin, u_destination, u_layers, combinations
+
+    @staticmethod
+    def _saved_paths_sets(paths):
+        """Method that returns the frozensets of mobility services and of layers of
+        saved paths, used to check which mobility services combinations they cover.
+
+        Args:
+        - paths: the saved paths
+
+        Returns:
+        - list of (mobility services frozenset, layers frozenset) per path
+        """
+        return [(frozenset(p.mobility_services), frozenset([l for l,_ in p.layers])) for p in paths]
+
+    @staticmethod
+    def _nb_saved_paths_of_combination(saved_paths_sets, ms_set, intermodality=None):
+        """Method that counts the saved paths that belong to a mobility services combination.
+
+        Args:
+        - saved_paths_sets: the frozensets of the saved paths, see _saved_paths_sets
+        - ms_set: the set of mob services of the combination, WALK included
+        - intermodality: the pair of layers groups between which intermodality is
+                         mandatory, None if it is not
+        """
+        if intermodality is None:
+            return sum(1 for sp_ms, _ in saved_paths_sets if sp_ms <= ms_set)
+        return sum(1 for sp_ms, sp_layers in saved_paths_sets if sp_ms <= ms_set
+                   and not sp_layers.isdisjoint(intermodality[0]) and not sp_layers.isdisjoint(intermodality[1]))
+
+    def _process_shortest_path_inputs(self, subgraph_layers, k, personal_ms_planning_origins, intermodality=None, saved_paths=None):
+        """
+        Method that prepare the inputs for calling the parallel shortest paths computation.
+
+        Args:
+        - subgraph_layers: the layers accessible
+        - k: the number of different paths that should be computed per mobility services combination
+        - personal_ms_planning_origins: dict with first level keys corresponding
+                                        to users ids, second level keys corresponding to available personal
+                                        mobility services names, values corresponding to planning origin to consider
+                                        to be able to find a path with this personal mob service
+        -intermodality: specifies the pair of layers groups between which intermodality is
+                        mandatory. If intermodality is not mandatory for this shortest path search,
+                        this arg is None.
+        -saved_paths: dict with the shortest paths already saved for each user
+
+        Returns:
+        - uids: list of users ids
+        - origins: list of origins from which shortest paths should be computed
+        - destinations: list of destinations to which shortest paths should be computed
+        - available_layers: list of layers on which to compute shortest paths
+        - chosen_mservices: list of dict with the mob service to take on each layer
+        - nb_paths: list of the number of different paths that should be computed per mobility services combination
+        """
+        # Snap all coordinates origins and destinations not snapped yet at once
+        self.snap_users_origins_destinations([u for u,_ in self._users_for_planning])
+
+        # Init lists
+        uids = []
+        origins = []
+        destinations = []
+        available_layers = []
+        chosen_mservices = []
+        nb_paths = []
+
+        for u, u_origin, u_destination, u_layers, combinations in \
+            self._users_shortest_path_combinations(subgraph_layers, personal_ms_planning_origins, intermodality):
+            u_saved_paths_sets = None
+            if saved_paths is not None and u.id in saved_paths.keys():
+                u_saved_paths_sets = self._saved_paths_sets(saved_paths[u.id]['paths'])
+
+            ## For each mob services combination, compute k shortest paths
+            for u_chosen_mservices, ms_set, personal_origin in combinations:
+                # Check if user has already found the proper nb of paths for this mob services combination
+                # NB: even if we have found some paths for this mode combination, we still look for k cause we may find the same as the one already saved...
+                if u_saved_paths_sets is not None and \
+                    self._nb_saved_paths_of_combination(u_saved_paths_sets, ms_set, intermodality) == k:
+                    continue
+                if personal_origin is not None:
+                    u_origin = personal_origin
 
                 # Append all info to the proper lists
                 uids.append(u.id)
                 origins.append(u_origin)
                 destinations.append(u_destination)
                 available_layers.append(u_layers)
-                u_chosen_mservices = {}
-                for alayer, ams in zip(u_layers_list, ams_combination):
-                    u_chosen_mservices[alayer] = ams
-                # Add WALK fake mob service on TRANSIT layer
-                u_chosen_mservices['TRANSIT'] = 'WALK'
                 chosen_mservices.append(u_chosen_mservices)
                 nb_paths.append(k)
 
@@ -494,14 +685,19 @@ class AbstractDecisionModel(ABC):
         """
         gnodes = self._mlgraph.graph.nodes
 
+        ### Choose the path of all users who found some paths at once
+        uids_with_paths = [uid for uid, d in users_paths.items() if d['paths']]
+        chosen_paths = self.batch_path_choice([users_paths[uid]['paths'] for uid in uids_with_paths])
+        chosen_paths = dict(zip(uids_with_paths, chosen_paths))
+
         for uid, d in users_paths.items():
             user = d['user']
             user_paths = d['paths']
             event = d['event']
             if user_paths:
                 ## Some paths have been found
-                chosen_path = self.path_choice(user_paths)
-                log.info(f"User {user.id} chose path {chosen_path} after {event} among {len(user_paths)} shortest paths for this round of (re)planning (state={user.state}).")
+                chosen_path = chosen_paths[uid]
+                log.info("User %s chose path %s after %s among %s shortest paths for this round of (re)planning (state=%s).", user.id, chosen_path, event, len(user_paths), user.state)
 
                 if self._write:
                     # Write down the chosen path only
@@ -641,6 +837,34 @@ class AbstractDecisionModel(ABC):
             log.error(f'Case not yet developped')
             sys.exit(-1)
 
+    def build_path(self, nodes, cost, chosen_mservices, user, gnodes) -> Path:
+        """Method that builds a path from its nodes and its first stage cost, i.e.
+        the sum of its links costs, and completes its cost with the waiting and the
+        additional costs.
+
+        Args:
+            -nodes: the nodes of the path
+            -cost: the first stage cost of the path
+            -chosen_mservices: map between the layers of the path and the mob service taken on it
+            -user: the user considering this path
+            -gnodes: nodes of the mlgraph, passed for performances reason
+
+        Return:
+            -the path
+        """
+        p = Path(cost, nodes) # at this stage, p.path_cost contains the first stage cost
+        p.construct_layers_from_links(gnodes)
+        path_mobservices = [chosen_mservices[layer_id] for layer_id,_ in p.layers]
+        p.set_mobility_services(path_mobservices)
+        # Second stage path cost computation = take into account waiting time
+        estim_waiting_time = sum([self._mlgraph.layers[layer].mobility_services[service].estimate_pickup_time_for_planning(p.nodes[node_inds][0]) for (layer, node_inds), service in zip(p.layers, p.mobility_services) if service != 'WALK'])
+        p.increment_path_cost(self.waiting_cost_functions[self._cost](estim_waiting_time))
+        # Third stage path cost computation = eventually add additional cost
+        p.increment_path_cost(self.additional_cost_functions[self._cost](p, user))
+        service_costs = sum_dict(*(self._mlgraph.layers[layer].mobility_services[service].service_level_costs(p.nodes[node_inds]) for (layer, node_inds), service in zip(p.layers, p.mobility_services) if service != 'WALK'))
+        p.service_costs = service_costs
+        return p
+
     def parse_paths(self, paths, uids, chosen_mservices, nb_paths, users_paths):
         """Method that parsed HiPOP outputs.
 
@@ -670,17 +894,7 @@ class AbstractDecisionModel(ABC):
                 if len(p[0]) >= 2:
                     # Path can be valid only if it does not pass several times per the same nodes
                     if (len(p[0]) == len(set(p[0]))):
-                        p = Path(p[1], p[0]) # at this stage, p.path_cost contains the first stage cost
-                        p.construct_layers_from_links(gnodes)
-                        path_mobservices = [chosen_mservices[i][layer_id] for layer_id,_ in p.layers]
-                        p.set_mobility_services(path_mobservices)
-                        # Second stage path cost computation = take into account waiting time
-                        estim_waiting_time = sum([self._mlgraph.layers[layer].mobility_services[service].estimate_pickup_time_for_planning(p.nodes[node_inds][0]) for (layer, node_inds), service in zip(p.layers, p.mobility_services) if service != 'WALK'])
-                        p.increment_path_cost(self.waiting_cost_functions[self._cost](estim_waiting_time))
-                        # Third stage path cost computation = eventually add additional cost
-                        p.increment_path_cost(self.additional_cost_functions[self._cost](p, user))
-                        service_costs = sum_dict(*(self._mlgraph.layers[layer].mobility_services[service].service_level_costs(p.nodes[node_inds]) for (layer, node_inds), service in zip(p.layers, p.mobility_services) if service != 'WALK'))
-                        p.service_costs = service_costs
+                        p = self.build_path(p[0], p[1], chosen_mservices[i], user, gnodes)
                         # NB: we save this path even if equal to an already saved path, it is useful for testing purposes
                         user_paths.append(p)
                     else:
@@ -692,9 +906,455 @@ class AbstractDecisionModel(ABC):
                 log.warning(f'Zero path computed for user {user_id} for mode combination {chosen_mservices[i]}, {kpath}')
         return users_paths
 
+    def _cumulated_costs(self, nodes, chosen_mservices, gnodes):
+        """Method that sums the current costs of the links of a path.
+
+        Args:
+            -nodes: the nodes of the path
+            -chosen_mservices: map between the layers of the path and the mob service taken on it
+            -gnodes: nodes of the mlgraph, passed for performances reason
+
+        Return:
+            -array of the cumulated cost from the first node to each node of the path,
+             None if a link of the path does not exist anymore or has no cost for
+             the chosen mob service
+        """
+        cumulated_costs = np.zeros(len(nodes))
+        total = 0.
+        try:
+            for i in range(len(nodes) - 1):
+                link = gnodes[nodes[i]].adj.get(nodes[i + 1])
+                if link is None:
+                    return None
+                total += link.costs[chosen_mservices[link.label]][self._cost]
+                cumulated_costs[i + 1] = total
+        except KeyError:
+            return None
+        return cumulated_costs
+
+    def _store_alternatives(self, user, paths, gnodes):
+        """Method that saves the paths a user considered during a paths discovery
+        with their current links costs, to repair her path at her next replanning.
+
+        Args:
+            -user: the user
+            -paths: the paths the user considered
+            -gnodes: nodes of the mlgraph, passed for performances reason
+        """
+        alternatives = []
+        known = set()
+        for p in paths:
+            key = (tuple(p.nodes), tuple(p.mobility_services))
+            if key in known:
+                continue
+            known.add(key)
+            chosen_mservices = {layer_id: service for (layer_id, _), service in zip(p.layers, p.mobility_services)}
+            cumulated_costs = self._cumulated_costs(p.nodes, chosen_mservices, gnodes)
+            if cumulated_costs is not None:
+                alternatives.append((list(p.nodes), chosen_mservices, cumulated_costs))
+        self._users_alternatives[user.id] = (user, alternatives)
+
+        # Forget the alternatives of the users who finished their trip from time to time
+        if len(self._users_alternatives) > self._users_alternatives_sweep_size:
+            self._users_alternatives = {uid: v for uid, v in self._users_alternatives.items()
+                                        if v[0].state not in [UserState.ARRIVED, UserState.DEADEND]}
+            self._users_alternatives_sweep_size = max(1000, 2 * len(self._users_alternatives))
+
+    def _repair_user_paths(self, user, alternatives, personal_mservices, gnodes):
+        """Method that rebuilds the paths of a replanning user from the alternatives
+        saved at her last paths discovery.
+
+        Args:
+            -user: the user
+            -alternatives: the alternatives saved by _store_alternatives
+            -personal_mservices: the ids of the personal mob services, the alternatives
+                                 using them are not reused since user may have left her vehicle
+            -gnodes: nodes of the mlgraph, passed for performances reason
+
+        Return:
+            -the list of repaired paths, None if a new paths discovery is required
+        """
+        origin = self.get_user_planning_origin(user, gnodes)
+        destination = self.get_user_destination_node(user)
+        available_mservices = set(user.available_mobility_services)
+        available_mservices.add('WALK')
+        origin_adj = gnodes[origin].adj
+
+        paths = []
+        for nodes, chosen_mservices, baseline_costs in alternatives:
+            mservices = set(chosen_mservices.values())
+            if nodes[-1] != destination or not mservices.issubset(available_mservices) \
+                or not mservices.isdisjoint(personal_mservices):
+                continue
+            current_costs = self._cumulated_costs(nodes, chosen_mservices, gnodes)
+            if current_costs is None:
+                continue
+
+            # Join the alternative from the planning origin at the node minimizing the remaining cost
+            join_ind = None
+            if origin in nodes:
+                join_ind = nodes.index(origin)
+                join_cost = 0.
+            else:
+                best_cost = float('inf')
+                for j, node in enumerate(nodes):
+                    link = origin_adj.get(node)
+                    if link is None or link.label not in chosen_mservices:
+                        continue
+                    link_cost = link.costs.get(chosen_mservices[link.label], {}).get(self._cost)
+                    if link_cost is not None and link_cost - current_costs[j] < best_cost:
+                        join_ind, join_cost, best_cost = j, link_cost, link_cost - current_costs[j]
+            if join_ind is None:
+                continue
+
+            # Revalidate the remaining cost of the alternative
+            remaining_cost = current_costs[-1] - current_costs[join_ind]
+            baseline_remaining_cost = baseline_costs[-1] - baseline_costs[join_ind]
+            if abs(remaining_cost - baseline_remaining_cost) > self._path_repair_tolerance * baseline_remaining_cost:
+                log.info('User %s alternative path costs drifted from %s to %s, proceed to a new paths discovery',
+                         user.id, baseline_remaining_cost, remaining_cost)
+                return None
+
+            path_nodes = nodes[join_ind:] if origin == nodes[join_ind] else [origin] + nodes[join_ind:]
+            if len(path_nodes) < 2:
+                continue
+            paths.append(self.build_path(path_nodes, join_cost + remaining_cost, chosen_mservices, user, gnodes))
+
+        return paths if paths else None
+
+    def _repair_paths(self, users_paths):
+        """Method that repairs the paths of the users who replan after a match
+        failure or an interruption, when path repair is enabled.
+
+        Args:
+            -users_paths: dict with user id as key, and a dict as values
+             {'user': user object, 'paths': list of paths the user considers}
+
+        Return:
+            -set of the ids of the users whose paths have been repaired, they do not
+             need a new paths discovery
+        """
+        repaired = set()
+        if self._path_repair_tolerance is None:
+            return repaired
+        gnodes = None
+        personal_mservices = None
+        for u,e in self._users_for_planning:
+            if e not in [Event.MATCH_FAILURE, Event.INTERRUPTION]:
+                continue
+            paths = None
+            if u.id in self._users_alternatives:
+                if gnodes is None:
+                    gnodes = self._mlgraph.graph.nodes
+                    personal_mservices = set(self._mlgraph.get_all_mobility_services_of_type(PersonalMobilityService))
+                paths = self._repair_user_paths(u, self._users_alternatives[u.id][1], personal_mservices, gnodes)
+            if paths:
+                users_paths[u.id]['paths'].extend(paths)
+                repaired.add(u.id)
+                self.nb_repaired_replannings += 1
+            else:
+                self.nb_replanning_searches += 1
+        if repaired:
+            log.info('%s users repaired their path without a new paths discovery (%s in total, %s searches)',
+                     len(repaired), self.nb_repaired_replannings, self.nb_replanning_searches)
+        return repaired
+
+    def _compute_k_shortest_paths(self, origins, destinations, available_layers, chosen_mservices, nb_paths, intermodality=None, graph=None):
+        """Method that computes the k shortest paths of a batch of queries with one
+        call to HiPOP.
+
+        Args:
+            -origins: list of origins from which shortest paths should be computed
+            -destinations: list of destinations to which shortest paths should be computed
+            -available_layers: list of layers on which to compute shortest paths
+            -chosen_mservices: list of dict with the mob service to take on each layer
+            -nb_paths: list of the number of different paths to compute per query
+            -intermodality: the pair of layers groups between which intermodality is
+                            mandatory for all the queries, None if it is not
+            -graph: the graph on which the paths are computed, the graph of the mlgraph if None
+
+        Returns:
+            -HiPOP outputs, list of k shortest paths per query
+        """
+        if len(origins) == 0:
+            return []
+        if graph is None:
+            graph = self._mlgraph.graph
+        with self.execution_resources.reserve_threads(self._nb_threads(len(origins))) as nb_threads:
+            if intermodality is None:
+                return parallel_k_shortest_path(graph,
+                                                origins,
+                                                destinations,
+                                                self._cost,
+                                                chosen_mservices,
+                                                available_layers,
+                                                self._max_diff_cost,
+                                                self._max_dist_in_common,
+                                                self._cost_multiplier_to_find_k_paths,
+                                                self._max_retry_to_find_k_paths,
+                                                nb_paths,
+                                                nb_threads)
+            return parallel_k_intermodal_shortest_path(graph,
+                                                       origins,
+                                                       destinations,
+                                                       chosen_mservices,
+                                                       self._cost,
+                                                       nb_threads,
+                                                       intermodality,
+                                                       self._max_diff_cost,
+                                                       self._max_dist_in_common,
+                                                       self._cost_multiplier_to_find_k_paths,
+                                                       self._max_retry_to_find_k_paths,
+                                                       nb_paths,
+                                                       available_layers)
+
+    def _guided_paths_queries(self, personal_ms_planning_origins):
+        """Method that gathers the shortest paths queries of the guided paths discovery
+        following the considered modes, see _guided_paths_discovery.
+
+        Args:
+            -personal_ms_planning_origins: the eventual planning origins to consider for
+                                           available personal mobility services
+
+        Return:
+            -batches: list of the batches of queries, each one is computed with one
+                      call to _compute_k_shortest_paths
+            -parse: function called with the HiPOP outputs of the batches and the dict of
+                    saved shortest paths, that discards the skipped combinations, parses the
+                    paths and returns the updated dict
+        """
+        # Snap all coordinates origins and destinations not snapped yet at once
+        self.snap_users_origins_destinations([u for u,_ in self._users_for_planning])
+
+        ### Gather the queries of all modes, assuming no combination is skipped
+        modes_queries = []
+        batches = defaultdict(lambda: ([], [], [], [], []))
+        batches_intermodality = {}
+        for considered_mode in self._considered_modes:
+            subgraph_layers = [l for l in self._mlgraph.layers.values() if l._id in considered_mode[0]]
+            k = considered_mode[2]
+            intermodality = considered_mode[1]
+            batch_key = None if intermodality is None else (frozenset(intermodality[0]), frozenset(intermodality[1]))
+            batches_intermodality[batch_key] = intermodality
+            batch_origins, batch_destinations, batch_layers, batch_mservices, batch_nb_paths = batches[batch_key]
+            queries = []
+            for u, u_origin, u_destination, u_layers, combinations in \
+                self._users_shortest_path_combinations(subgraph_layers, personal_ms_planning_origins, intermodality):
+                origin = u_origin
+                for u_chosen_mservices, ms_set, personal_origin in combinations:
+                    if personal_origin is not None:
+                        origin = personal_origin
+                    queries.append((u.id, u_origin, ms_set, personal_origin, origin, len(batch_origins)))
+                    batch_origins.append(origin)
+                    batch_destinations.append(u_destination)
+                    batch_layers.append(u_layers)
+                    batch_mservices.append(u_chosen_mservices)
+                    batch_nb_paths.append(k)
+            modes_queries.append(queries)
+
+        batch_keys = list(batches.keys())
+
+        def parse(outputs, users_paths):
+            batches_paths = dict(zip(batch_keys, outputs))
+            ### Replay the modes in order to discard the combinations already found
+            for considered_mode, queries in zip(self._considered_modes, modes_queries):
+                log.info('Path discovery for mode %s', considered_mode)
+                k = considered_mode[2]
+                intermodality = considered_mode[1]
+                batch_key = None if intermodality is None else (frozenset(intermodality[0]), frozenset(intermodality[1]))
+                _, batch_destinations, batch_layers, batch_mservices, _ = batches[batch_key]
+                batch_paths = batches_paths[batch_key]
+
+                # The saved paths only change once all the paths of a mode are parsed
+                saved_paths_sets = {}
+                uids, chosen_mservices, nb_paths, paths = [], [], [], []
+                recomputed = []
+                previous_uid = None
+                for uid, u_origin, ms_set, personal_origin, speculative_origin, ind in queries:
+                    if uid != previous_uid:
+                        origin = u_origin
+                        previous_uid = uid
+                    if uid not in saved_paths_sets:
+                        saved_paths_sets[uid] = self._saved_paths_sets(users_paths[uid]['paths'])
+                    if self._nb_saved_paths_of_combination(saved_paths_sets[uid], ms_set, intermodality) == k:
+                        continue
+                    if personal_origin is not None:
+                        origin = personal_origin
+                    if origin != speculative_origin:
+                        # The planning origin came from a personal mob service of a skipped combination
+                        recomputed.append((len(paths), origin, ind))
+                    uids.append(uid)
+                    chosen_mservices.append(batch_mservices[ind])
+                    nb_paths.append(k)
+                    paths.append(batch_paths[ind])
+
+                if recomputed:
+                    recomputed_paths = self._compute_k_shortest_paths([origin for _, origin, _ in recomputed],
+                                                                      [batch_destinations[ind] for _, _, ind in recomputed],
+                                                                      [batch_layers[ind] for _, _, ind in recomputed],
+                                                                      [batch_mservices[ind] for _, _, ind in recomputed],
+                                                                      [k] * len(recomputed),
+                                                                      intermodality)
+                    for (i, _, _), kpath in zip(recomputed, recomputed_paths):
+                        paths[i] = kpath
+
+                ## Parse the outputs of HiPOP
+                users_paths = self.parse_paths(paths, uids, chosen_mservices, nb_paths, users_paths)
+
+            return users_paths
+
+        return [(*batches[batch_key], batches_intermodality[batch_key]) for batch_key in batch_keys], parse
+
+    def _guided_paths_discovery(self, personal_ms_planning_origins, users_paths):
+        """Method that proceeds to the guided paths discovery following the considered
+        modes.
+
+        The modes are considered in order: a user skips a mob services combination of
+        a mode when she has already found the k paths of this combination with the
+        previous modes. Instead of one HiPOP call per mode, the queries of all modes are
+        computed at once, in one call for the modes without mandatory intermodality and
+        in one call per pair of intermodality layers groups. The skipped combinations
+        are then discarded mode by mode, so that the paths found are the same as with
+        one call per mode.
+
+        Args:
+            -personal_ms_planning_origins: the eventual planning origins to consider for
+                                           available personal mobility services
+            -users_paths: dict of saved shortest paths for users who are (re)planning
+
+        Return:
+            -users_paths: updated dict of saved shortest paths
+        """
+        batches, parse = self._guided_paths_queries(personal_ms_planning_origins)
+        return parse([self._compute_k_shortest_paths(*batch) for batch in batches], users_paths)
+
+    def _paths_discovery_queries(self, personal_ms_planning_origins):
+        """Method that gathers the shortest paths queries of the users who (re)plan,
+        following the default or the guided paths discovery.
+
+        Args:
+            -personal_ms_planning_origins: the eventual planning origins to consider for
+                                           available personal mobility services
+
+        Return:
+            -batches: list of the batches of queries, see _guided_paths_queries
+            -parse: function that parses the HiPOP outputs of the batches
+        """
+        ### If self._considered_modes is defined, proceed to the guided paths discovery
+        if self._considered_modes is not None:
+            return self._guided_paths_queries(personal_ms_planning_origins)
+
+        ### Otherwise proceed to the default paths discovery
+        subgraph_layers = list(self._mlgraph.layers.values())
+        k = self._n_shortest_path
+        uids, origins, destinations, available_layers, chosen_mservices, nb_paths = \
+            self._process_shortest_path_inputs(subgraph_layers, k, personal_ms_planning_origins)
+
+        def parse(outputs, users_paths):
+            return self.parse_paths(outputs[0], uids, chosen_mservices, nb_paths, users_paths)
+
+        return [(origins, destinations, available_layers, chosen_mservices, nb_paths, None)], parse
+
+    def prefetch_departures_paths(self, users: List[User]):
+        """Method that launches the paths discovery of users who will plan their journey
+        at departure in a background thread, so that it overlaps with the simulation
+        steps preceding their planning. The paths are computed on a snapshot of the
+        graph taken now, they are parsed (with up to date waiting and additional costs)
+        when the users plan, see _join_prefetched_paths.
+
+        Args:
+            -users: the users who will plan at departure, without forced initial path
+        """
+        self.discard_prefetched_paths()
+
+        all_mob_services_ids = [ms.id for ms in set(self._mlgraph.get_all_mobility_services())]
+        users_events = []
+        for u in users:
+            self._set_departure_mobility_services(u, all_mob_services_ids)
+            # Users without available mobility service go deadend when they plan
+            if len(u.available_mobility_services) > 0:
+                users_events.append((u, Event.DEPARTURE))
+        if not users_events:
+            return
+
+        users_for_planning = self._users_for_planning
+        self._users_for_planning = users_events
+        try:
+            batches, parse = self._paths_discovery_queries({})
+        finally:
+            self._users_for_planning = users_for_planning
+
+        graph = copy_graph(self._mlgraph.graph)
+        outputs = [None] * len(batches)
+        errors = []
+
+        def compute():
+            try:
+                for i, batch in enumerate(batches):
+                    outputs[i] = self._compute_k_shortest_paths(*batch, graph=graph)
+            except Exception as exc:
+                errors.append(exc)
+
+        thread = threading.Thread(target=compute, daemon=True)
+        thread.start()
+        users_paths = {u.id: {'user': u, 'event': e, 'paths': []} for u,e in users_events}
+        self._prefetch = (users_paths, parse, thread, outputs, errors, self._mlgraph.topology_version)
+        log.info('Prefetch the paths of %s departing users', len(users_events))
+
+    def _join_prefetched_paths(self, users_paths):
+        """Method that gets back the prefetched paths of the users who plan at departure.
+
+        Args:
+            -users_paths: dict with user id as key, and a dict as values
+             {'user': user object, 'paths': list of paths the user considers}
+
+        Return:
+            -set of the ids of the users whose paths have been prefetched, they do not
+             need a new paths discovery
+        """
+        if self._prefetch is None:
+            return set()
+        prefetched_paths, parse, thread, outputs, errors, topology_version = self._prefetch
+        prefetched = {u.id for u,e in self._users_for_planning
+                      if e == Event.DEPARTURE and u.id in prefetched_paths and u.id in users_paths}
+        if not prefetched:
+            return prefetched
+        self._prefetch = None
+        thread.join()
+        if errors:
+            raise errors[0]
+        if topology_version != self._mlgraph.topology_version:
+            # Links have been added or deleted since the snapshot, the paths may not exist anymore
+            log.info('Graph changed since the prefetch, discard the prefetched paths')
+            return set()
+
+        prefetched_paths = parse(outputs, prefetched_paths)
+        for uid in prefetched:
+            users_paths[uid]['paths'].extend(prefetched_paths[uid]['paths'])
+        self.nb_prefetched_plannings += len(prefetched)
+        return prefetched
+
+    def discard_prefetched_paths(self):
+        """Method that waits for the eventual prefetch in progress and discards it.
+        """
+        if self._prefetch is not None:
+            self._prefetch[2].join()
+            self._prefetch = None
+
+    def clear_users_state(self):
+        """Method that forgets the users of the previous run (users waiting for a planning,
+        refused users and saved alternatives) so that the decision model can be reused
+        for a new run of the same demand. The snapping caches of the users origins and
+        destinations are kept.
+        """
+        self.discard_prefetched_paths()
+        self._users_for_planning = list()
+        self._refused_user = list()
+        self._users_alternatives = dict()
+
     def __call__(self, tcurrent: Time):
         ### If no user require a (re)planning, do nothing
-        log.info(f'There are {len(self._users_for_planning)} users that are going to (re)plan their journey')
+        log.info('There are %s users that are going to (re)plan their journey', len(self._users_for_planning))
         if len(self._users_for_planning) == 0:
             return
 
@@ -704,74 +1364,27 @@ class AbstractDecisionModel(ABC):
         ### Manage users after event
         personal_ms_planning_origins = self._manage_users_after_event(users_paths, tcurrent)
 
-        ### If self.considered_modes is not defined, proceed to the default paths discovery
-        if self._considered_modes is None:
-            ## Gather inputs for the HiPOP call
-            subgraph_layers = list(self._mlgraph.layers.values())
-            k = self._n_shortest_path
-            uids, origins, destinations, available_layers, chosen_mservices, nb_paths = \
-                self._process_shortest_path_inputs(subgraph_layers, k, personal_ms_planning_origins)
-
-            ## Compute the shorest paths in parallel
-            paths = parallel_k_shortest_path(self._mlgraph.graph,
-                                             origins,
-                                             destinations,
-                                             self._cost,
-                                             chosen_mservices,
-                                             available_layers,
-                                             self._max_diff_cost,
-                                             self._max_dist_in_common,
-                                             self._cost_multiplier_to_find_k_paths,
-                                             self._max_retry_to_find_k_paths,
-                                             nb_paths,
-                                             self._thread_number)
-
-            ## Parse the outputs of HiPOP and proceed to path selection
-            users_paths = self.parse_paths(paths, uids, chosen_mservices, nb_paths, users_paths)
-
-        ### If self._considered_modes is defined, proceed to the guided paths discovery
-        else:
-            ### Proceed iteratively in the order of considered modes list
-            for considered_mode in self._considered_modes:
-                log.info(f'Path discovery for mode {considered_mode}')
-                ## Gather inputs for the HiPOP call while checking if the paths searched have already been found and saved
-                subgraph_layers = [l for l in self._mlgraph.layers.values() if l._id in considered_mode[0]]
-                k = considered_mode[2]
-                uids, origins, destinations, available_layers, chosen_mservices, nb_paths = \
-                    self._process_shortest_path_inputs(subgraph_layers, k, personal_ms_planning_origins,
-                        intermodality=considered_mode[1], saved_paths=users_paths)
-
-                ## Compute the shorest paths in parallel with the proper method
-                if considered_mode[1] is None:
-                    paths = parallel_k_shortest_path(self._mlgraph.graph,
-                                                     origins,
-                                                     destinations,
-                                                     self._cost,
-                                                     chosen_mservices,
-                                                     available_layers,
-                                                     self._max_diff_cost,
-                                                     self._max_dist_in_common,
-                                                     self._cost_multiplier_to_find_k_paths,
-                                                     self._max_retry_to_find_k_paths,
-                                                     nb_paths,
-                                                     self._thread_number)
-                else:
-                    paths = parallel_k_intermodal_shortest_path(self._mlgraph.graph,
-                                                                origins,
-                                                                destinations,
-                                                                chosen_mservices,
-                                                                self._cost,
-                                                                self._thread_number,
-                                                                considered_mode[1],
-                                                                self._max_diff_cost,
-                                                                self._max_dist_in_common,
-                                                                self._cost_multiplier_to_find_k_paths,
-                                                                self._max_retry_to_find_k_paths,
-                                                                nb_paths,
-                                                                available_layers)
-                ## Parse the outputs of HiPOP and proceed to path selection
-                users_paths = self.parse_paths(paths, uids, chosen_mservices, nb_paths, users_paths)
-
+        ### Get back the prefetched paths of departing users and repair the paths of the users
+        ### replanning after an event when possible, the other ones proceed to a paths discovery
+        prefetched = self._join_prefetched_paths(users_paths)
+        repaired = self._repair_paths(users_paths)
+        users_for_planning = self._users_for_planning
+        self._users_for_planning = [(u,e) for u,e in users_for_planning if u.id not in repaired and u.id not in prefetched]
+
+        if self._users_for_planning:
+            batches, parse = self._paths_discovery_queries(personal_ms_planning_origins)
+            users_paths = parse([self._compute_k_shortest_paths(*batch) for batch in batches], users_paths)
+
+        ### Save the paths found as alternatives for the next replanning of the users
+        if self._path_repair_tolerance is not None:
+            gnodes = self._mlgraph.graph.nodes
+            for u,_ in self._users_for_planning:
+                if users_paths[u.id]['paths']:
+                    self._store_alternatives(u, users_paths[u.id]['paths'], gnodes)
+            for uid in prefetched:
+                if users_paths[uid]['paths']:
+                    self._store_alternatives(users_paths[uid]['user'], users_paths[uid]['paths'], gnodes)
+        self._users_for_planning = users_for_planning
 
         ### Path selection
         self.path_selection(users_paths, tcurrent)
@@ -783,3 +1396,27 @@ class AbstractDecisionModel(ABC):
                         self._cost,
                         chosen_services,
                         accessible_layers)
+
+    def compute_paths(self, origins: List[str], destinations: List[str], accessible_layers: List[Set[str]], chosen_services: List[Dict[str, str]]):
+        """Method that computes several shortest paths at once with one call to HiPOP.
+
+        Args:
+            -origins: the list of origin nodes
+            -destinations: the list of destination nodes
+            -accessible_layers: for each path, the set of accessible layers
+            -chosen_services: for each path, the mobility service chosen on each layer
+
+        Returns:
+            -list of (nodes, cost) in the order of the origins, nodes is empty when
+             no path was found
+        """
+        if len(origins) == 0:
+            return []
+        with self.execution_resources.reserve_threads(self._nb_threads(len(origins))) as nb_threads:
+            return parallel_dijkstra(self._mlgraph.graph,
+                                     origins,
+                                     destinations,
+                                     chosen_services,
+                                     self._cost,
+                                     nb_threads,
+                                     accessible_layers)
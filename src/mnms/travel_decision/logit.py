@@ -1,5 +1,4 @@
 import logging
-from math import exp, fsum
 from typing import List, Tuple
 
 import numpy as np
@@ -13,6 +12,59 @@ from mnms.graph.layers import MultiLayerGraph
 log = create_logger(__name__)
 
 
+def batch_logit_choice(values: np.ndarray, offsets: np.ndarray, theta: float, rng=None) -> np.ndarray:
+    """Function that proceeds to logit choices for a batch of choice situations
+    with one vectorized draw.
+
+    Args:
+        -values: array with the costs of the alternatives of all choice situations,
+         those of situation i are values[offsets[i]:offsets[i+1]]
+        -offsets: array of length nb of situations + 1 with the first index
+         of each situation's alternatives in values
+        -theta: parameter of the logit
+        -rng: random generator used for the draw, numpy global one if None
+
+    Returns:
+        -array with the index of the chosen alternative in each situation
+    """
+    values = np.asarray(values, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    nb_situations = len(lengths)
+    if nb_situations == 0:
+        return np.zeros(0, dtype=np.int64)
+    assert np.all(lengths > 0), 'Each choice situation should have at least one alternative'
+    situations = np.repeat(np.arange(nb_situations), lengths)
+
+    # Softmax probabilities with the log-sum-exp trick to avoid underflow, they are
+    # computed on one row per situation so that the sums do not depend on the other
+    # situations of the batch
+    utilities = -theta * values
+    max_utilities = np.maximum.reduceat(utilities, offsets[:-1])
+    columns = np.arange(len(values)) - offsets[:-1][situations]
+    exp_utilities = np.zeros((nb_situations, lengths.max()))
+    exp_utilities[situations, columns] = np.exp(utilities - max_utilities[situations])
+    probabilities = exp_utilities / exp_utilities.sum(axis=1)[:, None]
+
+    # Cumulative probabilities normalized by their last value, as numpy choice does
+    cumsum_probabilities = np.cumsum(probabilities, axis=1)
+    cdf = cumsum_probabilities[situations, columns] / cumsum_probabilities[situations, lengths[situations] - 1]
+
+    # One uniform draw per situation, the chosen alternative is the first one
+    # whose cumulative probability exceeds the draw (as numpy choice does)
+    draws = rng.random(nb_situations) if rng is not None else np.random.random(nb_situations)
+    nb_below = np.bincount(situations, weights=cdf <= draws[situations], minlength=nb_situations).astype(np.int64)
+    return np.minimum(nb_below, lengths - 1)
+
+
+def _ragged_costs(paths_lists: List[List[Path]]):
+    lengths = [len(paths) for paths in paths_lists]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    values = np.fromiter((p.path_cost for paths in paths_lists for p in paths), dtype=float, count=offsets[-1])
+    return values, offsets
+
+
 class LogitDecisionModel(AbstractDecisionModel):
     def __init__(self, mmgraph: MultiLayerGraph, theta=0.01, considered_modes=None, n_shortest_path=3, cost='travel_time', outfile:str=None, verbose_file=False, personal_mob_service_park_radius:float=100):
         """Logit decision model for the path of a user.
@@ -62,21 +114,21 @@ class LogitDecisionModel(AbstractDecisionModel):
         Returns:
             -selected_path: path chosen
         """
-        sum_cost_exp = 0
-        theta = self._theta
-        while sum_cost_exp == 0:
-            sum_cost_exp = fsum(exp(-theta*p.path_cost) for p in paths)
-            theta /= 10
-
-        costs=[p.path_cost for p in paths]
-        proba_path = [exp(-10*theta*c)/sum_cost_exp for c in costs]
-
-        if self._seed is not None:
-            selected_ind = self._rng.choice(range(len(proba_path)), 1,  p=proba_path)[0]
-        else:
-            selected_ind = np.random.choice(range(len(proba_path)), 1,  p=proba_path)[0]
-        path_selected = paths[selected_ind]
-        return path_selected
+        return self.batch_path_choice([paths])[0]
+
+    def batch_path_choice(self, users_paths_lists: List[List[Path]]) -> List[Path]:
+        """Method that proceeds to the selection of the path for a batch of users
+        with one vectorized logit choice.
+
+        Args:
+            -users_paths_lists: list of the lists of paths each user considers
+
+        Returns:
+            -list of the path chosen by each user
+        """
+        values, offsets = _ragged_costs(users_paths_lists)
+        selected_inds = batch_logit_choice(values, offsets, self._theta, self._rng if self._seed is not None else None)
+        return [paths[i] for paths, i in zip(users_paths_lists, selected_inds)]
 
 class ModeCentricLogitDecisionModel(AbstractDecisionModel):
     def __init__(self, mmgraph: MultiLayerGraph, considered_modes, theta=0.01, cost='travel_time', outfile:str=None, verbose_file=False, personal_mob_service_park_radius:float=100):
@@ -115,7 +167,15 @@ class ModeCentricLogitDecisionModel(AbstractDecisionModel):
             rng = np.random.default_rng(self._seed)
             self._rng = rng
 
-    def path_choice(self, paths:List[Path]) -> Path:
+    def preselect_paths(self, paths:List[Path]) -> List[Path]:
+        """Method that selects the best path of each considered mode.
+
+        Args:
+            -paths: list of paths to consider for the choice
+
+        Returns:
+            -preselected_paths: best path of each mode for which some paths were found
+        """
         # Group paths per considered modes
         grouped_paths = {}
         for mi, m in enumerate(self._considered_modes):
@@ -133,25 +193,29 @@ class ModeCentricLogitDecisionModel(AbstractDecisionModel):
                     if layers_set.issubset(layers_group) and (layers_set & intermodality[0]) and (layers_set & intermodality[1]):
                         grouped_paths[mi].append(p)
 
-        # Start by selecting the best route for each mode
+        # Select the best route for each mode
         preselected_paths = []
         for k,v in grouped_paths.items():
             if v:
                 v.sort(key=lambda p: p.path_cost)
                 preselected_paths.append(v[0])
+        return preselected_paths
+
+    def path_choice(self, paths:List[Path]) -> Path:
+        return self.batch_path_choice([paths])[0]
 
-        # Then select a mode
-        sum_cost_exp = 0
-        theta = self._theta
-        while sum_cost_exp == 0:
-            sum_cost_exp = fsum(exp(-theta*p.path_cost) for p in preselected_paths)
-            theta /= 10
-
-        costs=[p.path_cost for p in preselected_paths]
-        proba_path = [exp(-10*theta*c)/sum_cost_exp for c in costs]
-
-        if self._seed is not None:
-            selected_ind = self._rng.choice(range(len(proba_path)), 1,  p=proba_path)[0]
-        else:
-            selected_ind = np.random.choice(range(len(proba_path)), 1,  p=proba_path)[0]
-        return preselected_paths[selected_ind]
+    def batch_path_choice(self, users_paths_lists: List[List[Path]]) -> List[Path]:
+        """Method that proceeds to the selection of the path for a batch of users:
+        the best route of each mode is preselected, then the modes are chosen with
+        one vectorized logit choice.
+
+        Args:
+            -users_paths_lists: list of the lists of paths each user considers
+
+        Returns:
+            -list of the path chosen by each user
+        """
+        preselected_paths_lists = [self.preselect_paths(paths) for paths in users_paths_lists]
+        values, offsets = _ragged_costs(preselected_paths_lists)
+        selected_inds = batch_logit_choice(values, offsets, self._theta, self._rng if self._seed is not None else None)
+        return [paths[i] for paths, i in zip(preselected_paths_lists, selected_inds)]
@@ -8,7 +8,8 @@ class FleetManager(object):
     def __init__(self,
                  veh_type: Type[Vehicle],
                  mobility_service: str,
-                 is_personal: bool):
+                 is_personal: bool,
+                 veh_manager: Optional[VehicleManager] = None):
         """
         Manage a fleet of Vehicles
 
@@ -16,15 +17,32 @@ class FleetManager(object):
             -veh_type: Type of vehicle
             -mobility_service: the associated mobility service
             -is_personal: bool specifying of the fleet manages personal vehicles or not
+            -veh_manager: the vehicle manager of the simulation, the default one if None
         """
-        self.__veh_manager = VehicleManager()
+        self.__veh_manager = veh_manager if veh_manager is not None else VehicleManager.default()
         self.vehicles: Dict[str, Vehicle] = dict()
         self._constructor: Type[Vehicle] = veh_type
         self._mobility_service = mobility_service
         self._is_personal = is_personal
 
+    @property
+    def veh_manager(self) -> VehicleManager:
+        return self.__veh_manager
+
+    def set_vehicle_manager(self, veh_manager: VehicleManager):
+        """Method that sets the vehicle manager of this fleet, the vehicles already
+        created are moved to the new manager with their ids.
+
+        Args:
+            -veh_manager: the new vehicle manager
+        """
+        if veh_manager is not self.__veh_manager:
+            self.__veh_manager.transfer_vehicles(list(self.vehicles.values()), veh_manager)
+            self.__veh_manager = veh_manager
+
     def create_vehicle(self, node: str, capacity: int, activities: Optional[List[VehicleActivity]]):
         new_veh = self._constructor(node, capacity, self._mobility_service, self._is_personal, activities=activities)
+        new_veh._global_id = self.__veh_manager.new_vehicle_id()
         self.vehicles[new_veh.id] = new_veh
         self.__veh_manager.add_vehicle(new_veh)
         return new_veh
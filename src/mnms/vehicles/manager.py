@@ -1,7 +1,8 @@
-from typing import Dict, Set, List
+import sys
+from typing import Dict, Set, List, Optional, Iterable
 from collections import defaultdict
 
-from mnms.vehicles.veh_type import Vehicle
+from mnms.vehicles.veh_type import Vehicle, ActivityType
 from mnms.log import create_logger
 
 log = create_logger(__name__)
@@ -9,34 +10,176 @@ log = create_logger(__name__)
 
 class VehicleManager(object):
 
-    # Class attribute (shared by all instances)
-    _vehicles: Dict[str, Vehicle] = dict()                      # id_veh, Vehicle
-    _type_vehicles: Dict[str, Set[str]] = defaultdict(set)
-    _new_vehicles: List[Vehicle] = list()
+    # Default manager shared by the fleets and flow motors which are not given
+    # a specific one, it keeps the scripts written for the former class level
+    # registries working
+    _default: Optional["VehicleManager"] = None
+
+    def __init__(self):
+        """Registry of the vehicles of one simulation. It generates the vehicles ids
+        and indexes the vehicles per mobility service and per current activity type.
+        """
+        self._vehicles: Dict[str, Vehicle] = dict()                      # id_veh, Vehicle
+        self._type_vehicles: Dict[str, Set[str]] = defaultdict(set)
+        self._new_vehicles: List[Vehicle] = list()
+
+        # Index of the vehicles per mobility service and current activity type, each
+        # bucket keeps the order in which the vehicles entered it
+        self._service_activity_vehicles: Dict[str, Dict[Optional[ActivityType], Dict[str, Vehicle]]] = defaultdict(lambda: defaultdict(dict))
+        self._moving_vehicles: Dict[str, Vehicle] = dict()
+
+        self._counter = 0
+
+    @classmethod
+    def default(cls) -> "VehicleManager":
+        """Returns the default vehicle manager of the process.
+        """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
 
     @property
     def number(self):
         return len(self._vehicles)
 
+    @property
+    def vehicles(self) -> Dict[str, Vehicle]:
+        return self._vehicles
+
+    def new_vehicle_id(self) -> str:
+        """Method that generates a new vehicle id unique in this manager.
+        """
+        vid = str(self._counter)
+        self._counter += 1
+        while vid in self._vehicles:
+            vid = str(self._counter)
+            self._counter += 1
+        return vid
+
     def add_vehicle(self, veh:Vehicle) -> None:
         self.add_new_vehicle(veh)
-        VehicleManager._vehicles[veh._global_id] = veh
-        VehicleManager._type_vehicles[veh.type].add(veh._global_id)
+        self._register_vehicle(veh)
+
+    def _register_vehicle(self, veh:Vehicle) -> None:
+        self._vehicles[veh._global_id] = veh
+        self._type_vehicles[veh.type].add(veh._global_id)
+        veh._manager = self
+        self._index_vehicle(veh, veh.activity)
 
     def add_new_vehicle(self, veh):
-        VehicleManager._new_vehicles.append(veh)
+        self._new_vehicles.append(veh)
 
     def remove_vehicle(self, veh:Vehicle) -> None:
-        log.info(f"Deleting {veh}")
-        del VehicleManager._vehicles[veh._global_id]
-        VehicleManager._type_vehicles[veh.type].remove(veh._global_id)
+        log.info("Deleting %s", veh)
+        del self._vehicles[veh._global_id]
+        self._type_vehicles[veh.type].remove(veh._global_id)
+        self._unindex_vehicle(veh, veh.activity)
+        veh._manager = None
+
+    def transfer_vehicles(self, vehicles: List[Vehicle], manager: "VehicleManager") -> None:
+        """Method that moves vehicles from this manager to another one, the vehicles
+        keep their ids since other registries (e.g. the waiting vehicles of the
+        vehicle sharing stations) may already refer to them.
+
+        Args:
+            -vehicles: the vehicles to move
+            -manager: the new manager of the vehicles
+        """
+        for veh in vehicles:
+            if veh._global_id in manager._vehicles:
+                log.error('Vehicle %s cannot be moved to a vehicle manager which already has a vehicle with this id',
+                          veh._global_id)
+                sys.exit(-1)
+
+        new_vehicles = set(id(v) for v in self._new_vehicles)
+        moved_new_vehicles = []
+        for veh in vehicles:
+            if id(veh) in new_vehicles:
+                moved_new_vehicles.append(veh)
+            self.remove_vehicle(veh)
+            manager._register_vehicle(veh)
+        moved_vehicles = set(id(v) for v in vehicles)
+        self._new_vehicles = [v for v in self._new_vehicles if id(v) not in moved_vehicles]
+        # Vehicles not yet handled by the flow motor remain new in the other manager
+        manager._new_vehicles.extend(moved_new_vehicles)
 
     @property
     def has_new_vehicles(self):
-        return bool(VehicleManager._new_vehicles)
+        return bool(self._new_vehicles)
+
+    def update_vehicle_activity(self, veh: Vehicle, previous_activity, activity) -> None:
+        """Method called by a vehicle of this manager when its current activity changes.
+
+        Args:
+            -veh: the vehicle
+            -previous_activity: the previous activity of the vehicle
+            -activity: the new activity of the vehicle
+        """
+        self._unindex_vehicle(veh, previous_activity)
+        self._index_vehicle(veh, activity)
+
+    def _index_vehicle(self, veh: Vehicle, activity):
+        atype = activity.activity_type if activity is not None else None
+        self._service_activity_vehicles[veh.mobility_service][atype][veh._global_id] = veh
+        if activity is not None and activity.is_moving:
+            self._moving_vehicles[veh._global_id] = veh
+
+    def _unindex_vehicle(self, veh: Vehicle, activity):
+        atype = activity.activity_type if activity is not None else None
+        self._service_activity_vehicles[veh.mobility_service][atype].pop(veh._global_id, None)
+        self._moving_vehicles.pop(veh._global_id, None)
+
+    def get_vehicles(self, mobility_service: Optional[str] = None, activity_types: Optional[Iterable[Optional[ActivityType]]] = None) -> List[Vehicle]:
+        """Method that returns the vehicles of a mobility service and/or whose current
+        activity is of some types. The vehicles of a mobility service and activity
+        type are in the order in which they started this type of activity.
+
+        Args:
+            -mobility_service: id of the mobility service, all services if None
+            -activity_types: types of current activity (None for no activity), all types if None
+
+        Returns:
+            -list of vehicles
+        """
+        if mobility_service is None:
+            services = list(self._service_activity_vehicles.values())
+        elif mobility_service in self._service_activity_vehicles:
+            services = [self._service_activity_vehicles[mobility_service]]
+        else:
+            return []
+        vehicles = []
+        for service_vehicles in services:
+            if activity_types is None:
+                for vehs in service_vehicles.values():
+                    vehicles.extend(vehs.values())
+            else:
+                for atype in activity_types:
+                    if atype in service_vehicles:
+                        vehicles.extend(service_vehicles[atype].values())
+        return vehicles
+
+    def get_moving_vehicles(self) -> List[Vehicle]:
+        """Method that returns the vehicles whose current activity is moving.
+        """
+        return list(self._moving_vehicles.values())
+
+    def get_idle_vehicles(self, mobility_service: Optional[str] = None) -> List[Vehicle]:
+        """Method that returns the stopped vehicles.
+
+        Args:
+            -mobility_service: id of the mobility service, all services if None
+        """
+        return self.get_vehicles(mobility_service, [ActivityType.STOP])
+
+    def clear(self):
+        """Method that removes all vehicles of this manager and resets its id generator.
+        """
+        for veh in self._vehicles.values():
+            veh._manager = None
+        self.__init__()
 
     @classmethod
     def empty(cls):
-        VehicleManager._vehicles = dict()
-        VehicleManager._type_vehicles = defaultdict(set)
-        VehicleManager._new_vehicles = list()
+        """Method that clears the default vehicle manager.
+        """
+        cls.default().clear()
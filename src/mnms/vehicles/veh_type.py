@@ -38,6 +38,7 @@ class VehicleActivity(ABC):
             user: the user linked to the activity
             is_done: indicates if the activity is terminated
             iter_path: the iterator of the path
+            link_indices: optional integer ids of the links of the path in the graph index
 
     """
     activity_type: ActivityType
@@ -51,6 +52,8 @@ class VehicleActivity(ABC):
 
     is_done: bool = False
 
+    link_indices: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
+
     def __post_init__(self):
         self.reset_path_iterator()
 
@@ -64,10 +67,19 @@ class VehicleActivity(ABC):
             -new_path: the new path
         """
         self.path = new_path
+        self.link_indices = None
         if new_path:
             self.node = new_path[-1][0][1]
         self.reset_path_iterator()
 
+    def set_link_indices(self, index: "GraphIndex"):
+        """Method that sets the integer ids of the links of this activity path.
+
+        Args:
+            -index: the index of the graph where path is defined
+        """
+        self.link_indices = index.vehicle_path_link_indices(self.path)
+
     def modify_path_and_next(self, new_path: _TYPE_PATH):
         """Method to update this activity path and set the iterator on path to the next node.
 
@@ -236,6 +248,10 @@ class Vehicle(TimeDependentSubject):
 
     _counter = 0
 
+    __slots__ = ('_global_id', '_manager', '_activity', '_capacity', 'mobility_service', '_is_personal',
+                 'passengers', '_current_link', '_current_node', '_remaining_link_length', '_position',
+                 '_distance', '_iter_path', 'speed', 'activities')
+
     def __init__(self,
                  node: str,
                  capacity: int,
@@ -257,8 +273,12 @@ class Vehicle(TimeDependentSubject):
 
         super(Vehicle, self).__init__()
 
+        # NB: the vehicles created by a FleetManager get an id generated by their
+        # VehicleManager, this counter only applies to standalone vehicles
         self._global_id = str(Vehicle._counter)
         Vehicle._counter += 1
+        self._manager = None                        # VehicleManager of the vehicle, notified of activity changes
+        self._activity = None
 
         self._capacity = capacity
         self.mobility_service = mobility_service
@@ -326,13 +346,24 @@ class Vehicle(TimeDependentSubject):
     def position(self):
         return self._position
 
+    @property
+    def activity(self):
+        return self._activity
+
+    @activity.setter
+    def activity(self, activity):
+        previous_activity = self._activity
+        self._activity = activity
+        if self._manager is not None:
+            self._manager.update_vehicle_activity(self, previous_activity, activity)
+
     @property
     def activity_type(self) -> ActivityType:
-        return self.activity.activity_type if self.activity is not None else None
+        return self._activity.activity_type if self._activity is not None else None
 
     @property
     def is_moving(self) -> bool:
-        return self.activity.is_moving if self.activity is not None else False
+        return self._activity.is_moving if self._activity is not None else False
 
     def add_activities(self, activities:List[VehicleActivity]):
         for a in activities:
@@ -387,7 +418,7 @@ class Vehicle(TimeDependentSubject):
         self._position = position
 
     def drop_user(self, tcurrent:Time, user:'User', drop_pos:np.ndarray):
-        log.info(f"{user} is dropped at {self._current_link[0]}")
+        log.info("%s is dropped at %s", user, self._current_link[0])
         user.remaining_link_length = 0
         upath = user.path.nodes
         unode = self._current_link[0]
@@ -400,7 +431,7 @@ class Vehicle(TimeDependentSubject):
 
     def drop_all_passengers(self, tcurrent:Time):
         for _, user in self.passengers.values():
-            log.info(f"{user} is dropped at {self._current_link[1]}")
+            log.info("%s is dropped at %s", user, self._current_link[1])
             unode = self._current_link[1]
             user.current_node = unode
             user.remaining_link_length = 0
@@ -411,7 +442,7 @@ class Vehicle(TimeDependentSubject):
         self.passengers = dict()
 
     def start_user_trip(self, userid, take_node):
-        log.info(f'Passenger {userid} has been taken by {self} at {take_node}')
+        log.info('Passenger %s has been taken by %s at %s', userid, self, take_node)
         take_time, user = self._next_passenger.pop(userid)
         user.vehicle = self.id
         self.passengers[userid] = (take_time, user)
@@ -446,6 +477,8 @@ class Vehicle(TimeDependentSubject):
 
 
 class Car(Vehicle):
+    __slots__ = ('_last_dropped_off_user',)
+
     def __init__(self,
                  node: str,
                  capacity: int,
@@ -465,6 +498,8 @@ class Car(Vehicle):
         self._last_dropped_off_user = user
 
 class Bus(Vehicle):
+    __slots__ = ()
+
     def __init__(self,
                  node: str,
                  capacity: int,
@@ -476,6 +511,8 @@ class Bus(Vehicle):
 
 
 class Tram(Vehicle):
+    __slots__ = ()
+
     def __init__(self,
                  node: str,
                  capacity: int,
@@ -487,6 +524,8 @@ class Tram(Vehicle):
 
 
 class Metro(Vehicle):
+    __slots__ = ()
+
     def __init__(self,
                  node: str,
                  capacity: int,
@@ -498,6 +537,8 @@ class Metro(Vehicle):
 
 
 class Bike(Vehicle):
+    __slots__ = ('_last_dropped_off_user',)
+
     def __init__(self,
                  node: str,
                  capacity: int,
@@ -506,8 +547,19 @@ class Bike(Vehicle):
                  initial_speed=5.5,
                  activities: Optional[VehicleActivity] = None):
         super(Bike, self).__init__(node, capacity, mobility_service, is_personal, initial_speed, activities)
+        self._last_dropped_off_user = None
+
+    @property
+    def last_dropped_off_user(self):
+        return self._last_dropped_off_user
+
+    @last_dropped_off_user.setter
+    def last_dropped_off_user(self, user):
+        self._last_dropped_off_user = user
 
 class Train(Vehicle):
+    __slots__ = ()
+
     def __init__(self,
                  node: str,
                  capacity: int,
@@ -0,0 +1,71 @@
+import unittest
+import tempfile
+from copy import deepcopy
+from pathlib import Path
+
+import pandas as pd
+
+from mnms.demand import BaseDemandManager, User
+from mnms.demand.user import Path as UserPath
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.generation.mlgraph import generate_manhattan_passenger_car
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.tools.observer import CSVUserSummaryObserver
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.vehicles.manager import VehicleManager
+from mnms.vehicles.veh_type import Car
+
+
+class TestUserMemory(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        self.temp_dir_results = tempfile.TemporaryDirectory()
+        self.dir_results = Path(self.temp_dir_results.name)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        self.temp_dir_results.cleanup()
+        VehicleManager.empty()
+
+    def test_slots(self):
+        user = User("U0", "A", "B", Time("07:00:00"))
+        path = UserPath(3, ("A", "B"))
+        veh = Car("A", 1, "CAR", True)
+        for obj in (user, path, veh):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+        # Empty containers are shared until they are written
+        other_user = User("U1", "A", "B", Time("07:00:00"))
+        self.assertIs(user.parameters, other_user.parameters)
+        self.assertIs(user._observers, other_user._observers)
+        user.park_personal_vehicle("CAR", "A")
+        self.assertEqual(user.parked_personal_vehicles, {"CAR": "A"})
+        self.assertEqual(other_user.parked_personal_vehicles, {})
+
+        path_copy = deepcopy(path)
+        self.assertEqual(path_copy, path)
+        self.assertIs(path_copy.service_costs, path.service_costs)
+
+    def test_release_finished_users(self):
+        mlgraph = generate_manhattan_passenger_car(3, 100)
+        users = [User(str(i), "ORIGIN_0", "DESTINATION_8", Time("07:00:00").add_time(Dt(minutes=i)))
+                 for i in range(5)]
+        demand = BaseDemandManager(users, release_users=True)
+        self.assertEqual(len(users), 0)
+        demand.add_user_observer(CSVUserSummaryObserver(self.dir_results / "arrivals.csv"))
+
+        flow_motor = MFDFlowMotor()
+        flow_motor.add_reservoir(Reservoir(mlgraph.roads.zones["RES"], ["CAR"], lambda x: {"CAR": 10}))
+        supervisor = Supervisor(mlgraph, demand, flow_motor, DummyDecisionModel(mlgraph))
+        supervisor.run(Time("06:59:00"), Time("07:30:00"), Dt(seconds=10), 1)
+
+        self.assertEqual(len(demand._users), 0)
+        self.assertEqual(len(supervisor._user_flow.users), 0)
+        with open(self.dir_results / "arrivals.csv") as f:
+            df = pd.read_csv(f, sep=';')
+        self.assertEqual(list(df['ID']), [0, 1, 2, 3, 4])
+        self.assertTrue((df['DISTANCE'] >= 400).all())
+        self.assertTrue(df['PATH'].str.startswith('CAR_0 ').all())
@@ -128,3 +128,26 @@ def test_congested_mfd_congestion():
     assert approx_dist2 == pytest.approx(veh2.distance)
 
     VehicleManager.empty()
+
+
+def test_congested_reservoir_queue_release():
+    from types import SimpleNamespace
+    from mnms.flow.congested_MFD import QueuedVehicle
+
+    roads = generate_line_road([0, 0], [0, 20], 3)
+    roads.add_zone(construct_zone_from_sections(roads, "LEFT", ["0_1"]))
+    res = CongestedReservoir(roads.zones["LEFT"],
+                             ["CAR"],
+                             lambda x, nmax: {k: 20 for k in x},
+                             lambda x, nmax: 0.5,
+                             10)
+
+    for vid, entrance_time in [('0', 10.), ('1', 30.), ('2', 20.), ('3', 40.)]:
+        res.enqueue(QueuedVehicle(SimpleNamespace(id=vid), entrance_time, None))
+
+    assert [q.id for q in res.release(5.)] == []
+    # Vehicle 2 can enter but waits behind vehicle 1
+    assert [q.id for q in res.release(25.)] == ['0']
+    assert [q.id for q in res.release(35.)] == ['1', '2']
+    assert [q.id for q in res.car_queue] == ['3']
+    assert res.queue_length == 1
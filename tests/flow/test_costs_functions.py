@@ -203,3 +203,35 @@ class TestCostsFunctions(unittest.TestCase):
         self.assertEqual(1, len(dfp))
         cost = 3 * 0.003 * 50 / 1.42 + 0.0005 * 2000 + 0.003 * 2000 / 8.33 + 6.44 + 0.003 * 2900 / 7 + 0.003 * 30 - 1
         self.assertAlmostEqual(dfp['COST'].iloc[0],cost)
+
+    def test_vectorized_cost_functions(self):
+        def gc_car(mlgraph, links, costs, car_kmcost=0.0005, vot=0.003):
+            return costs['length'] * car_kmcost + vot * costs['travel_time']
+
+        def gc_bus(mlgraph, links, costs, vot=0.003):
+            return vot * costs['length'] / costs['speed']
+
+        self.mlgraph.add_cost_function('CAR', 'generalized_cost', gc_car, vectorized=True)
+        self.mlgraph.add_cost_function('BUS', 'generalized_cost', gc_bus, vectorized=True)
+        self.assertNotIn('generalized_cost', self.mlgraph.layers['CAR']._costs_functions["PersonalVehicle"])
+        self.assertIn('generalized_cost', self.mlgraph.layers['CAR']._vectorized_costs_functions["PersonalVehicle"])
+
+        self.flow.initialize(1.42)
+        car_link = self.mlgraph.graph.links['C0_C1']
+        self.assertAlmostEqual(car_link.costs["PersonalVehicle"]['generalized_cost'], 0.003 * 2000 / 8.33 + 0.0005 * 2000)
+        self.assertAlmostEqual(self.mlgraph.layers['CAR'].graph.links['C0_C1'].costs["PersonalVehicle"]['generalized_cost'],
+                               0.003 * 2000 / 8.33 + 0.0005 * 2000)
+        self.assertAlmostEqual(self.mlgraph.graph.links['CAR_BUS'].costs["WALK"]['generalized_cost'],
+                               0.003 * 50 / 1.42 + 3 + 2 + 1.44)
+
+        self.supervisor.run(Time("07:00:00"),
+                            Time("09:00:00"),
+                            Dt(seconds=1),
+                            10)
+        for lid, link in self.mlgraph.graph.links.items():
+            if lid == 'C0_C1':
+                self.assertAlmostEqual(link.costs["PersonalVehicle"]['generalized_cost'], 0.003 * 2000 / 10 + 0.0005 * 2000)
+            elif lid in ['L1_B2_B3', 'L1_B1_B2']:
+                self.assertAlmostEqual(link.costs["Bus"]['generalized_cost'], 0.003 * 1450 / 9)
+                self.assertAlmostEqual(self.mlgraph.layers['BUS'].graph.links[lid].costs["Bus"]['generalized_cost'],
+                                       0.003 * 1450 / 9)
@@ -84,3 +84,54 @@ class TestUserFlow(unittest.TestCase):
         self.user_flow.step(Dt(minutes=1), [user])
 
         self.assertIn('U0', self.user_flow.users)
+
+    def test_transit_links_index(self):
+        user = User('U0', '0', '4', Time('00:01:00'))
+        user._current_node = 'C0'
+        user.set_path(Path(cost=3400,
+                           nodes=['C0', 'C2', 'L1_B2', 'L1_B3', 'L1_B4']))
+        self.user_flow.step(Dt(minutes=1), [user])
+
+        self.assertEqual(self.user_flow.get_users_on_links([('C2', 'L1_B2')]), [user])
+        self.assertEqual(self.user_flow.get_users_on_links([('C0', 'C2')]), [])
+
+        user.path = Path(cost=40000, nodes=['C0', 'C1'])
+        self.assertEqual(self.user_flow.get_users_on_links([('C2', 'L1_B2')]), [])
+
+        self.user_flow.remove_user('U0')
+        self.assertIsNone(user._user_flow)
+        self.assertEqual(dict(self.user_flow._transit_link_users), {})
+
+    def test_graph_nodes_read_once(self):
+        class CountingGraph(object):
+            def __init__(self, graph):
+                self._graph = graph
+                self.nb_nodes_reads = 0
+
+            @property
+            def nodes(self):
+                self.nb_nodes_reads += 1
+                return self._graph.nodes
+
+            def __getattr__(self, name):
+                return getattr(self._graph, name)
+
+        graph = CountingGraph(self.mlgraph.graph)
+        self.mlgraph.graph = graph
+
+        users = [User(f'U{i}', '0', '4', Time('00:01:00')) for i in range(5)]
+        for user in users:
+            user._current_node = 'C0'
+            user.set_path(Path(cost=3400, nodes=['C0', 'C2', 'L1_B2', 'L1_B3', 'L1_B4']))
+        self.user_flow.step(Dt(minutes=1), users)
+        for user in users:
+            user.path = Path(cost=40000, nodes=['C0', 'C1'])
+        self.assertEqual(graph.nb_nodes_reads, 1)
+
+        # The nodes are read again once the topology of the graph changed
+        self.mlgraph.connect_layers('BUS_CAR', 'L1_B2', 'C2', 0, {'time': 0})
+        nb_nodes_reads = graph.nb_nodes_reads
+        for user in users:
+            user.path = Path(cost=3400, nodes=['C0', 'C2', 'L1_B2', 'L1_B3', 'L1_B4'])
+        self.assertEqual(graph.nb_nodes_reads, nb_nodes_reads + 1)
+        self.assertEqual(self.user_flow.get_users_on_links([('C2', 'L1_B2')]), users)
@@ -0,0 +1,146 @@
+import unittest
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from mnms.demand import User
+from mnms.demand.user import Path
+from mnms.flow.MFD import Reservoir
+from mnms.flow.vectorized_MFD import VectorizedMFDFlowMotor, ReservoirSet, greenshields_speed_function, \
+    linear_3d_mfd_speed_function
+from mnms.graph.layers import MultiLayerGraph, CarLayer, BusLayer
+from mnms.graph.road import RoadDescriptor
+from mnms.graph.zone import construct_zone_from_sections
+from mnms.mobility_service.abstract import Request
+from mnms.mobility_service.personal_vehicle import PersonalMobilityService
+from mnms.mobility_service.public_transport import PublicTransportMobilityService
+from mnms.time import Dt, TimeTable, Time
+from mnms.vehicles.manager import VehicleManager
+from mnms.vehicles.veh_type import Vehicle
+
+
+class TestVectorizedMFDFlow(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        self.tempfile = TemporaryDirectory()
+        self.pathdir = self.tempfile.name+'/'
+
+        roads = RoadDescriptor()
+
+        roads.register_node('0', [0, 0])
+        roads.register_node('1', [0, 40000])
+        roads.register_node('2', [1200, 0])
+        roads.register_node('3', [1400, 0])
+        roads.register_node('4', [3400, 0])
+
+        roads.register_section('0_1', '0', '1')
+        roads.register_section('0_2', '0', '2')
+        roads.register_section('2_3', '2', '3')
+        roads.register_section('3_4', '3', '4')
+
+        roads.register_stop("B2", "2_3", 0)
+        roads.register_stop("B3", "3_4", 0)
+        roads.register_stop("B4", "3_4", 1)
+
+        roads.add_zone(construct_zone_from_sections(roads, "res1", ["0_1", "0_2", "2_3"]))
+        roads.add_zone(construct_zone_from_sections(roads, "res2", ["3_4"]))
+
+        self.personal_car = PersonalMobilityService()
+        car_layer = CarLayer(roads, services=[self.personal_car])
+        car_layer.create_node('C0', '0')
+        car_layer.create_node('C1', '1')
+        car_layer.create_node('C2', '2')
+
+        car_layer.create_link('C0_C1', 'C0', 'C1', costs={"PersonalVehicle": {'length': 40000}}, road_links=['0_1'])
+        car_layer.create_link('C0_C2', 'C0', 'C2', costs={"PersonalVehicle": {'length': 1200}}, road_links=['0_2'])
+
+        bus_layer = BusLayer(roads,
+                             services=[PublicTransportMobilityService('Bus')])
+
+        bus_layer.create_line("L1",
+                              ["B2", "B3", "B4"],
+                              [["2_3"], ["3_4"]],
+                              TimeTable.create_table_freq('00:00:00', '01:00:00', Dt(minutes=2)))
+
+        mlgraph = MultiLayerGraph([car_layer, bus_layer])
+
+        mlgraph.connect_layers('CAR_BUS', 'C2', 'L1_B2', 0, {'time': 0})
+
+        self.mlgraph = mlgraph
+
+        v_free = np.array([[42, 42], [0.23, 0.23]])
+        self.reservoirs = ReservoirSet([roads.zones["res1"], roads.zones["res2"]], ["CAR", "BUS"],
+                                       lambda acc: v_free)
+
+        self.flow = VectorizedMFDFlowMotor(self.reservoirs)
+        self.flow.set_graph(mlgraph)
+        self.flow.set_time(Time('09:00:00'))
+
+        self.flow.initialize(1.42)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        self.tempfile.cleanup()
+        VehicleManager.empty()
+        Vehicle._counter = 0
+
+    def _start_car(self):
+        user = User('U0', '0', '4', Time('00:01:00'))
+        user.set_path(Path(3400,
+                           ['C0', 'C2', 'B2', 'B3', 'B4']))
+        self.personal_car.add_request(user, 'C2', Time('00:01:00'))
+        self.personal_car.matching(Request(user, "C2", Time('00:01:00')))
+
+    def test_accumulation_speed(self):
+        self._start_car()
+        self.flow.step(Dt(seconds=1))
+
+        np.testing.assert_array_equal([[1, 0], [0, 0]], self.reservoirs.accumulations)
+        np.testing.assert_array_equal([[42, 42], [0.23, 0.23]], self.reservoirs.speeds)
+        self.assertAlmostEqual(1158.0, self.personal_car.fleet.vehicles['0']._remaining_link_length)
+
+    def test_add_reservoir(self):
+        zone = self.reservoirs.zones[0]
+        with self.assertRaises(TypeError):
+            self.flow.add_reservoir(Reservoir(zone, ["CAR"], lambda acc: {"CAR": 10}))
+
+    def test_ghost_accumulation_table(self):
+        self.reservoirs.set_ghost_accumulation_table([Time('09:00:01'), Time('10:00:00')],
+                                                     [[[21, 0], [40, 3]],
+                                                      [[0, 0], [0, 0]]])
+        np.testing.assert_array_equal(np.zeros((2, 2)), self.reservoirs.ghost_accumulations(0))
+
+        self._start_car()
+        self.flow.step(Dt(seconds=1))
+        np.testing.assert_array_equal([[1, 0], [0, 0]], self.reservoirs.accumulations)
+
+        self.flow.update_time(Dt(seconds=1))
+        self.flow.step(Dt(seconds=1))
+        np.testing.assert_array_equal([[22, 0], [40, 3]], self.reservoirs.accumulations)
+
+    def test_update_graph(self):
+        self._start_car()
+        self.flow.step(Dt(seconds=1))
+        self.flow.update_graph(1e-3)
+
+        link = self.mlgraph.graph.get_link('C0_C2')
+        self.assertAlmostEqual(42, link.costs['PersonalVehicle']['speed'])
+        self.assertAlmostEqual(1200 / 42, link.costs['PersonalVehicle']['travel_time'])
+
+        link = self.mlgraph.graph.get_link('L1_B3_B4')
+        self.assertAlmostEqual(0.23, link.costs['Bus']['speed'])
+
+
+def test_speed_functions():
+    acc = np.array([[10., 5.], [0., 0.]])
+
+    f_speed = greenshields_speed_function([[10, 5], [10, 5]], [30, 30], pcu=[1, 2])
+    np.testing.assert_allclose([[10 / 3, 5 / 3], [10, 5]], f_speed(acc))
+
+    f_speed = linear_3d_mfd_speed_function([[10, 5], [10, 5]], [[0.1, 0.2], [0.1, 0.], ], v_min=1)
+    np.testing.assert_allclose([[8, 4], [10, 5]], f_speed(acc))
+
+    f_speed = linear_3d_mfd_speed_function(10, np.full((2, 2, 2), 1.), v_min=1)
+    np.testing.assert_allclose([[1, 1], [10, 10]], f_speed(acc))
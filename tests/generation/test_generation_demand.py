@@ -1,18 +1,67 @@
 import unittest
+from tempfile import TemporaryDirectory
 
-from mnms.generation.demand import generate_random_demand
+from hipop.shortest_path import dijkstra
+
+from mnms.demand import CSVDemandManager
+from mnms.generation.demand import generate_random_demand, generate_random_demand_file
 from mnms.generation.mlgraph import generate_manhattan_passenger_car
+from mnms.time import Time
 
 class TestDemandGeneration(unittest.TestCase):
     def setUp(self):
         """Initiates the test.
         """
+        self.tempfile = TemporaryDirectory()
+        self.pathdir = self.tempfile.name+'/'
 
     def tearDown(self):
         """Concludes and closes the test.
         """
+        self.tempfile.cleanup()
 
     def test_random_demand(self):
         mlgraph = generate_manhattan_passenger_car(10, 1)
 
-        demand = generate_random_demand(mlgraph, 10)
\ No newline at end of file
+        demand = generate_random_demand(mlgraph, 10)
+        self.assertEqual(10, demand.nb_users)
+
+    def test_random_demand_empty(self):
+        mlgraph = generate_manhattan_passenger_car(10, 100)
+
+        demand = generate_random_demand(mlgraph, 0)
+        self.assertEqual(0, demand.nb_users)
+        self.assertEqual([], demand.get_next_departures(Time('07:00:00'), Time('18:00:00')))
+
+        # No origin destination pair is long enough
+        demand = generate_random_demand(mlgraph, 10, min_cost=1e6, batch_size=16)
+        self.assertEqual(0, demand.nb_users)
+
+        generate_random_demand_file(mlgraph, self.pathdir + 'demand.csv', 10, min_cost=1e6, batch_size=16)
+        with open(self.pathdir + 'demand.csv') as f:
+            self.assertEqual(['ID;DEPARTURE;ORIGIN;DESTINATION'], f.read().splitlines())
+
+    def test_random_demand_reproducible(self):
+        mlgraph = generate_manhattan_passenger_car(10, 100)
+
+        users_1 = generate_random_demand(mlgraph, 50, min_cost=300, seed=42, batch_size=16)._users
+        users_2 = generate_random_demand(mlgraph, 50, min_cost=300, seed=42, batch_size=16)._users
+        self.assertEqual(50, len(users_1))
+        self.assertEqual([(u.id, u.origin, u.destination, u.departure_time.to_seconds()) for u in users_1],
+                         [(u.id, u.origin, u.destination, u.departure_time.to_seconds()) for u in users_2])
+        departures = [u.departure_time.to_seconds() for u in users_1]
+        self.assertEqual(sorted(departures), departures)
+
+        services = {'CAR': 'PersonalVehicle', 'TRANSIT': 'WALK'}
+        for u in users_1:
+            _, cost = dijkstra(mlgraph.graph, u.origin, u.destination, 'length', services)
+            self.assertGreaterEqual(cost, 300)
+
+    def test_random_demand_file(self):
+        mlgraph = generate_manhattan_passenger_car(10, 100)
+
+        generate_random_demand_file(mlgraph, self.pathdir + 'demand.csv', 30, repeat=2, seed=1, batch_size=8)
+        demand = CSVDemandManager(self.pathdir + 'demand.csv')
+        users = demand.get_next_departures(Time('07:00:00'), Time('18:00:00'))
+        self.assertEqual(30, len(users))
+        self.assertEqual([str(i) for i in range(30)], [u.id for u in users])
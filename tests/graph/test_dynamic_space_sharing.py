@@ -81,3 +81,26 @@ def test_dynamic_space_sharing_initialize():
         os.remove("_veh.csv")
     except OSError:
         pass
+
+
+def test_find_vehicles_to_reroute():
+    from types import SimpleNamespace
+    from mnms.graph.dynamic_space_sharing import DynamicSpaceSharing
+
+    def activity(nodes):
+        return SimpleNamespace(path=[((nodes[i], nodes[i+1]), 10) for i in range(len(nodes)-1)])
+
+    # Vehicle already passed the first banned link but not the second one
+    act0 = activity(['A', 'B', 'C', 'D'])
+    veh0 = SimpleNamespace(activity=act0, current_link=('B', 'C'), activities=[])
+    # Vehicle planning to pass through the first banned link in a queued activity
+    act1 = activity(['E', 'F'])
+    queued_act1 = activity(['F', 'A', 'B'])
+    veh1 = SimpleNamespace(activity=act1, current_link=('E', 'F'), activities=[queued_act1])
+    # Vehicle without activity
+    veh2 = SimpleNamespace(activity=None, current_link=None, activities=[])
+
+    link_vehicles = DynamicSpaceSharing.find_vehicles_to_reroute([('A', 'B'), ('C', 'D')], iter([veh0, veh1, veh2]))
+
+    assert link_vehicles[('A', 'B')] == [(veh1, queued_act1)]
+    assert link_vehicles[('C', 'D')] == [(veh0, act0)]
@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+
+from mnms.demand.user import Path
+from mnms.generation.layers import generate_matching_origin_destination_layer
+from mnms.graph.layers import CarLayer, MultiLayerGraph
+from mnms.graph.road import RoadDescriptor
+from mnms.mobility_service.personal_vehicle import PersonalMobilityService
+from mnms.vehicles.veh_type import VehicleActivityRepositioning
+
+
+class TestGraphIndex(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        roads = RoadDescriptor()
+        roads.register_node("0", [0, 0])
+        roads.register_node("1", [100, 0])
+        roads.register_node("2", [200, 0])
+
+        roads.register_section("0_1", "0", "1")
+        roads.register_section("1_2", "1", "2")
+
+        car_layer = CarLayer(roads, services=[PersonalMobilityService()])
+        car_layer.create_node("C0", "0")
+        car_layer.create_node("C1", "1")
+        car_layer.create_node("C2", "2")
+        car_layer.create_link("C0_C1", "C0", "C1", {}, ["0_1"])
+        car_layer.create_link("C1_C2", "C1", "C2", {}, ["1_2"])
+
+        odlayer = generate_matching_origin_destination_layer(roads)
+        self.mlgraph = MultiLayerGraph([car_layer], odlayer, 1e-3)
+        self.mlgraph.initialize_costs(1.42)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+
+    def test_index(self):
+        index = self.mlgraph.index
+        links = self.mlgraph.graph.links
+        self.assertEqual(index.nb_nodes, 9)
+        self.assertEqual(index.nb_links, len(links))
+        self.assertEqual(sorted(index.link_ids), sorted(links.keys()))
+        self.assertTrue(index.link_active.all())
+
+        ind = index.link_index["C0_C1"]
+        self.assertEqual(index.node_ids[index.link_upstream[ind]], "C0")
+        self.assertEqual(index.node_ids[index.link_downstream[ind]], "C1")
+        self.assertAlmostEqual(index.link_length[ind], 100)
+        self.assertEqual(index.layer_ids[index.link_layer[ind]], "CAR")
+        self.assertEqual(index.get_link_index("C0", "C1"), ind)
+        self.assertEqual(index.get_layer_mask("CAR").sum(), 2)
+        self.assertEqual(index.get_layer_mask("TRANSIT").sum(), 6)
+
+        speeds = index.link_costs("PersonalVehicle", "speed")
+        self.assertEqual(np.isnan(speeds).sum(), 6)
+        self.assertAlmostEqual(speeds[ind], links["C0_C1"].costs["PersonalVehicle"]["speed"])
+
+    def test_paths(self):
+        index = self.mlgraph.index
+        nodes = ("ORIGIN_0", "C0", "C1", "C2", "DESTINATION_2")
+        path = Path(1, nodes)
+        path.set_link_indices(index)
+        self.assertEqual([index.link_ids[i] for i in path.link_indices],
+                         ["ORIGIN_0_C0", "C0_C1", "C1_C2", "C2_DESTINATION_2"])
+        self.assertEqual(index.link_indices_to_nodes(path.link_indices), list(nodes))
+
+        veh_path = [(("C0", "C1"), 100.), (("C1", "C2"), 100.)]
+        activity = VehicleActivityRepositioning(node="C2", path=veh_path)
+        activity.set_link_indices(index)
+        self.assertEqual(index.link_indices_to_vehicle_path(activity.link_indices), veh_path)
+        activity.modify_path(veh_path[1:])
+        self.assertIsNone(activity.link_indices)
+
+    def test_interning(self):
+        index = self.mlgraph.index
+        ind = index.link_index["C0_C1"]
+        nb_links = index.nb_links
+
+        self.mlgraph.connect_layers("C0_C2", "C0", "C2", 200, {"WALK": {"length": 200}})
+        self.assertIs(self.mlgraph.index, index)
+        self.assertEqual(index.nb_links, nb_links + 1)
+        self.assertEqual(index.link_index["C0_C1"], ind)
+        self.assertEqual(index.get_link_index("C0", "C2"), nb_links)
+
+        self.mlgraph.graph.delete_link("C0_C2")
+        self.mlgraph._outdate_index()
+        index = self.mlgraph.index
+        self.assertEqual(index.nb_links, nb_links + 1)
+        self.assertFalse(index.link_active[nb_links])
+        self.assertRaises(KeyError, index.get_link_index, "C0", "C2")
@@ -1,6 +1,9 @@
 import unittest
 
+import numpy as np
+
 from mnms.graph.layers import CarLayer, BusLayer
+from mnms.graph.specific_layers import OriginDestinationLayer
 from mnms.graph.road import RoadDescriptor
 from mnms.graph.zone import construct_zone_from_sections
 from mnms.mobility_service.personal_vehicle import PersonalMobilityService
@@ -143,3 +146,34 @@ class TestSerializationLayers(unittest.TestCase):
         self.assertDictEqual(new_bus_layer.map_reference_nodes, bus_layer.map_reference_nodes)
         self.assertSetEqual(set(new_bus_layer.graph.nodes.keys()), set(bus_layer.graph.nodes.keys()))
         self.assertSetEqual(set(new_bus_layer.graph.links.keys()), set(bus_layer.graph.links.keys()))
+
+    def test_odlayer_nearest_nodes(self):
+        odlayer = OriginDestinationLayer()
+        odlayer.create_origin_node("O0", np.array([0, 0]))
+        odlayer.create_origin_node("O1", np.array([10, 0]))
+        odlayer.create_destination_node("D0", np.array([0, 10]))
+
+        self.assertEqual(odlayer.get_nearest_origins([[1, 1], [9, 2], [6, 0]]), ["O0", "O1", "O1"])
+        self.assertEqual(odlayer.get_nearest_destinations([[100, 100]]), ["D0"])
+        self.assertEqual(odlayer.get_nearest_origins([]), [])
+        # Ties are broken in the order of creation of the nodes
+        self.assertEqual(odlayer.get_nearest_origins([[5, 3], [5, -3]]), ["O0", "O0"])
+
+        # KD-tree is rebuilt after the creation of a new node
+        odlayer.create_origin_node("O2", np.array([5, 0]))
+        self.assertEqual(odlayer.get_nearest_origins([[6, 0]]), ["O2"])
+
+    def test_odlayer_nodes_in_radius(self):
+        odlayer = OriginDestinationLayer()
+        odlayer.create_origin_node("O0", np.array([0, 0]))
+        odlayer.create_origin_node("O1", np.array([10, 0]))
+        odlayer.create_origin_node("O2", np.array([3, 4]))
+        odlayer.create_destination_node("D0", np.array([0, 10]))
+
+        near = odlayer.get_origins_in_radius([[0, 0], [20, 0]], 10)
+        # Strict inequality on the distance, nodes in the order of the odlayer
+        self.assertEqual([nid for nid, _ in near[0]], ["O0", "O2"])
+        self.assertAlmostEqual(near[0][1][1], 5)
+        self.assertEqual(near[1], [])
+        self.assertEqual([nid for nid, _ in odlayer.get_destinations_in_radius([[0, 1]], 10)[0]], ["D0"])
+        self.assertEqual(odlayer.get_origins_in_radius([], 10), [])
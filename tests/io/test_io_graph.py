@@ -7,7 +7,7 @@ from mnms.graph.road import RoadDescriptor
 from mnms.graph.zone import Zone
 from mnms.mobility_service.personal_vehicle import PersonalMobilityService
 from mnms.time import TimeTable, Dt
-from mnms.io.graph import save_graph, load_graph
+from mnms.io.graph import save_graph, load_graph, save_odlayer, load_odlayer
 
 
 class TestIOGraph(unittest.TestCase):
@@ -75,3 +75,28 @@ class TestIOGraph(unittest.TestCase):
             tempdir.cleanup()
         except:
             pass
+
+    def test_read_write_odlayer(self):
+        tempdir = TemporaryDirectory()
+        tempdir_name = tempdir.name
+
+        odlayer = self.mlgraph.odlayer
+        save_odlayer(odlayer, tempdir_name+"/odlayer.json")
+        new_odlayer = load_odlayer(tempdir_name+"/odlayer.json")
+
+        self.assertEqual(list(odlayer.origins.keys()), list(new_odlayer.origins.keys()))
+        self.assertEqual(list(odlayer.destinations.keys()), list(new_odlayer.destinations.keys()))
+        for nid, pos in odlayer.origins.items():
+            self.assertEqual(list(pos), list(new_odlayer.origins[nid]))
+        for nid, pos in odlayer.destinations.items():
+            self.assertEqual(list(pos), list(new_odlayer.destinations[nid]))
+
+        # The snapping of the loaded layer is the same
+        positions = [[0.1, 0], [1.6, 0.2], [2, 0]]
+        self.assertEqual(odlayer.get_nearest_origins(positions), new_odlayer.get_nearest_origins(positions))
+        self.assertEqual(odlayer.get_nearest_destinations(positions), new_odlayer.get_nearest_destinations(positions))
+
+        try:
+            tempdir.cleanup()
+        except:
+            pass
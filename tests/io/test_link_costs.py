@@ -0,0 +1,108 @@
+import ast
+import unittest
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from mnms.demand import BaseDemandManager, User
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.generation.mlgraph import generate_manhattan_passenger_car
+from mnms.io.link_costs import LinkCostsReader
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.vehicles.manager import VehicleManager
+
+
+class TestLinkCosts(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        self.temp_dir_results = tempfile.TemporaryDirectory()
+        self.dir_results = Path(self.temp_dir_results.name)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        self.temp_dir_results.cleanup()
+        VehicleManager.empty()
+
+    def test_record_and_read(self):
+        mlgraph = generate_manhattan_passenger_car(3, 100)
+        demand = BaseDemandManager([User("U0", "ORIGIN_0", "DESTINATION_8", Time("07:00:00"))])
+
+        # The speed changes at the first two updates only
+        flow_motor = MFDFlowMotor()
+        flow_motor.add_reservoir(Reservoir(mlgraph.roads.zones["RES"], ["CAR"],
+                                           lambda x: {"CAR": 8 if flow_motor._tcurrent < Time("07:00:00") else 6}))
+        supervisor = Supervisor(mlgraph, demand, flow_motor, DummyDecisionModel(mlgraph),
+                                outfile=self.dir_results / "costs.csv",
+                                link_costs_file=self.dir_results / "costs.bin")
+        supervisor.run(Time("06:59:00"), Time("07:05:00"), Dt(seconds=10), 6)
+
+        reader = LinkCostsReader(self.dir_results / "costs.bin")
+        self.assertEqual(list(reader.steps), list(range(6)))
+        self.assertEqual(reader.link_ids, mlgraph.index.link_ids)
+        self.assertEqual(set(reader.service_ids), {"PersonalVehicle", "WALK"})
+
+        # All links are in the first chunk, then only the updated ones
+        nb_car_links = len(mlgraph.layers["CAR"].graph.links)
+        nb_rows = [len(chunk['links']) for chunk in reader.iter_chunks()]
+        self.assertEqual(nb_rows[0], len(mlgraph.graph.links))
+        self.assertEqual(nb_rows[1:], [nb_car_links, 0, 0, 0, 0])
+
+        # The costs rebuilt from the chunks are the ones of the CSV output
+        with open(self.dir_results / "costs.csv") as f:
+            df = pd.read_csv(f, sep=';')
+        for step in range(6):
+            df_step = df[(df['AFFECTATION_STEP'] == step) & (df['MOBILITY_SERVICE'] == 'PersonalVehicle')]
+            speeds = reader.costs_at(step, 'PersonalVehicle', 'speed')
+            for lid, costs in zip(df_step['ID'], df_step['COSTS']):
+                self.assertAlmostEqual(speeds[reader.link_ids.index(lid)], ast.literal_eval(costs)['speed'])
+
+        lid = list(mlgraph.layers["CAR"].graph.links.keys())[0]
+        steps, values = reader.link_history(lid, 'PersonalVehicle', 'travel_time')
+        self.assertEqual(list(steps), [0, 1])
+        np.testing.assert_allclose(values, [100 / 8, 100 / 6])
+
+        df_bin = reader.to_dataframe(['speed'])
+        self.assertEqual(list(df_bin.columns), ['AFFECTATION_STEP', 'TIME', 'LINK', 'MOBILITY_SERVICE', 'speed'])
+        self.assertEqual(len(df_bin), sum(nb_rows))
+
+    def test_record_banned_link(self):
+        mlgraph = generate_manhattan_passenger_car(3, 100)
+        demand = BaseDemandManager([User("U0", "ORIGIN_0", "DESTINATION_8", Time("07:00:00"))])
+
+        flow_motor = MFDFlowMotor()
+        flow_motor.add_reservoir(Reservoir(mlgraph.roads.zones["RES"], ["CAR"], lambda x: {"CAR": 8}))
+
+        # The link is banned during 12 flow steps from the second affectation step
+        lid = 'CAR_0_1'
+        mlgraph.dynamic_space_sharing.set_dynamic(
+            lambda graph, tcurrent: [(lid, "PersonalVehicle", 12)] if Time("07:01:00") <= tcurrent < Time("07:01:10") else [], 0)
+        supervisor = Supervisor(mlgraph, demand, flow_motor, DummyDecisionModel(mlgraph),
+                                link_costs_file=self.dir_results / "costs.bin")
+        supervisor.run(Time("07:00:00"), Time("07:05:00"), Dt(seconds=10), 6)
+
+        reader = LinkCostsReader(self.dir_results / "costs.bin")
+        steps, values = reader.link_history(lid, 'PersonalVehicle', 'travel_time')
+        self.assertEqual(list(steps), [0, 1, 3])
+        np.testing.assert_allclose(values, [100 / 8, float('inf'), 100 / 8])
+
+        # The replayed costs are the ones of the graph
+        travel_times = reader.costs_at(4, 'PersonalVehicle', 'travel_time')
+        for link in mlgraph.graph.links.values():
+            if 'PersonalVehicle' in link.costs:
+                self.assertAlmostEqual(travel_times[reader.link_ids.index(link.id)],
+                                       link.costs['PersonalVehicle']['travel_time'])
+
+    def test_record_added_transit_links(self):
+        mlgraph = generate_manhattan_passenger_car(3, 100)
+        mlgraph.pop_updated_links()
+
+        mlgraph.add_transit_links([{'id': 'ORIGIN_0_CAR_4', 'upstream_node': 'ORIGIN_0',
+                                    'downstream_node': 'CAR_4', 'dist': 150}])
+        self.assertEqual(mlgraph.pop_updated_links(), {'ORIGIN_0_CAR_4'})
+        self.assertEqual(mlgraph.pop_updated_links(), set())
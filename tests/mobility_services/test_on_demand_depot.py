@@ -14,6 +14,7 @@ from mnms.generation.layers import generate_matching_origin_destination_layer, g
 from mnms.mobility_service.vehicle_sharing import VehicleSharingMobilityService
 from mnms.mobility_service.on_demand import OnDemandDepotMobilityService
 from mnms.tools.observer import CSVUserObserver, CSVVehicleObserver
+from mnms.vehicles.manager import VehicleManager
 from mnms.vehicles.veh_type import Bike, Bus
 from mnms.travel_decision.dummy import DummyDecisionModel
 from mnms.flow.MFD import MFDFlowMotor, Reservoir
@@ -38,6 +39,7 @@ class TestOnDemandDepotMobilityService(unittest.TestCase):
         """Concludes and closes the test.
         """
         self.temp_dir_results.cleanup()
+        VehicleManager.empty()
 
     def create_supervisor(self, sc):
         """Method to create a common supervisor for the different tests of this class.
@@ -124,3 +126,29 @@ class TestOnDemandDepotMobilityService(unittest.TestCase):
         self.assertAlmostEqual(df3['COST'].iloc[0], w_2 + tt2)
         df4 = df[df['ID'] == 'U4']
         self.assertAlmostEqual(df4['COST'].iloc[0], w_3 + tt3)
+
+    def test_on_demand_depot_batched_repositioning(self):
+        """Test that the stopped vehicles reposition toward the nearest depots with
+        free places, the places being taken in the order of the vehicles.
+        """
+        roads = generate_manhattan_road(4, 500, extended=False)
+        ridehailing = OnDemandDepotMobilityService('RIDEHAILING', 0)
+        ridehailing_layer = generate_layer_from_roads(roads, 'RIDEHAILING', mobility_services=[ridehailing])
+        ridehailing.add_depot('RIDEHAILING_4', 0)
+        ridehailing.add_depot('RIDEHAILING_3', 1)
+        ridehailing.add_depot('RIDEHAILING_8', 2, fill=False)
+        ridehailing.add_depot('RIDEHAILING_15', 1, fill=False)
+        mlgraph = MultiLayerGraph([ridehailing_layer], generate_matching_origin_destination_layer(roads))
+        mlgraph.initialize_costs(1.42)
+
+        depot_veh = ridehailing.depots['RIDEHAILING_3'].get_first_vehicle()[0]
+        vehs = [ridehailing.create_waiting_vehicle('RIDEHAILING_0') for _ in range(4)]
+        ridehailing.step_maintenance(Dt(seconds=30))
+
+        self.assertTrue(ridehailing.depots['RIDEHAILING_3'].contains(depot_veh))
+        self.assertEqual([[a.node for a in veh.activities] for veh in vehs],
+                         [['RIDEHAILING_8'], ['RIDEHAILING_8'], ['RIDEHAILING_15'], []])
+        self.assertEqual(vehs[0].activities[0].path[-1][0], ('RIDEHAILING_4', 'RIDEHAILING_8'))
+
+        # The places reserved by the vehicles already heading to a depot are not given
+        self.assertEqual(ridehailing.assign_nearest_free_depots([vehs[3]], {'RIDEHAILING_8': 2, 'RIDEHAILING_15': 1}), [None])
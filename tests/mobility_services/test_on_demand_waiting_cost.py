@@ -25,6 +25,7 @@ from mnms.mobility_service.vehicle_sharing import VehicleSharingMobilityService
 from mnms.mobility_service.personal_vehicle import PersonalMobilityService
 from mnms.graph.layers import MultiLayerGraph, PublicTransportLayer
 from mnms.log import set_all_mnms_logger_level, LOGLEVEL
+from mnms.vehicles.manager import VehicleManager
 
 
 class TestOnDemandMobilityServiceWaitingCost(unittest.TestCase):
@@ -38,6 +39,7 @@ class TestOnDemandMobilityServiceWaitingCost(unittest.TestCase):
         """Concludes and closes the test.
         """
         self.temp_dir_results.cleanup()
+        VehicleManager.empty()
 
     def create_supervisor(self, sc):
         """Method to create a common supervisor for the different tests of this class.
@@ -407,3 +409,27 @@ class TestOnDemandMobilityServiceWaitingCost(unittest.TestCase):
         self.assertAlmostEqual(df32['COST'].iloc[0], (w3_z1+w3_z2)/2 + tt3)
         df40 = df[df['ID'] == 'U40']
         self.assertAlmostEqual(df40['COST'].iloc[0], (w4_z1+w4_z2)/2 + tt3)
+
+    def test_on_demand_node_zones_mapping(self):
+        """Test that the mapping between nodes and zones of an on demand mobility
+        service is correctly built and that estimated pickup times are memoised
+        until their next update.
+        """
+        ## Create supervisor
+        supervisor =  self.create_supervisor('3')
+        ridehailing = supervisor._mlgraph.layers['RIDEHAILING'].mobility_services['RIDEHAILING']
+
+        ## Check mapping
+        self.assertEqual(ridehailing._map_node_zones['RIDEHAILING_1'], ['rh_z1'])
+        self.assertEqual(ridehailing._map_node_zones['RIDEHAILING_3'], ['rh_z2'])
+        self.assertEqual(ridehailing._map_node_zones['RIDEHAILING_4'], ['rh_z1', 'rh_z2'])
+
+        ## Check estimations and memoisation
+        ridehailing._estimated_pickup_times['rh_z1'] = 10
+        ridehailing._estimated_pickup_times['rh_z2'] = 20
+        self.assertAlmostEqual(ridehailing.estimate_pickup_time_for_planning('RIDEHAILING_1'), 10)
+        self.assertAlmostEqual(ridehailing.estimate_pickup_time_for_planning('RIDEHAILING_4'), 15)
+        ridehailing._estimated_pickup_times['rh_z1'] = 30
+        self.assertAlmostEqual(ridehailing.estimate_pickup_time_for_planning('RIDEHAILING_4'), 15)
+        ridehailing._node_estimated_pickup_times = dict()
+        self.assertAlmostEqual(ridehailing.estimate_pickup_time_for_planning('RIDEHAILING_4'), 25)
@@ -25,6 +25,7 @@ from mnms.mobility_service.vehicle_sharing import VehicleSharingMobilityService
 from mnms.mobility_service.personal_vehicle import PersonalMobilityService
 from mnms.graph.layers import MultiLayerGraph, PublicTransportLayer
 from mnms.log import set_all_mnms_logger_level, LOGLEVEL
+from mnms.vehicles.manager import VehicleManager
 
 
 class TestOnDemandDepotMobilityService(unittest.TestCase):
@@ -38,8 +39,9 @@ class TestOnDemandDepotMobilityService(unittest.TestCase):
         """Concludes and closes the test.
         """
         self.temp_dir_results.cleanup()
+        VehicleManager.empty()
 
-    def create_supervisor(self, sc):
+    def create_supervisor(self, sc, veh_manager=None):
         """Method to create a common supervisor for the different tests of this class.
         """
         roads = generate_manhattan_road(3, 500, extended=False)
@@ -83,7 +85,8 @@ class TestOnDemandDepotMobilityService(unittest.TestCase):
                                 flow_motor,
                                 decision_model,
                                 logfile='log.txt',
-                                loglevel=LOGLEVEL.INFO)
+                                loglevel=LOGLEVEL.INFO,
+                                veh_manager=veh_manager)
         set_all_mnms_logger_level(LOGLEVEL.INFO)
 
         return supervisor
@@ -120,6 +123,11 @@ class TestOnDemandDepotMobilityService(unittest.TestCase):
         velov_stations = supervisor._mlgraph.layers['BIKESHARING'].mobility_services['VELOV'].stations
         self.assertEqual(len(velov_stations['S0'].waiting_vehicles), 1)
         self.assertEqual(len(velov_stations['S8'].waiting_vehicles), 1)
+        self.assertEqual(set(supervisor._mlgraph.layers['BIKESHARING'].stations.keys()), {'S0', 'S8'})
+        for station in velov_stations.values():
+            for vid, veh in station.waiting_vehicles.items():
+                self.assertEqual(veh.id, vid)
+                self.assertEqual(veh.current_node, station.node)
 
     def test_station_based_vehicle_sharing_custom_waiting_time_func(self):
         """Test the automatic zoning of the OnDemandDepotMobilityService based on
@@ -149,3 +157,30 @@ class TestOnDemandDepotMobilityService(unittest.TestCase):
             dfbi = df[df['ID'] == f'UB{i}']
             self.assertAlmostEqual(dfai['COST'].iloc[0], tt + w(12-i))
             self.assertAlmostEqual(dfbi['COST'].iloc[0], tt + w(12-i))
+
+    def test_station_based_vehicle_sharing_vehicle_manager(self):
+        """Test the station based vehicle sharing in a simulation with its own vehicle
+        manager, the stations vehicles are moved to it from the default one.
+        """
+        # The default manager has already been used in the process
+        for _ in range(5):
+            VehicleManager.default().new_vehicle_id()
+        veh_manager = VehicleManager()
+        supervisor = self.create_supervisor('1', veh_manager)
+
+        velov = supervisor._mlgraph.layers['BIKESHARING'].mobility_services['VELOV']
+        self.assertEqual(VehicleManager.default().number, 0)
+        self.assertEqual(veh_manager.number, 24)
+        for station in velov.stations.values():
+            for vid, veh in station.waiting_vehicles.items():
+                self.assertIs(veh_manager.vehicles[vid], veh)
+
+        supervisor.run(Time("06:55:00"), Time("07:30:00"), Dt(seconds=30), 1)
+
+        with open(self.dir_results / "users.csv") as f:
+            df = pd.read_csv(f, sep=';')
+        self.assertEqual(set(df[df['STATE'] == 'ARRIVED']['ID']), {f'UA{i}' for i in range(12)} | {f'UB{i}' for i in range(12)})
+        for station in velov.stations.values():
+            for vid, veh in station.waiting_vehicles.items():
+                self.assertEqual(veh.id, vid)
+                self.assertEqual(veh.current_node, station.node)
@@ -0,0 +1,74 @@
+import unittest
+import tempfile
+from pathlib import Path
+import pandas as pd
+
+from mnms.demand import BaseDemandManager, User
+from mnms.generation.roads import generate_manhattan_road
+from mnms.generation.layers import generate_layer_from_roads, generate_matching_origin_destination_layer
+from mnms.graph.layers import MultiLayerGraph
+from mnms.mobility_service.on_demand import OnDemandMobilityService
+from mnms.mobility_service.personal_vehicle import PersonalMobilityService
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.tools.observer import CSVUserObserver
+from mnms.vehicles.manager import VehicleManager
+
+
+class TestConcurrentServices(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        self.temp_dir_results = tempfile.TemporaryDirectory()
+        self.dir_results = Path(self.temp_dir_results.name)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        self.temp_dir_results.cleanup()
+        VehicleManager.empty()
+
+    def run_supervisor(self, name, concurrent_mobility_services):
+        roads = generate_manhattan_road(4, 500)
+        ridehailing1 = OnDemandMobilityService('RIDEHAILING1', 0)
+        ridehailing2 = OnDemandMobilityService('RIDEHAILING2', 0, matching_strategy='nearest_idle_vehicle_in_radius_batched')
+        ridehailing_layer = generate_layer_from_roads(roads, 'RIDEHAILING', mobility_services=[ridehailing1, ridehailing2])
+        for node in ['RIDEHAILING_0', 'RIDEHAILING_5', 'RIDEHAILING_15']:
+            ridehailing1.create_waiting_vehicle(node)
+            ridehailing2.create_waiting_vehicle(node)
+        car_layer = generate_layer_from_roads(roads, 'CAR', mobility_services=[PersonalMobilityService('CAR')])
+        odlayer = generate_matching_origin_destination_layer(roads)
+        mlgraph = MultiLayerGraph([ridehailing_layer, car_layer], odlayer, 1)
+
+        services = ['RIDEHAILING1', 'RIDEHAILING2', 'CAR']
+        users = [User(f"U{i}", [500 * (i % 4), 0], [1500 - 500 * (i % 4), 1500], Time("07:00:00").add_time(Dt(seconds=20 * i)),
+                      available_mobility_services={services[i % 3]}) for i in range(9)]
+        demand = BaseDemandManager(users)
+        demand.add_user_observer(CSVUserObserver(self.dir_results / f'users_{name}.csv'))
+        decision_model = DummyDecisionModel(mlgraph)
+
+        flow_motor = MFDFlowMotor()
+        flow_motor.add_reservoir(Reservoir(roads.zones["RES"], ['CAR'], lambda dacc: {'CAR': 10}))
+        supervisor = Supervisor(mlgraph, demand, flow_motor, decision_model)
+
+        concurrent_services, sequential_services = supervisor.split_mobility_services()
+        self.assertEqual([ms.id for ms in concurrent_services], ['RIDEHAILING1', 'RIDEHAILING2'])
+        self.assertEqual([ms.id for ms in sequential_services], ['CAR'])
+
+        supervisor.run(Time("06:59:00"), Time("07:30:00"), Dt(seconds=10), 1,
+                       concurrent_mobility_services=concurrent_mobility_services)
+        self.assertIsNone(supervisor._services_executor)
+
+        with open(self.dir_results / f'users_{name}.csv') as f:
+            df = pd.read_csv(f, sep=';')
+        return df
+
+    def test_concurrent_services(self):
+        df = self.run_supervisor('sequential', False)
+        self.assertEqual(len(df[df['STATE'] == 'ARRIVED']), 9)
+        VehicleManager.empty()
+
+        df_concurrent = self.run_supervisor('concurrent', True)
+        pd.testing.assert_frame_equal(df_concurrent, df)
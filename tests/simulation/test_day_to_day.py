@@ -0,0 +1,189 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from mnms.day_to_day import DayToDayAssignment, link_costs_gap
+from mnms.demand import BaseDemandManager, User
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.flow.vectorized_MFD import VectorizedMFDFlowMotor, ReservoirSet
+from mnms.generation.layers import generate_layer_from_roads, generate_matching_origin_destination_layer
+from mnms.generation.roads import generate_manhattan_road
+from mnms.graph.layers import MultiLayerGraph
+from mnms.io.link_costs import LinkCostsReader
+from mnms.mobility_service.personal_vehicle import PersonalMobilityService
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.vehicles.manager import VehicleManager
+from mnms.vehicles.veh_type import Bike
+
+
+def mfdspeed(dacc):
+    return {'CAR': max(2., 10. - dacc['CAR']), 'BIKE': 5.}
+
+
+class TestDayToDay(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        self.temp_dir_results = tempfile.TemporaryDirectory()
+        self.dir_results = Path(self.temp_dir_results.name)
+
+        self.roads = generate_manhattan_road(3, 500)
+        car_layer = generate_layer_from_roads(self.roads, 'CAR', mobility_services=[PersonalMobilityService('CAR')])
+        bike_layer = generate_layer_from_roads(self.roads, 'BIKE', veh_type=Bike, default_speed=5,
+                                               mobility_services=[PersonalMobilityService('BIKE')])
+        odlayer = generate_matching_origin_destination_layer(self.roads)
+        self.mlgraph = MultiLayerGraph([car_layer, bike_layer], odlayer, 1)
+        self.decision_model = DummyDecisionModel(self.mlgraph)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        self.temp_dir_results.cleanup()
+        VehicleManager.empty()
+
+    def build_supervisor(self, mlgraph, iteration, outdir, speed=mfdspeed):
+        # Each day starts from new fleets
+        mlgraph.layers['CAR'].add_mobility_service(PersonalMobilityService('CAR'))
+        mlgraph.layers['BIKE'].add_mobility_service(PersonalMobilityService('BIKE'))
+        demand = BaseDemandManager([User(f"U{i}", [0, 0], [1000, 1000], Time("07:00:00")) for i in range(10)])
+        flow_motor = MFDFlowMotor()
+        flow_motor.add_reservoir(Reservoir(self.roads.zones["RES"], ['CAR', 'BIKE'], speed))
+        return Supervisor(mlgraph, demand, flow_motor, self.decision_model)
+
+    def car_costs(self, lid):
+        return self.mlgraph.graph.links[lid].costs['CAR']
+
+    def test_warm_start(self):
+        lid = 'CAR_0_1'
+        length = self.car_costs(lid)['length']
+
+        # Link speeds, the unknown and transit links are ignored
+        supervisor = self.build_supervisor(self.mlgraph, 0, self.dir_results)
+        supervisor.set_warm_start(link_speeds={lid: 4., 'UNKNOWN': 3., 'ORIGIN_0_CAR_0': 3.})
+        supervisor.initialize(Time("07:00:00"))
+        self.assertAlmostEqual(self.car_costs(lid)['speed'], 4.)
+        self.assertAlmostEqual(self.car_costs(lid)['travel_time'], length / 4.)
+        self.assertAlmostEqual(self.car_costs('CAR_1_0')['speed'], 14.)
+        self.assertAlmostEqual(self.mlgraph.graph.links['ORIGIN_0_CAR_0'].costs['WALK']['speed'], 1.42)
+
+        # Reservoir accumulations, the link speeds are applied last
+        supervisor = self.build_supervisor(self.mlgraph, 0, self.dir_results)
+        supervisor.set_warm_start(link_speeds={lid: 4.}, accumulations={'RES': {'CAR': 5}})
+        supervisor.initialize(Time("07:00:00"))
+        self.assertAlmostEqual(supervisor._flow_motor.reservoirs['RES'].dict_speeds['CAR'], 5.)
+        self.assertAlmostEqual(self.car_costs('CAR_1_0')['speed'], 5.)
+        self.assertAlmostEqual(self.car_costs(lid)['speed'], 4.)
+
+        # Vectorized motor, the speeds it compares to detect updates are warm started too
+        flow_motor = VectorizedMFDFlowMotor(ReservoirSet([self.roads.zones["RES"]], ['CAR', 'BIKE'],
+                                                         lambda acc: np.maximum(2., 10. - acc)))
+        flow_motor.set_warm_start(link_speeds={lid: 4.}, accumulations={'RES': {'CAR': 5}})
+        flow_motor.set_graph(self.mlgraph)
+        flow_motor.initialize(1.42)
+        speeds = dict(zip(flow_motor._links_ids, flow_motor._links_speeds))
+        self.assertAlmostEqual(speeds[lid], 4.)
+        self.assertAlmostEqual(speeds['CAR_1_0'], 5.)
+        self.assertAlmostEqual(self.car_costs(lid)['speed'], 4.)
+        self.assertAlmostEqual(self.car_costs('CAR_1_0')['speed'], 5.)
+
+    def test_link_costs_gap(self):
+        for name, speed in [('fast', lambda dacc: {'CAR': 10, 'BIKE': 5}), ('slow', lambda dacc: {'CAR': 5, 'BIKE': 5})]:
+            supervisor = self.build_supervisor(self.mlgraph, 0, self.dir_results, speed)
+            supervisor.set_link_costs_file(self.dir_results / f'{name}.bin')
+            supervisor.run(Time("06:59:00"), Time("07:10:00"), Dt(seconds=30), 2)
+
+        fast = self.dir_results / 'fast.bin'
+        slow = self.dir_results / 'slow.bin'
+        self.assertEqual(link_costs_gap(fast, fast), 0.)
+        # Travel times on the car links double, the bike ones are the same
+        self.assertAlmostEqual(link_costs_gap(fast, slow), 1 / 3)
+
+        speeds = LinkCostsReader(slow).link_speeds_at()
+        self.assertEqual(speeds['CAR_0_1'], 5.)
+        self.assertEqual(speeds['ORIGIN_0_CAR_0'], 1.42)
+
+    def test_day_to_day(self):
+        # Users depart at the first affectation step and plan on the warm started costs:
+        # they take their car on a free flow day, their bike when the previous day
+        # starts congested, the days alternate
+        assignment = DayToDayAssignment(self.mlgraph, self.build_supervisor, self.dir_results,
+                                        Time("07:00:00"), Time("07:30:00"), Dt(seconds=30), 2,
+                                        nb_iterations=3, tolerance=1e-3, warm_start_step=1,
+                                        compute_kpis=lambda s, i, o: {'NB_USERS_NOT_ARRIVED': len(s._user_flow.users)})
+        summaries = assignment.run()
+
+        self.assertEqual([s['ITERATION'] for s in summaries], [0, 1, 2])
+        self.assertFalse(assignment.converged)
+        self.assertIsNone(summaries[0]['GAP'])
+        self.assertGreater(summaries[1]['GAP'], 1e-3)
+        self.assertGreater(summaries[2]['GAP'], 1e-3)
+        self.assertTrue(all(s['NB_USERS_NOT_ARRIVED'] == 0 for s in summaries))
+
+        readers = [LinkCostsReader(self.dir_results / f'iteration_{i}' / DayToDayAssignment.LINK_COSTS_FILE)
+                   for i in range(3)]
+        self.assertEqual(readers[0].link_speeds_at(1)['CAR_0_1'], 2.)
+        self.assertEqual(readers[1].link_speeds_at(1)['CAR_0_1'], 10.)
+
+        df = pd.read_csv(self.dir_results / DayToDayAssignment.SUMMARY_FILE, sep=';')
+        self.assertEqual(list(df['ITERATION']), [0, 1, 2])
+        self.assertTrue(np.isnan(df['GAP'].iloc[0]))
+
+    def test_day_to_day_convergence(self):
+        # Users plan after the first update of the costs, the warm start does not
+        # change the days which are all the same
+        assignment = DayToDayAssignment(self.mlgraph, self.build_supervisor, self.dir_results,
+                                        Time("06:59:00"), Time("07:30:00"), Dt(seconds=30), 2,
+                                        nb_iterations=3, tolerance=1e-3, warm_start_step=1)
+        summaries = assignment.run()
+
+        self.assertEqual([s['ITERATION'] for s in summaries], [0, 1])
+        self.assertTrue(assignment.converged)
+        self.assertEqual(summaries[1]['GAP'], 0.)
+
+    def test_day_to_day_users_travelling_at_tend(self):
+        # Users are still travelling at the end of each day, the next day starts
+        # from new fleets registered in its own vehicle manager
+        initial_vehicles = []
+
+        def build_supervisor(mlgraph, iteration, outdir):
+            supervisor = self.build_supervisor(mlgraph, iteration, outdir, lambda dacc: {'CAR': 10, 'BIKE': 5})
+            initial_vehicles.append(sum(len(s.fleet.vehicles) for l in mlgraph.layers.values()
+                                        for s in l.mobility_services.values()))
+            return supervisor
+
+        def compute_kpis(supervisor, iteration, outdir):
+            services = [s for l in self.mlgraph.layers.values() for s in l.mobility_services.values()]
+            self.assertTrue(all(s.fleet.veh_manager is supervisor._veh_manager for s in services))
+            vehicles = [v for s in services for v in s.fleet.vehicles.values()]
+            return {'NB_USERS_NOT_ARRIVED': len(supervisor._user_flow.users),
+                    'VEHICLES': sorted((v.id, v.activity.user.id if v.activity.user is not None else None)
+                                       for v in vehicles)}
+
+        assignment = DayToDayAssignment(self.mlgraph, build_supervisor, self.dir_results,
+                                        Time("06:59:00"), Time("07:02:00"), Dt(seconds=30), 2,
+                                        nb_iterations=2, compute_kpis=compute_kpis)
+        summaries = assignment.run()
+
+        self.assertEqual(initial_vehicles, [0, 0])
+        self.assertEqual(summaries[0]['NB_USERS_NOT_ARRIVED'], 10)
+        self.assertEqual(len(summaries[0]['VEHICLES']), 10)
+        self.assertEqual(summaries[0]['VEHICLES'], summaries[1]['VEHICLES'])
+        self.assertEqual(summaries[1]['GAP'], 0.)
+
+    def test_day_to_day_reused_services(self):
+        def build_supervisor(mlgraph, iteration, outdir):
+            demand = BaseDemandManager([User("U0", [0, 0], [1000, 1000], Time("07:00:00"))])
+            flow_motor = MFDFlowMotor()
+            flow_motor.add_reservoir(Reservoir(self.roads.zones["RES"], ['CAR', 'BIKE'], mfdspeed))
+            return Supervisor(mlgraph, demand, flow_motor, self.decision_model)
+
+        assignment = DayToDayAssignment(self.mlgraph, build_supervisor, self.dir_results,
+                                        Time("06:59:00"), Time("07:02:00"), Dt(seconds=30), 2,
+                                        nb_iterations=2)
+        with self.assertRaises(ValueError):
+            assignment.run()
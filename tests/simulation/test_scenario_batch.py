@@ -0,0 +1,98 @@
+import unittest
+import tempfile
+import json
+from pathlib import Path
+import pandas as pd
+
+from mnms.demand import BaseDemandManager, User
+from mnms.generation.roads import generate_manhattan_road
+from mnms.generation.layers import generate_layer_from_roads, generate_matching_origin_destination_layer
+from mnms.graph.layers import MultiLayerGraph
+from mnms.mobility_service.personal_vehicle import PersonalMobilityService
+from mnms.travel_decision.logit import LogitDecisionModel
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.simulation import Supervisor
+from mnms.scenario import Scenario, ScenarioBatch
+from mnms.time import Time, Dt
+from mnms.tools.observer import CSVUserObserver
+from mnms.vehicles.manager import VehicleManager
+
+
+def build_supervisor(mlgraph, scenario, outdir):
+    if scenario.params.get('fail', False):
+        raise ValueError('Failing scenario')
+    demand = BaseDemandManager([User(f"U{i}", [0, 0], [1000, 1000], Time("07:00:00")) for i in range(10)])
+    demand.add_user_observer(CSVUserObserver(outdir / 'users.csv'))
+    decision_model = LogitDecisionModel(mlgraph, outfile=outdir / "paths.csv")
+
+    def mfdspeed(dacc):
+        return {'CAR': scenario.params['speed']}
+
+    flow_motor = MFDFlowMotor()
+    flow_motor.add_reservoir(Reservoir(mlgraph.roads.zones["RES"], ['CAR'], mfdspeed))
+    return Supervisor(mlgraph, demand, flow_motor, decision_model)
+
+
+def compute_kpis(supervisor, scenario, outdir):
+    with open(outdir / 'users.csv') as f:
+        df = pd.read_csv(f, sep=';')
+    return {'NB_USERS_ARRIVED': int(df[df['STATE'] == 'ARRIVED']['ID'].nunique())}
+
+
+class TestScenarioBatch(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        self.temp_dir_results = tempfile.TemporaryDirectory()
+        self.dir_results = Path(self.temp_dir_results.name)
+
+        roads = generate_manhattan_road(3, 500)
+        car = PersonalMobilityService('CAR')
+        car_layer = generate_layer_from_roads(roads, 'CAR', mobility_services=[car])
+        odlayer = generate_matching_origin_destination_layer(roads)
+        self.mlgraph = MultiLayerGraph([car_layer], odlayer, 1)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        self.temp_dir_results.cleanup()
+        VehicleManager.empty()
+
+    def run_batch(self, scenarios, resume=True):
+        batch = ScenarioBatch(self.mlgraph, build_supervisor, scenarios, self.dir_results,
+                              Time("06:59:00"), Time("07:30:00"), Dt(seconds=30), 2,
+                              compute_kpis=compute_kpis, processes=2)
+        return batch.run(resume=resume)
+
+    def test_run_and_resume(self):
+        scenarios = [Scenario('slow', seed=1, params={'speed': 5}),
+                     Scenario('fast', seed=1, params={'speed': 10}),
+                     Scenario('failing', params={'fail': True})]
+        summaries = self.run_batch(scenarios)
+
+        self.assertEqual([s['ID'] for s in summaries], ['slow', 'fast', 'failing'])
+        self.assertEqual([s['STATUS'] for s in summaries], ['DONE', 'DONE', 'FAILED'])
+        self.assertEqual(summaries[0]['NB_USERS_ARRIVED'], 10)
+        self.assertEqual(summaries[1]['NB_USERS_ARRIVED'], 10)
+        self.assertTrue((self.dir_results / 'slow' / 'users.csv').exists())
+        self.assertFalse((self.dir_results / 'failing' / ScenarioBatch.SUMMARY_FILE).exists())
+
+        # Both runs started from the same graph
+        with open(self.dir_results / 'slow' / 'users.csv') as f:
+            df_slow = pd.read_csv(f, sep=';')
+        with open(self.dir_results / 'fast' / 'users.csv') as f:
+            df_fast = pd.read_csv(f, sep=';')
+        self.assertGreater(Time(df_slow['TIME'].iloc[-1]), Time(df_fast['TIME'].iloc[-1]))
+
+        with open(self.dir_results / 'summary.csv') as f:
+            df = pd.read_csv(f, sep=';')
+        self.assertEqual(list(df['ID']), ['slow', 'fast', 'failing'])
+
+        # Resume only reruns the failed scenario
+        with open(self.dir_results / 'slow' / ScenarioBatch.SUMMARY_FILE) as f:
+            slow_summary = json.load(f)
+        scenarios[2].params['fail'] = False
+        scenarios[2].params['speed'] = 5
+        summaries = self.run_batch(scenarios)
+        self.assertEqual([s['STATUS'] for s in summaries], ['DONE', 'DONE', 'DONE'])
+        self.assertEqual(summaries[0]['RUN_TIME'], slow_summary['RUN_TIME'])
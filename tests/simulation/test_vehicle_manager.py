@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+from pathlib import Path
+import pandas as pd
+
+from mnms.demand import BaseDemandManager, User
+from mnms.generation.roads import generate_manhattan_road
+from mnms.generation.layers import generate_layer_from_roads, generate_matching_origin_destination_layer
+from mnms.graph.layers import MultiLayerGraph
+from mnms.mobility_service.on_demand import OnDemandMobilityService
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.tools.observer import CSVUserObserver
+from mnms.vehicles.manager import VehicleManager
+from mnms.vehicles.veh_type import ActivityType
+
+
+class TestVehicleManager(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        self.temp_dir_results = tempfile.TemporaryDirectory()
+        self.dir_results = Path(self.temp_dir_results.name)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        self.temp_dir_results.cleanup()
+        VehicleManager.empty()
+
+    def create_supervisor(self, name, veh_manager):
+        roads = generate_manhattan_road(3, 500)
+        ridehailing = OnDemandMobilityService('RIDEHAILING', 0)
+        ridehailing_layer = generate_layer_from_roads(roads, 'RIDEHAILING', mobility_services=[ridehailing])
+        ridehailing.create_waiting_vehicle('RIDEHAILING_0')
+        ridehailing.create_waiting_vehicle('RIDEHAILING_8')
+        odlayer = generate_matching_origin_destination_layer(roads)
+        mlgraph = MultiLayerGraph([ridehailing_layer], odlayer, 1)
+
+        demand = BaseDemandManager([User("U0", [0, 0], [1000, 1000], Time("07:00:00"))])
+        demand.add_user_observer(CSVUserObserver(self.dir_results / f'users_{name}.csv'))
+        decision_model = DummyDecisionModel(mlgraph)
+
+        def mfdspeed(dacc):
+            return {'CAR': 10}
+
+        flow_motor = MFDFlowMotor()
+        flow_motor.add_reservoir(Reservoir(roads.zones["RES"], ['CAR'], mfdspeed))
+        return Supervisor(mlgraph, demand, flow_motor, decision_model, veh_manager=veh_manager), ridehailing
+
+    def test_indexed_queries(self):
+        veh_manager = VehicleManager()
+        supervisor, ridehailing = self.create_supervisor('0', veh_manager)
+
+        self.assertIs(ridehailing.fleet.veh_manager, veh_manager)
+        self.assertEqual(VehicleManager.default().number, 0)
+        self.assertEqual(veh_manager.number, 2)
+        self.assertEqual([v.id for v in veh_manager.get_vehicles('RIDEHAILING')], ['0', '1'])
+        self.assertEqual(len(veh_manager.get_idle_vehicles('RIDEHAILING')), 2)
+        self.assertEqual(veh_manager.get_moving_vehicles(), [])
+        self.assertEqual(veh_manager.get_vehicles('UNKNOWN'), [])
+
+        veh = veh_manager.vehicles['0']
+        veh.add_activities([])
+        veh.activity = None
+        self.assertEqual([v.id for v in veh_manager.get_idle_vehicles('RIDEHAILING')], ['1'])
+        self.assertEqual([v.id for v in veh_manager.get_vehicles(activity_types=[None])], ['0'])
+
+    def test_coexisting_simulations(self):
+        supervisor1, ridehailing1 = self.create_supervisor('1', VehicleManager())
+        supervisor2, ridehailing2 = self.create_supervisor('2', VehicleManager())
+
+        flow_dt = Dt(seconds=30)
+        supervisor1.run(Time("06:59:00"), Time("07:10:00"), flow_dt, 1)
+        supervisor2.run(Time("06:59:00"), Time("07:10:00"), flow_dt, 1)
+
+        # The vehicles keep the ids they got in the default manager, the user is served
+        # by the first vehicle of each simulation
+        for name, ridehailing in [('1', ridehailing1), ('2', ridehailing2)]:
+            with open(self.dir_results / f'users_{name}.csv') as f:
+                df = pd.read_csv(f, sep=';')
+            self.assertEqual(df['STATE'].iloc[-1], 'ARRIVED')
+            self.assertEqual(set(df['VEHICLE'].dropna().astype(int).astype(str)), {list(ridehailing.fleet.vehicles)[0]})
+        self.assertEqual(list(ridehailing2.fleet.vehicles), ['2', '3'])
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from mnms.demand import BaseDemandManager, User
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.generation.layers import generate_layer_from_roads, generate_matching_origin_destination_layer
+from mnms.generation.mlgraph import generate_manhattan_passenger_car
+from mnms.generation.roads import generate_manhattan_road
+from mnms.graph.layers import MultiLayerGraph
+from mnms.mobility_service.on_demand import OnDemandMobilityService
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.tools.execution import ExecutionResources, available_cpu_count
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.vehicles.manager import VehicleManager
+
+
+class TestExecution(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        ExecutionResources.set_default(None)
+        VehicleManager.empty()
+
+    def test_nb_threads(self):
+        resources = ExecutionResources(4, inline_threshold=10)
+        self.assertEqual(resources.nb_threads(0), 1)
+        self.assertEqual(resources.nb_threads(10), 1)
+        self.assertEqual(resources.nb_threads(11), 4)
+        resources = ExecutionResources(64, inline_threshold=0)
+        self.assertEqual(resources.nb_threads(20), 20)
+        self.assertEqual(ExecutionResources().thread_number, available_cpu_count())
+
+    def test_cgroup_quota(self):
+        with mock.patch('builtins.open', mock.mock_open(read_data='150000 100000\n')):
+            self.assertEqual(available_cpu_count(), min(2, len(os.sched_getaffinity(0))))
+        with mock.patch('builtins.open', mock.mock_open(read_data='max 100000\n')):
+            self.assertEqual(available_cpu_count(), len(os.sched_getaffinity(0)))
+
+    def test_supervisor_resources(self):
+        mlgraph = generate_manhattan_passenger_car(3, 100)
+        decision_model = DummyDecisionModel(mlgraph)
+        resources = ExecutionResources(8, inline_threshold=4)
+        supervisor = Supervisor(mlgraph, BaseDemandManager([User("U0", "ORIGIN_0", "DESTINATION_8", Time("07:00:00"))]), MFDFlowMotor(), decision_model,
+                                execution_resources=resources)
+
+        self.assertIs(decision_model.execution_resources, resources)
+        for layer in mlgraph.layers.values():
+            for mservice in layer.mobility_services.values():
+                self.assertIs(mservice.execution_resources, resources)
+        self.assertEqual(decision_model._nb_threads(3), 1)
+        self.assertEqual(decision_model._nb_threads(100), 8)
+
+        # Without specific resources, the default ones of the process apply
+        ExecutionResources.set_default(ExecutionResources(3, inline_threshold=0))
+        other_model = DummyDecisionModel(mlgraph)
+        self.assertEqual(other_model._nb_threads(100), 3)
+        self.assertIs(supervisor._execution_resources, resources)
+
+    def test_reserve_threads(self):
+        resources = ExecutionResources(4, inline_threshold=0)
+        with resources.reserve_threads(3) as nb_threads:
+            self.assertEqual(nb_threads, 3)
+            # Only the free threads of the budget are granted
+            with resources.reserve_threads(3) as other_nb_threads:
+                self.assertEqual(other_nb_threads, 1)
+                self.assertEqual(resources.threads_in_use, 4)
+        self.assertEqual(resources.threads_in_use, 0)
+
+        # The concurrent callers wait for free threads
+        threads_in_use = []
+
+        def call():
+            for _ in range(20):
+                with resources.reserve_threads(3):
+                    threads_in_use.append(resources.threads_in_use)
+                    time.sleep(0.001)
+
+        callers = [threading.Thread(target=call) for _ in range(6)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        self.assertEqual(len(threads_in_use), 120)
+        self.assertLessEqual(max(threads_in_use), 4)
+        self.assertEqual(resources.threads_in_use, 0)
+
+    def test_simulation_threads_budget(self):
+        # The prefetch thread, the concurrent services and the main thread share the budget
+        roads = generate_manhattan_road(4, 500)
+        services = [OnDemandMobilityService(f'RIDEHAILING{i}', 0, matching_strategy='nearest_idle_vehicle_in_radius_batched')
+                    for i in range(3)]
+        layer = generate_layer_from_roads(roads, 'RIDEHAILING', mobility_services=services)
+        for service in services:
+            for node in ['RIDEHAILING_0', 'RIDEHAILING_5', 'RIDEHAILING_15']:
+                service.create_waiting_vehicle(node)
+        mlgraph = MultiLayerGraph([layer], generate_matching_origin_destination_layer(roads), 1)
+
+        users = [User(f"U{i}", [500 * (i % 4), 0], [1500 - 500 * (i % 4), 1500], Time("07:00:00").add_time(Dt(seconds=20 * i)),
+                      available_mobility_services={services[i % 3].id}) for i in range(12)]
+        flow_motor = MFDFlowMotor()
+        flow_motor.add_reservoir(Reservoir(roads.zones["RES"], ['CAR'], lambda dacc: {'CAR': 10}))
+        resources = ExecutionResources(2, inline_threshold=0)
+        supervisor = Supervisor(mlgraph, BaseDemandManager(users), flow_motor, DummyDecisionModel(mlgraph),
+                                execution_resources=resources)
+
+        # Number of threads of the HiPOP calls running at the same time
+        lock = threading.Lock()
+        threads_in_use = [0]
+        max_threads_in_use = [0]
+
+        def record(function, thread_arg):
+            def call(*args):
+                with lock:
+                    threads_in_use[0] += args[thread_arg]
+                    max_threads_in_use[0] = max(max_threads_in_use[0], threads_in_use[0])
+                try:
+                    # Widen the calls so that the concurrent ones overlap
+                    time.sleep(0.02)
+                    return function(*args)
+                finally:
+                    with lock:
+                        threads_in_use[0] -= args[thread_arg]
+            return call
+
+        import mnms.mobility_service.on_demand as on_demand
+        import mnms.travel_decision.abstract as decision
+        with mock.patch.object(on_demand, 'parallel_dijkstra', record(on_demand.parallel_dijkstra, 5)), \
+                mock.patch.object(decision, 'parallel_dijkstra', record(decision.parallel_dijkstra, 5)), \
+                mock.patch.object(decision, 'parallel_k_shortest_path', record(decision.parallel_k_shortest_path, 11)):
+            supervisor.run(Time("06:59:00"), Time("07:20:00"), Dt(seconds=10), 3,
+                           pipelined_planning=True, concurrent_mobility_services=True)
+
+        self.assertEqual(max_threads_in_use[0], 2)
+        self.assertEqual(resources.threads_in_use, 0)
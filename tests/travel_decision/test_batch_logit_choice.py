@@ -0,0 +1,78 @@
+import unittest
+
+import numpy as np
+
+from mnms.travel_decision.logit import batch_logit_choice
+
+
+class FixedDraws(object):
+    def __init__(self, draws):
+        self.draws = np.asarray(draws, dtype=float)
+
+    def random(self, n):
+        return self.draws[:n]
+
+
+class TestBatchLogitChoice(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        rng = np.random.default_rng(0)
+        self.costs = [rng.uniform(100, 2000, rng.integers(1, 6)) for _ in range(1000)]
+        self.values = np.concatenate(self.costs)
+        self.offsets = np.concatenate([[0], np.cumsum([len(c) for c in self.costs])])
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+
+    def test_same_choices_as_sequential_draws(self):
+        """Check that the batched choice leads to the same choices as one numpy
+        choice per situation with the same seed.
+        """
+        theta = 0.01
+        rng = np.random.default_rng(992)
+        expected = []
+        for c in self.costs:
+            p = np.exp(-theta * c) / np.sum(np.exp(-theta * c))
+            expected.append(rng.choice(range(len(c)), 1, p=p)[0])
+
+        chosen = batch_logit_choice(self.values, self.offsets, theta, np.random.default_rng(992))
+        self.assertEqual(list(chosen), expected)
+
+    def test_no_underflow(self):
+        """Check that very high costs do not lead to undefined probabilities.
+        """
+        values = np.array([1e6, 1e6 + 1e4, 2e6, 5e5])
+        offsets = np.array([0, 3, 4])
+        chosen = batch_logit_choice(values, offsets, 0.01, np.random.default_rng(1))
+        self.assertEqual(list(chosen), [0, 0])
+
+    def test_reproducibility(self):
+        """Check that the choices are reproducible with the same seed.
+        """
+        chosen1 = batch_logit_choice(self.values, self.offsets, 0.001, np.random.default_rng(523))
+        chosen2 = batch_logit_choice(self.values, self.offsets, 0.001, np.random.default_rng(523))
+        np.testing.assert_array_equal(chosen1, chosen2)
+        self.assertTrue(np.all(chosen1 < np.diff(self.offsets)))
+
+    def test_large_batch_boundary_draws(self):
+        """Check that on a large batch, the choices of the last situations are the same
+        as numpy choice ones even for draws on the boundaries of their cumulative
+        probabilities.
+        """
+        rng = np.random.default_rng(3)
+        nb_heading = 50000
+        heading_values = rng.uniform(0, 300, nb_heading)
+        theta = 0.01
+        for c in rng.uniform(0, 300, 20):
+            costs = np.array([0., c, 2 * c])
+            values = np.concatenate([heading_values, costs])
+            offsets = np.concatenate([np.arange(nb_heading + 1), [nb_heading + 3]])
+            p = np.exp(-theta * costs) / np.sum(np.exp(-theta * costs))
+            cdf = np.cumsum(p)
+            cdf /= cdf[-1]
+            for k in range(2):
+                draws = np.concatenate([np.full(nb_heading, 0.5), [cdf[k]]])
+                chosen = batch_logit_choice(values, offsets, theta, FixedDraws(draws))
+                self.assertEqual(chosen[-1], np.searchsorted(cdf, cdf[k], side='right'))
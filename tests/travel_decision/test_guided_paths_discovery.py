@@ -0,0 +1,68 @@
+import unittest
+
+from mnms.demand import User
+from mnms.generation.layers import generate_layer_from_roads, generate_matching_origin_destination_layer
+from mnms.generation.roads import generate_manhattan_road
+from mnms.graph.layers import MultiLayerGraph
+from mnms.mobility_service.personal_vehicle import PersonalMobilityService
+from mnms.time import Time
+from mnms.travel_decision.abstract import Event
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.vehicles.manager import VehicleManager
+from mnms.vehicles.veh_type import Bike
+
+
+class TestGuidedPathsDiscovery(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        roads = generate_manhattan_road(5, 200)
+        car_layer = generate_layer_from_roads(roads, 'CAR', mobility_services=[PersonalMobilityService('CAR')])
+        bike_layer = generate_layer_from_roads(roads, 'BIKE', veh_type=Bike, default_speed=5,
+                                               mobility_services=[PersonalMobilityService('BIKE')])
+        odlayer = generate_matching_origin_destination_layer(roads)
+        self.mlgraph = MultiLayerGraph([car_layer, bike_layer], odlayer, 1)
+        self.mlgraph.connect_inter_layers(['CAR', 'BIKE'], 1)
+        self.mlgraph.initialize_costs(1.42)
+
+        # The car paths found with the first mode are enough for the second one
+        self.considered_modes = [({'CAR'}, None, 1),
+                                 ({'CAR', 'BIKE'}, None, 1),
+                                 ({'CAR', 'BIKE'}, ({'CAR'}, {'BIKE'}), 1)]
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        VehicleManager.empty()
+
+    def create_users_paths(self, decision_model):
+        users = [User('U0', 'ORIGIN_0', 'DESTINATION_24', Time('07:00:00'), available_mobility_services={'CAR', 'BIKE'}),
+                 User('U1', 'ORIGIN_4', 'DESTINATION_20', Time('07:00:00'), available_mobility_services={'CAR'}),
+                 User('U2', 'ORIGIN_12', 'DESTINATION_3', Time('07:00:00'), available_mobility_services={'CAR', 'BIKE'})]
+        decision_model.add_users_for_planning(users, [Event.DEPARTURE] * len(users))
+        return {u.id: {'user': u, 'event': Event.DEPARTURE, 'paths': []} for u in users}
+
+    def test_batched_discovery_same_as_sequential(self):
+        decision_model = DummyDecisionModel(self.mlgraph, considered_modes=self.considered_modes)
+
+        # Reference, one HiPOP call per considered mode
+        users_paths = self.create_users_paths(decision_model)
+        for considered_mode in self.considered_modes:
+            subgraph_layers = [l for l in self.mlgraph.layers.values() if l.id in considered_mode[0]]
+            uids, origins, destinations, available_layers, chosen_mservices, nb_paths = \
+                decision_model._process_shortest_path_inputs(subgraph_layers, considered_mode[2], {},
+                    intermodality=considered_mode[1], saved_paths=users_paths)
+            paths = decision_model._compute_k_shortest_paths(origins, destinations, available_layers,
+                chosen_mservices, nb_paths, considered_mode[1])
+            users_paths = decision_model.parse_paths(paths, uids, chosen_mservices, nb_paths, users_paths)
+        expected = {uid: [(p.nodes, p.mobility_services, p.path_cost) for p in v['paths']] for uid, v in users_paths.items()}
+
+        decision_model._users_for_planning = []
+        users_paths = decision_model._guided_paths_discovery({}, self.create_users_paths(decision_model))
+        found = {uid: [(p.nodes, p.mobility_services, p.path_cost) for p in v['paths']] for uid, v in users_paths.items()}
+
+        self.assertEqual(found, expected)
+        # The second mode has been skipped and the intermodal paths found
+        self.assertEqual(len(found['U1']), 1)
+        self.assertEqual(found['U0'][0][1], ['WALK', 'CAR', 'WALK'])
+        self.assertTrue(all({'CAR', 'BIKE'} <= set(services) for _, services, _ in found['U0'][1:]))
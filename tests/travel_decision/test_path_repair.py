@@ -0,0 +1,95 @@
+import itertools
+import unittest
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from mnms.demand import BaseDemandManager, User
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.generation.layers import generate_layer_from_roads, generate_matching_origin_destination_layer
+from mnms.generation.roads import generate_manhattan_road
+from mnms.graph.layers import MultiLayerGraph
+from mnms.mobility_service.on_demand import OnDemandMobilityService
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.tools.observer import CSVUserObserver
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.vehicles.manager import VehicleManager
+
+
+class TestPathRepair(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        self.temp_dir_results = tempfile.TemporaryDirectory()
+        self.dir_results = Path(self.temp_dir_results.name)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        self.temp_dir_results.cleanup()
+        VehicleManager.empty()
+
+    def create_supervisor(self, path_repair, mfdspeed=lambda dacc: {'CAR': 10}):
+        roads = generate_manhattan_road(4, 500, extended=False)
+        # RIDEHAILING1 has no vehicle, users requesting it get refused
+        ridehailing1 = OnDemandMobilityService('RIDEHAILING1', 0)
+        ridehailing2 = OnDemandMobilityService('RIDEHAILING2', 0)
+        ridehailing_layer = generate_layer_from_roads(roads, 'RIDEHAILING', mobility_services=[ridehailing1, ridehailing2])
+        ridehailing2.create_waiting_vehicle('RIDEHAILING_0')
+        ridehailing2.create_waiting_vehicle('RIDEHAILING_4')
+
+        odlayer = generate_matching_origin_destination_layer(roads)
+        mlgraph = MultiLayerGraph([ridehailing_layer], odlayer, 1)
+
+        demand = BaseDemandManager([User("U0", [0, 0], [1500, 0], Time("07:00:00"), response_dt=Dt(minutes=1)),
+                                    User("U1", [0, 500], [1500, 500], Time("07:00:00"), response_dt=Dt(minutes=1))])
+        demand.add_user_observer(CSVUserObserver(self.dir_results / 'users.csv'))
+
+        decision_model = DummyDecisionModel(mlgraph)
+        # Users first choose RIDEHAILING1
+        decision_model.add_additional_cost_function('travel_time',
+            lambda p, u: 100 if 'RIDEHAILING2' in p.mobility_services else 0)
+        if path_repair:
+            decision_model.enable_path_repair(0.2)
+
+        flow_motor = MFDFlowMotor()
+        flow_motor.add_reservoir(Reservoir(roads.zones["RES"], ['CAR'], mfdspeed))
+
+        return Supervisor(mlgraph, demand, flow_motor, decision_model)
+
+    def run_supervisor(self, path_repair):
+        supervisor = self.create_supervisor(path_repair)
+        supervisor.run(Time("06:59:00"), Time("07:30:00"), Dt(seconds=10), 1)
+        with open(self.dir_results / "users.csv") as f:
+            df = pd.read_csv(f, sep=';')
+        return supervisor._decision_model, df
+
+    def test_path_repair(self):
+        decision_model, df_search = self.run_supervisor(False)
+        self.assertEqual(decision_model.nb_repaired_replannings, 0)
+        self.assertEqual(decision_model.nb_replanning_searches, 0)
+        VehicleManager.empty()
+
+        decision_model, df_repair = self.run_supervisor(True)
+        self.assertEqual(decision_model.nb_repaired_replannings, 2)
+        self.assertEqual(decision_model.nb_replanning_searches, 0)
+
+        # Users reuse their RIDEHAILING2 alternative and travel as with a new search
+        for uid, veh in [('U0', 0.), ('U1', 1.)]:
+            df_u = df_repair[df_repair['ID'] == uid]
+            self.assertEqual(df_u['STATE'].iloc[-1], 'ARRIVED')
+            self.assertEqual(set(df_u['VEHICLE'].dropna()), {veh})
+        self.assertEqual(df_repair[df_repair['STATE'] == 'ARRIVED'][['ID', 'TIME', 'DISTANCE']].values.tolist(),
+                         df_search[df_search['STATE'] == 'ARRIVED'][['ID', 'TIME', 'DISTANCE']].values.tolist())
+
+    def test_path_repair_drift(self):
+        # Speed decreases at each update, the costs of the alternatives drift
+        speeds = itertools.count()
+        supervisor = self.create_supervisor(True, lambda dacc: {'CAR': 10 * 0.99 ** next(speeds)})
+        decision_model = supervisor._decision_model
+        decision_model.enable_path_repair(0.01)
+        supervisor.run(Time("06:59:00"), Time("07:30:00"), Dt(seconds=10), 1)
+        self.assertEqual(decision_model.nb_repaired_replannings, 0)
+        self.assertEqual(decision_model.nb_replanning_searches, 2)
@@ -0,0 +1,58 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from mnms.demand import BaseDemandManager, User
+from mnms.flow.MFD import MFDFlowMotor, Reservoir
+from mnms.generation.mlgraph import generate_manhattan_passenger_car
+from mnms.simulation import Supervisor
+from mnms.time import Time, Dt
+from mnms.tools.observer import CSVUserObserver
+from mnms.travel_decision.dummy import DummyDecisionModel
+from mnms.vehicles.manager import VehicleManager
+
+
+class TestPipelinedPlanning(unittest.TestCase):
+    def setUp(self):
+        """Initiates the test.
+        """
+        self.temp_dir_results = tempfile.TemporaryDirectory()
+        self.dir_results = Path(self.temp_dir_results.name)
+
+    def tearDown(self):
+        """Concludes and closes the test.
+        """
+        self.temp_dir_results.cleanup()
+        VehicleManager.empty()
+
+    def run_supervisor(self, pipelined_planning):
+        mlgraph = generate_manhattan_passenger_car(4, 100)
+        users = [User(str(i), f"ORIGIN_{i % 4}", f"DESTINATION_{15 - i % 4}",
+                      Time("07:00:00").add_time(Dt(seconds=30 * i))) for i in range(12)]
+        demand = BaseDemandManager(users)
+        demand.add_user_observer(CSVUserObserver(self.dir_results / "users.csv"))
+
+        flow_motor = MFDFlowMotor()
+        flow_motor.add_reservoir(Reservoir(mlgraph.roads.zones["RES"], ["CAR"], lambda x: {"CAR": 10}))
+        decision_model = DummyDecisionModel(mlgraph)
+        supervisor = Supervisor(mlgraph, demand, flow_motor, decision_model)
+        supervisor.run(Time("06:59:00"), Time("07:20:00"), Dt(seconds=10), 6, pipelined_planning=pipelined_planning)
+
+        with open(self.dir_results / "users.csv") as f:
+            df = pd.read_csv(f, sep=';')
+        return decision_model, df[df['STATE'] == 'ARRIVED'][['ID', 'TIME', 'DISTANCE']].values.tolist()
+
+    def test_pipelined_planning(self):
+        decision_model, arrivals = self.run_supervisor(False)
+        self.assertEqual(decision_model.nb_prefetched_plannings, 0)
+        self.assertEqual(len(arrivals), 12)
+        VehicleManager.empty()
+
+        decision_model, pipelined_arrivals = self.run_supervisor(True)
+        # All users depart after the first affectation step, they plan with prefetched paths
+        self.assertEqual(decision_model.nb_prefetched_plannings, 12)
+        self.assertIsNone(decision_model._prefetch)
+        # Link costs are constant, the travels are the same
+        self.assertEqual(pipelined_arrivals, arrivals)